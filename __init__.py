@@ -1,28 +1,51 @@
 """Setting up the Sonnen Batterie component."""
 
-from datetime import timedelta
+import functools
 import logging
 
 from aiohttp.client_exceptions import ClientConnectorError
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
-from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 
 from .const import (
-    DOMAIN,
+    CONST_COMPONENT_TYPES,
+    DEFAULT_ADAPTIVE_POLLING,
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_FLEET_DEVICE,
+    DEFAULT_MAX_POLL_INTERVAL,
+    DEFAULT_MIN_POLL_INTERVAL,
+    DEFAULT_READ_TIMEOUT,
     ENTRY_API_TOKEN,
     ENTRY_NAME,
+    ENTRY_SERIAL_NUMBER,
+    ENTRY_SERIAL_NUMBER_URI,
     ENTRY_URL,
-    POLL_FREQUENCY,
+    OPTION_ADAPTIVE_POLLING,
+    OPTION_CONNECT_TIMEOUT,
+    OPTION_FLEET_DEVICE,
+    OPTION_MAX_POLL_INTERVAL,
+    OPTION_MIN_POLL_INTERVAL,
+    OPTION_READ_TIMEOUT,
 )
+from .services import async_register_services
 from .sonnen_host import SonnenBatterieHost
+from .publisher import EntityPublisher
+from .utils import (
+    async_use_discovered_sensors,
+    get_entity_publishers,
+    get_fleet,
+    get_fleet_entity_adders,
+    get_sonnen_host_by_entry_id,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
 
 async def async_setup(hass: HomeAssistant, config: dict):
     """Set up the component."""
+    await async_register_services(hass)
     return True
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
@@ -31,41 +54,163 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     # Get the config entry data
     config = dict(entry.data)  # Extract the data from the config entry
 
-    # Create the SonnenBatterie object
-    # aiohttp_session = async_get_clientsession(hass=hass)
+    # Create the SonnenBatterie object. Home Assistant's shared session is used,
+    # so connections to the battery are pooled and kept alive between polls.
+    aiohttp_session = async_get_clientsession(hass=hass)
     _LOGGER.info("Creating Sonnen Batterie host connection for %s", config[ENTRY_URL])
     sonnen_host:SonnenBatterieHost = await SonnenBatterieHost.create(
         url=config[ENTRY_URL],
         api_token=config[ENTRY_API_TOKEN],
         name=config[ENTRY_NAME],
         entry_id=entry.entry_id,
-        # aiohttp_session=aiohttp_session
+        aiohttp_session=aiohttp_session,
+        connect_timeout=entry.options.get(OPTION_CONNECT_TIMEOUT, DEFAULT_CONNECT_TIMEOUT),
+        read_timeout=entry.options.get(OPTION_READ_TIMEOUT, DEFAULT_READ_TIMEOUT),
     )
 
+    # Use the static data, i.e. the serial number, saved in the config entry. Only get it
+    # from the host before startup continues if it is not cached.
+    static_data_cached = bool(config.get(ENTRY_SERIAL_NUMBER))
+    if static_data_cached:
+        sonnen_host.restore_static_data(config[ENTRY_SERIAL_NUMBER], config.get(ENTRY_SERIAL_NUMBER_URI))
+
     # Connect to Sonnen Batterie and update the data
     try:
-        await sonnen_host.update(update_static_data=True, update_current_data=True)
-    except ClientConnectorError as e:
+        await sonnen_host.update(update_static_data=not static_data_cached, update_current_data=True)
+    except (ClientConnectorError, LookupError) as e:
         _LOGGER.error("Failed to connect to Sonnen Batterie at %s: %s", config[ENTRY_URL], e)
+        await sonnen_host.close_session()
         return False
+    if not sonnen_host.has_current_data:
+        _LOGGER.error("Failed to get data from Sonnen Batterie at %s", config[ENTRY_URL])
+        await sonnen_host.close_session()
+        return False
+
+    if static_data_cached:
+        # Check the cached static data in the background
+        entry.async_create_background_task(
+            hass, _async_refresh_static_data(hass, entry, sonnen_host), name=f"sonnen_batterie_static_data_{entry.entry_id}"
+        )
+    else:
+        _async_save_static_data(hass, entry, sonnen_host)
+
+    # Sensors for the payload fields not in SENSORS_LIST, created disabled by default
+    await async_use_discovered_sensors(hass, sonnen_host)
 
     # # Save data to file
     # import json
     # with open("sonnen_batterie_data.json", "w") as file:
     #     json.dump(sonnen_host.data, file, indent=4)
 
-    # Store the config entry data in hass.data
-    hass.data.setdefault(DOMAIN, [])  # Ensure the top-level domain list exists
-    hass.data[DOMAIN].append(sonnen_host)
-
-    # Register the platform (e.g., sensor, switch)
-    await hass.config_entries.async_forward_entry_setups(entry, ["sensor"])
+    # Store the host in hass.data, indexed by config entry id and serial number. The host
+    # owns everything running for the entry: its scheduler, transport, command queue and
+    # entities. It is removed and closed on unload, see async_unload_entry.
+    fleet = get_fleet(hass)
+    fleet.add(sonnen_host)
+    get_entity_publishers(hass)[entry.entry_id] = EntityPublisher(sonnen_host)  # Set up with the entities by the platforms
+    if entry.options.get(OPTION_FLEET_DEVICE, DEFAULT_FLEET_DEVICE) and fleet.owner_entry_id is None:
+        fleet.owner_entry_id = entry.entry_id  # The sensor platform of this entry provides the fleet device
 
-    # Schedule the update every 5 seconds
-    async_track_time_interval(hass, sonnen_host.update_callback, timedelta(seconds=POLL_FREQUENCY))
+    # Register the platforms: sensors, and numbers and selects writing to the battery
+    try:
+        await hass.config_entries.async_forward_entry_setups(entry, CONST_COMPONENT_TYPES)
+    except Exception:
+        await _async_remove_host(hass, entry, sonnen_host)
+        raise
+
+    # Poll at an interval adapted to how fast the readings change, if enabled in the options
+    if entry.options.get(OPTION_ADAPTIVE_POLLING, DEFAULT_ADAPTIVE_POLLING):
+        sonnen_host.configure_adaptive_polling(
+            min_interval=entry.options.get(OPTION_MIN_POLL_INTERVAL, DEFAULT_MIN_POLL_INTERVAL),
+            max_interval=entry.options.get(OPTION_MAX_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL),
+        )
+
+    # Reload the entry when its options are changed. The listener is also called when the
+    # cached static data is saved to the entry's data, which needs no reload.
+    entry.async_on_unload(entry.add_update_listener(functools.partial(async_reload_entry, options=dict(entry.options))))
+
+    # Start polling every POLL_FREQUENCY seconds. The scheduler never runs two polls of
+    # the host at once and offsets the first poll to spread the requests of several hosts.
+    sonnen_host.scheduler.start()
+    if fleet.owner_entry_id == entry.entry_id:
+        fleet.scheduler.start()  # Publish the fleet totals once per poll interval
 
     return True
 
+async def _async_refresh_static_data(hass: HomeAssistant, entry: ConfigEntry, sonnen_host: SonnenBatterieHost) -> None:
+    """Get the static data from the host and update the cache in the config entry if it changed."""
+    try:
+        await sonnen_host.update(update_static_data=True, update_current_data=False)
+    except Exception as e:  # noqa: BLE001  The cached data is still used
+        _LOGGER.debug("Failed to refresh static data of Sonnen Batterie at %s: %s", sonnen_host.url, e)
+        return
+    _async_save_static_data(hass, entry, sonnen_host)
+
+
+def _async_save_static_data(hass: HomeAssistant, entry: ConfigEntry, sonnen_host: SonnenBatterieHost) -> None:
+    """Cache the static data of the host in the config entry."""
+    static_data = {
+        ENTRY_SERIAL_NUMBER: sonnen_host.static_data["serial_number"],
+        ENTRY_SERIAL_NUMBER_URI: sonnen_host.static_data["serial_number_uri"],
+    }
+    if any(entry.data.get(key) != value for key, value in static_data.items()):
+        _LOGGER.info("Updating cached static data of Sonnen Batterie at %s", sonnen_host.url)
+        hass.config_entries.async_update_entry(entry, data={**entry.data, **static_data})
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
-    """Unload a config entry."""
-    return await hass.config_entries.async_unload_platforms(entry, ["sensor"])
+    """Unload a config entry, stopping everything the entry runs.
+
+    Polling stops before the platforms are unloaded, so no state is written to entities
+    that are being removed. Polling resumes if the platforms could not be unloaded.
+    """
+    fleet = get_fleet(hass)
+    sonnen_host = get_sonnen_host_by_entry_id(hass=hass, entry_id=entry.entry_id)
+    owns_fleet = fleet.owner_entry_id == entry.entry_id
+    if sonnen_host is not None:
+        await sonnen_host.scheduler.stop()
+    if owns_fleet:
+        await fleet.scheduler.stop()
+
+    unload_ok = await hass.config_entries.async_unload_platforms(entry, CONST_COMPONENT_TYPES)
+    if not unload_ok:
+        if sonnen_host is not None:
+            sonnen_host.scheduler.start()
+        if owns_fleet:
+            fleet.scheduler.start()
+        return False
+
+    if sonnen_host is not None:
+        await _async_remove_host(hass, entry, sonnen_host)
+    return True
+
+
+async def _async_remove_host(hass: HomeAssistant, entry: ConfigEntry, sonnen_host: SonnenBatterieHost) -> None:
+    """Remove the host of an entry from the fleet and close it.
+
+    If the entry provided the fleet device, another loaded entry enabling OPTION_FLEET_DEVICE
+    takes it over, so the fleet totals outlive the unload of their owner.
+    """
+    fleet = get_fleet(hass)
+    fleet_entity_adders = get_fleet_entity_adders(hass)
+    fleet_entity_adders.pop(entry.entry_id, None)
+    owns_fleet = fleet.owner_entry_id == entry.entry_id
+    if owns_fleet:
+        await fleet.scheduler.stop()
+        fleet.owner_entry_id = None
+        fleet.change_listeners.clear()  # Stop writing the fleet entities of this entry
+    publisher = get_entity_publishers(hass).pop(entry.entry_id, None)
+    if publisher is not None:
+        publisher.close()
+    fleet.remove(sonnen_host)  # Also removes its contribution to the fleet totals
+    await sonnen_host.close_session()  # Also stops its scheduler and drops pending commands
+
+    if owns_fleet and fleet_entity_adders:
+        fleet.owner_entry_id, add_fleet_entities = next(iter(fleet_entity_adders.items()))
+        _LOGGER.info("Fleet device is now provided by config entry %s", fleet.owner_entry_id)
+        add_fleet_entities()
+        fleet.scheduler.start()
+
+async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry, options: dict) -> None:
+    """Reload a config entry if its options changed from `options`, the options it was set up with."""
+    if dict(entry.options) != options:
+        await hass.config_entries.async_reload(entry.entry_id)
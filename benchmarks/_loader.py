@@ -0,0 +1,26 @@
+"""Import the integration's client outside of Home Assistant for benchmarking.
+
+The client package `sonnen_host` does not depend on Home Assistant. It is imported as a
+top-level package by its location; the integration's directory is not added to the
+path, as its `select.py` would shadow the standard library module.
+"""
+
+import importlib
+import importlib.util
+from pathlib import Path
+import sys
+
+ROOT = Path(__file__).resolve().parent.parent
+PACKAGE = "sonnen_host"
+
+
+def load(module: str):
+    """Import a module of the client, e.g. "sonnen_host.extraction"."""
+    if PACKAGE not in sys.modules:
+        path = ROOT / PACKAGE
+        spec = importlib.util.spec_from_file_location(
+            PACKAGE, path / "__init__.py", submodule_search_locations=[str(path)]
+        )
+        sys.modules[PACKAGE] = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(sys.modules[PACKAGE])
+    return importlib.import_module(module)
@@ -0,0 +1,44 @@
+"""Benchmark of the host setup with and without cached static data.
+
+Measures what async_setup_entry awaits before the entities are set up, against the
+local mock API server with a fixed latency per request:
+- without cache: dashboard + device-id script + current data (the first start)
+- with cache: current data only (every following start)
+
+Run with: python benchmarks/bench_cold_start.py [latency in ms]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from _loader import load
+from mock_server import API_TOKEN, MockSonnenServer
+
+sonnen_host = load("sonnen_host.sonnen_host")
+
+
+async def setup_host(server: MockSonnenServer, cached: bool) -> float:
+    battery = server.batteries[0]
+    start = time.perf_counter()
+    host = await sonnen_host.SonnenBatterieHost.create(url=server.url(0), api_token=API_TOKEN)
+    if cached:
+        host.restore_static_data(battery.serial_number, "/dash/device-id.js?v=1")
+    await host.update(update_static_data=not cached, update_current_data=True)
+    elapsed = time.perf_counter() - start
+    assert host.serial_number == battery.serial_number
+    await host.close_session()
+    return elapsed
+
+
+async def main(latency_ms: float) -> None:
+    async with MockSonnenServer(latency=latency_ms / 1000) as server:
+        print(f"Setup time with {latency_ms:g} ms latency per request, median of 20")
+        for label, cached in (("without cache", False), ("with cache", True)):
+            timings = [await setup_host(server, cached) for _ in range(20)]
+            print(f"{label:>14}: {statistics.median(timings) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(float(sys.argv[1]) if len(sys.argv) > 1 else 50))
@@ -0,0 +1,62 @@
+"""Flood a host with setpoint commands against the local mock API server.
+
+Simulates an automation following the solar production: a new setpoint is submitted
+every `--period` seconds for `--duration` seconds. Reports how many commands were
+submitted, how many writes reached the battery, how many were merged, and whether the
+battery ended at the last requested setpoint.
+
+Run with: python benchmarks/bench_commands.py [--duration 12] [--period 0.1] [--min-interval 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import time
+
+from _loader import load
+from mock_server import API_TOKEN, MockSonnenServer
+
+const = load("sonnen_host.const")
+sonnen_host = load("sonnen_host.sonnen_host")
+
+
+async def main(args: argparse.Namespace) -> None:
+    async with MockSonnenServer(latency=args.latency / 1000) as server:
+        battery = server.batteries[0]
+        host = await sonnen_host.SonnenBatterieHost.create(url=server.url(0), api_token=API_TOKEN)
+        host.restore_static_data(battery.serial_number)
+        host.commands.min_interval = args.min_interval
+        await host.poll()
+
+        start = time.perf_counter()
+        confirmed = await host.set_operating_mode(const.OPERATING_MODE_MANUAL, wait=True)
+        print(f"operating mode manual: confirmed={confirmed} in {time.perf_counter() - start:.2f} s")
+
+        rng = random.Random(0)
+        submitted = 0
+        last = None
+        tasks = []
+        end = time.monotonic() + args.duration
+        while time.monotonic() < end:
+            last = rng.randrange(-3000, 3000, 10)
+            tasks.append(asyncio.create_task(host.set_setpoint(last, wait=True)))
+            submitted += 1
+            await asyncio.sleep(args.period)
+        start = time.perf_counter()
+        results = await asyncio.gather(*tasks)
+        print(f"setpoint commands submitted: {submitted}, writes received by the battery: {battery.writes - 1}")
+        print(f"queue: {host.commands.stats}")
+        print(f"all commands resolved: {len(results)}, last confirmed: {results[-1]} after {time.perf_counter() - start:.2f} s")
+        print(f"last requested: {last} W, battery setpoint: {battery.setpoint} W, snapshot: {host.snapshot[host.extraction_plan.slot_of('set_point_w')]} W")
+        await host.close_session()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=12, help="Seconds of submitting commands")
+    parser.add_argument("--period", type=float, default=0.1, help="Seconds between two commands")
+    parser.add_argument("--min-interval", type=float, default=const.COMMAND_MIN_INTERVAL, help="Seconds between two writes")
+    parser.add_argument("--latency", type=float, default=5, help="Milliseconds per request")
+    asyncio.run(main(parser.parse_args()))
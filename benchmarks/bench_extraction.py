@@ -0,0 +1,79 @@
+"""Micro-benchmark of the per-poll sensor value extraction.
+
+Compares the previous approach, where every entity walked the nested host data on each
+state read, with the compiled ExtractionPlan that produces one snapshot per poll.
+
+Run with: python benchmarks/bench_extraction.py
+"""
+
+import timeit
+
+from _loader import load
+from payloads import LATESTDATA, SERIAL_NUMBER, STATUS
+
+const = load("sonnen_host.const")
+extraction = load("sonnen_host.extraction")
+
+
+def host_data():
+    """Equivalent of SonnenBatterieHost.data, which built a new dict on every access."""
+    return {
+        "host": {"url": "http://192.168.1.10", "serial_number": SERIAL_NUMBER},
+        "status": STATUS,
+        "data": LATESTDATA,
+    }
+
+
+def legacy_state(sensor_config):
+    """Equivalent of the previous SonnenBatterieEntity.state."""
+    try:
+        data = host_data()
+        for key in sensor_config[2].split("."):
+            data = data[key]
+        if sensor_config[3] == const.DATA_TYPE_FLAG_GROUP:
+            for flag, value in data.items():
+                if value is True:
+                    return flag
+            return sensor_config[6]
+        return data
+    except KeyError:
+        return sensor_config[6]
+
+
+def legacy_poll():
+    return [legacy_state(sensor_config) for sensor_config in const.SENSORS_LIST]
+
+
+plan = extraction.ExtractionPlan(const.SENSORS_LIST)
+slots = [plan.slot_of(sensor_config[0]) for sensor_config in const.SENSORS_LIST]
+
+
+def compiled_poll():
+    snapshot = plan.extract(host_data(), version=1)
+    return [snapshot[slot] for slot in slots]
+
+
+snapshot = plan.extract(host_data(), version=1)
+consumption_config = const.SENSORS_LIST[4]
+consumption_slot = plan.slot_of(consumption_config[0])
+
+
+def main():
+    number = 20000
+    print(f"{len(const.SENSORS_LIST)} sensors, {number} polls per run, best of 5")
+    for label, func in (("legacy", legacy_poll), ("compiled", compiled_poll)):
+        best = min(timeit.repeat(func, number=number, repeat=5))
+        print(f"{label:>10}: {best / number * 1e6:8.2f} us/poll")
+
+    # A single state read, which Home Assistant may do several times per state write
+    number = 200000
+    for label, func in (
+        ("legacy", lambda: legacy_state(consumption_config)),
+        ("compiled", lambda: snapshot[consumption_slot]),
+    ):
+        best = min(timeit.repeat(func, number=number, repeat=5))
+        print(f"{label:>10}: {best / number * 1e9:8.1f} ns/state read")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Benchmark of the import time of the client, outside of Home Assistant.
+
+Each module is imported in a fresh interpreter, a number of times, and the median
+import time, the number of modules imported with it and whether Home Assistant was
+imported are reported. For comparison, the Home Assistant entity helpers the client
+used to import are measured the same way.
+
+Run with: python benchmarks/bench_import.py [--runs 10]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+
+MODULES = [
+    "sonnen_host",
+    "sonnen_host.const",
+    "sonnen_host.extraction",
+    "sonnen_host.sonnen_host",
+    "sonnen_host.fleet",
+    "homeassistant.helpers.entity",
+]
+
+MEASURE = """
+import json, sys, time
+before = set(sys.modules)
+start = time.perf_counter()
+from _loader import load
+load({module!r})
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "modules": len(set(sys.modules) - before),
+    "homeassistant": "homeassistant" in sys.modules,
+    "aiohttp": "aiohttp" in sys.modules,
+}}))
+"""
+
+
+def measure(module: str, runs: int) -> dict:
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", MEASURE.format(module=module)],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout
+        results.append(json.loads(output))
+    return {
+        "ms": statistics.median(result["seconds"] for result in results) * 1000,
+        "modules": results[-1]["modules"],
+        "homeassistant": results[-1]["homeassistant"],
+        "aiohttp": results[-1]["aiohttp"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'module':<30} {'median ms':>10} {'modules':>8} {'aiohttp':>8} {'homeassistant':>14}")
+    for module in MODULES:
+        result = measure(module, args.runs)
+        print(
+            f"{module:<30} {result['ms']:>10.1f} {result['modules']:>8} "
+            f"{str(result['aiohttp']):>8} {str(result['homeassistant']):>14}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""End-to-end benchmark of the poll path against the local mock API server.
+
+For 1 to 100 simulated batteries, polls all hosts concurrently for a number of rounds
+through SonnenBatterieHost.poll(), i.e. update of the current data followed by
+publish_changes(), and reports:
+- poll latency percentiles (wall time of one host poll)
+- CPU time per poll
+- memory allocated per poll (tracemalloc peak, measured in a separate pass)
+- entity state writes per poll and per second of CPU time
+
+The entities are stood in for by a change listener counting the state writes, so the
+numbers cover the integration's own work and not Home Assistant's state machine.
+
+Run with: python benchmarks/bench_polling.py [--batteries 1 10 100] [--rounds 50] [--latency 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+
+from _loader import load
+from mock_server import API_TOKEN, MockSonnenServer
+
+const = load("sonnen_host.const")
+sonnen_host = load("sonnen_host.sonnen_host")
+
+
+class BenchmarkEntities:
+    """Stand-in for the integration's EntityPublisher with an enabled entity per sensor, counting state writes."""
+
+    def __init__(self, host) -> None:
+        self._host = host
+        self.slots = {host.extraction_plan.slot_of(sensor_config[0]) for sensor_config in const.SENSORS_LIST}
+        self.writes = 0
+        host.required_slots = lambda: self.slots
+        host.change_listeners.append(self.write_states)
+
+    def write_states(self, changes) -> None:
+        for slot in changes.slots:
+            if slot in self.slots:
+                self._host.snapshot[slot]  # Read the state, as Home Assistant does
+                self.writes += 1
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def create_hosts(server: MockSonnenServer, count: int) -> list:
+    hosts = []
+    for number in range(count):
+        host = await sonnen_host.SonnenBatterieHost.create(url=server.url(number), api_token=API_TOKEN)
+        host.restore_static_data(server.batteries[number].serial_number)
+        hosts.append(host)
+    return hosts
+
+
+async def timed_poll(host) -> float:
+    start = time.perf_counter()
+    await host.poll()
+    return time.perf_counter() - start
+
+
+async def run(batteries: int, rounds: int, server: MockSonnenServer, interval: float) -> dict:
+    hosts = await create_hosts(server, batteries)
+    entities = [BenchmarkEntities(host) for host in hosts]
+    await asyncio.gather(*(host.poll() for host in hosts))  # Warm up connections
+
+    latencies = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(rounds):
+        latencies += await asyncio.gather(*(timed_poll(host) for host in hosts))
+        await asyncio.sleep(interval)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start - rounds * interval
+    writes = sum(host_entities.writes for host_entities in entities)
+
+    # Allocations are measured separately, as tracing slows down the polls
+    tracemalloc.start()
+    peaks = []
+    for _ in range(min(rounds, 10)):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        await asyncio.gather(*(host.poll() for host in hosts))
+        peaks.append((tracemalloc.get_traced_memory()[1] - baseline) / batteries)
+        await asyncio.sleep(interval)
+    tracemalloc.stop()
+
+    for host in hosts:
+        await host.close_session()
+
+    polls = batteries * rounds
+    return {
+        "batteries": batteries,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "cpu_ms_per_poll": cpu / polls * 1000,
+        "kib_per_poll": statistics.median(peaks) / 1024,
+        "writes_per_poll": writes / (polls + batteries),
+        "writes_per_cpu_s": writes / cpu if cpu else 0.0,
+        "round_s": wall / rounds,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    print(
+        f"{'batteries':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'cpu ms/poll':>12}"
+        f" {'KiB/poll':>9} {'writes/poll':>12} {'writes/cpu s':>13}"
+    )
+    for batteries in args.batteries:
+        async with MockSonnenServer(
+            batteries=batteries,
+            latency=args.latency / 1000,
+            jitter=args.jitter / 1000,
+            error_rate=args.error_rate,
+            payload_padding=args.padding,
+            time_scale=60,  # One simulated minute per second, so values change between polls
+        ) as server:
+            result = await run(batteries, args.rounds, server, args.interval)
+        print(
+            f"{result['batteries']:>9} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f}"
+            f" {result['cpu_ms_per_poll']:>12.3f} {result['kib_per_poll']:>9.1f}"
+            f" {result['writes_per_poll']:>12.1f} {result['writes_per_cpu_s']:>13.0f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batteries", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.05, help="Seconds between poll rounds")
+    parser.add_argument("--latency", type=float, default=5, help="Milliseconds per request")
+    parser.add_argument("--jitter", type=float, default=2, help="Milliseconds of random latency variation")
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--padding", type=int, default=0, help="Extra keys added to the JSON payloads")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,95 @@
+"""Benchmark of capturing responses and replaying a capture at maximum speed.
+
+Writes a capture of `--hours` of simulated polls (status every 2 s, latest data every
+30 s, payloads from the mock server's simulated battery), then replays it through
+SonnenBatterieHost.poll() as fast as possible and reports:
+- capture size per poll and the compression ratio
+- write time per response
+- replayed polls per second and the speedup over real time
+- peak memory allocated during the replay (tracemalloc)
+
+Run with: python benchmarks/bench_replay.py [--hours 1]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from _loader import load
+from mock_server import SimulatedBattery
+
+capture = load("sonnen_host.capture")
+const = load("sonnen_host.const")
+sonnen_host = load("sonnen_host.sonnen_host")
+
+LATESTDATA_INTERVAL = 30  # Seconds, as ENDPOINT_POLL_INTERVALS
+
+
+def write_capture(path: str, hours: float) -> dict:
+    battery = SimulatedBattery(0, random.Random(0), time_scale=1.0)
+    writer = capture.CaptureWriter(path, {"url": "http://simulated", "serial_number": battery.serial_number})
+    start = time.time()
+    raw_bytes = 0
+    responses = 0
+    elapsed = 0.0
+    for poll in range(int(hours * 3600 / const.POLL_FREQUENCY)):
+        timestamp = start + poll * const.POLL_FREQUENCY
+        bodies = [(sonnen_host.URI_STATUS, json.dumps(battery.status()).encode())]
+        if poll % (LATESTDATA_INTERVAL // const.POLL_FREQUENCY) == 0:
+            bodies.append((sonnen_host.URI_DATA, json.dumps(battery.latestdata()).encode()))
+        for uri, body in bodies:
+            write_start = time.perf_counter()
+            writer.record(timestamp, uri, 200, body)
+            elapsed += time.perf_counter() - write_start
+            raw_bytes += len(body)
+            responses += 1
+    writer.close()
+    return {"polls": poll + 1, "responses": responses, "raw_bytes": raw_bytes, "write_s": elapsed, **writer.stats}
+
+
+async def replay(path: str) -> dict:
+    host = await sonnen_host.SonnenBatterieHost.create_replay(path, speed=None)
+    transport = host.transport
+    first = transport.clock()
+    tracemalloc.start()
+    start = time.perf_counter()
+    polls = 0
+    while transport.step():
+        await host.poll()
+        polls += 1
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    captured = transport.clock() - first
+    await host.close_session()
+    return {"polls": polls, "seconds": elapsed, "captured_s": captured, "peak_kib": peak / 1024}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hours", type=float, default=1.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.cap")
+        written = write_capture(path, args.hours)
+        replayed = asyncio.run(replay(path))
+
+    print(f"capture of {args.hours} h: {written['polls']} polls, {written['responses']} responses")
+    print(f"  size:        {written['bytes'] / 1024:.1f} KiB, {written['bytes'] / written['polls']:.0f} bytes/poll")
+    print(f"  compression: {written['raw_bytes'] / written['bytes']:.1f}x of {written['raw_bytes'] / 1024:.1f} KiB raw")
+    print(f"  write:       {written['write_s'] / written['responses'] * 1e6:.1f} us/response")
+    print(f"replay at maximum speed: {replayed['polls']} polls in {replayed['seconds']:.2f} s")
+    print(f"  throughput:  {replayed['polls'] / replayed['seconds']:.0f} polls/s, {replayed['captured_s'] / replayed['seconds']:.0f}x real time")
+    print(f"  peak memory: {replayed['peak_kib']:.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Benchmark of the scan of a network for batteries, as in the config flow's discovery step.
+
+Serves `--batteries` simulated batteries on the addresses 127.0.0.2, 127.0.0.3, ... and
+`--silent` servers after them that answer slower than the probe timeout, like devices
+that accept connections but never answer. Then scans 127.0.0.0/24 on their port and
+reports:
+- the time of the scan
+- the batteries found with their serial numbers
+- whether all simulated batteries were found, each once
+
+Run with: python benchmarks/bench_scan.py [--batteries 5] [--silent 10]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+
+from _loader import load
+from mock_server import API_TOKEN, MockSonnenServer
+
+const = load("sonnen_host.const")
+scan = load("sonnen_host.scan")
+
+
+async def run(batteries: int, silent: int, port: int, concurrency: int) -> None:
+    servers = [MockSonnenServer(batteries=1, seed=number) for number in range(batteries)]
+    servers += [MockSonnenServer(batteries=1, latency=const.SCAN_PROBE_TIMEOUT * 5) for _ in range(silent)]
+    for number, server in enumerate(servers):
+        await server.start(port, f"127.0.0.{number + 2}")
+    # Distinct serial numbers, as the simulated battery 0 of each server has the same one
+    for number, server in enumerate(servers):
+        server.batteries[0].serial_number = str(int(server.batteries[0].serial_number) + number)
+    try:
+        start = time.perf_counter()
+        found = await scan.scan_network("127.0.0.0/24", API_TOKEN, port=port, concurrency=concurrency)
+        elapsed = time.perf_counter() - start
+    finally:
+        for server in servers:
+            await server.stop()
+
+    print(f"scan of 127.0.0.0/24 with {concurrency} concurrent probes: {elapsed:.2f} s")
+    print(f"  {batteries} batteries, {silent} silent servers, probe timeout {const.SCAN_PROBE_TIMEOUT} s")
+    for battery in found:
+        print(f"  found {battery.label}")
+    expected = {server.batteries[0].serial_number for server in servers[:batteries]}
+    serial_numbers = [battery.serial_number for battery in found]
+    result = "ok" if sorted(serial_numbers) == sorted(expected) else "MISMATCH"
+    print(f"  found {len(found)} of {batteries} batteries: {result}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batteries", type=int, default=5)
+    parser.add_argument("--silent", type=int, default=10)
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--concurrency", type=int, default=const.SCAN_CONCURRENCY)
+    args = parser.parse_args()
+    asyncio.run(run(args.batteries, args.silent, args.port, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
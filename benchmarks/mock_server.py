@@ -0,0 +1,288 @@
+"""Local stand-in for the SonnenBatterie API.
+
+Serves /api/ready, /api/status, /api/v2/latestdata, /dash/dashboard and the device-id
+script for any number of simulated batteries, and accepts writes to the operating mode
+(/api/v2/configurations) and the setpoints (/api/v2/setpoint/charge|discharge/<W>). Battery n is served under the prefix
+/battery/<n>, battery 0 also without prefix. The payloads follow a simulated day:
+production follows the sun, consumption is a random walk and the battery charges from
+the surplus or covers the deficit. In manual operating mode it follows the setpoint.
+
+Latency, jitter, error rate and payload size are configurable, so the poll path can be
+benchmarked and regression-tested without a battery on the LAN.
+
+Run standalone with: python benchmarks/mock_server.py --port 8080 --latency 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from collections import Counter
+import copy
+import json
+import math
+import random
+import time
+
+from aiohttp import web
+
+from payloads import DASHBOARD_HTML, DEVICE_ID_SCRIPT, LATESTDATA, SERIAL_NUMBER, STATUS
+
+API_TOKEN = "mock-token"
+
+
+class SimulatedBattery:
+    """State of one simulated battery, advanced on every request."""
+
+    def __init__(self, number: int, rng: random.Random, time_scale: float) -> None:
+        self.number = number
+        self.serial_number = str(int(SERIAL_NUMBER) + number)
+        self._rng = rng
+        self._time_scale = time_scale  # Simulated seconds per real second
+        self._start = time.monotonic()
+        self._phase = rng.uniform(0, 3600)  # Batteries are not in lockstep
+        self._consumption = rng.uniform(200, 800)
+        self._capacity_wh = LATESTDATA["FullChargeCapacity"]
+        self._remaining_wh = self._capacity_wh * rng.uniform(0.2, 0.9)
+        self._last_update = self._start
+        self.operating_mode = "2"
+        self.setpoint = 0  # W, positive to discharge
+        self.writes = 0  # Number of writes to the operating mode and setpoints
+        self.write_times: list[float] = []  # Monotonic time of each write
+        self.apply_writes = True  # False to acknowledge writes without applying them, like a battery refusing them
+        self.frozen = False  # True to serve identical payloads until it is set to False again
+        self.timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.frequency = 50.0
+
+    def record_write(self) -> None:
+        self.writes += 1
+        self.write_times.append(time.monotonic())
+
+    def _advance(self) -> None:
+        if self.frozen:
+            return
+        now = time.monotonic()
+        dt = (now - self._last_update) * self._time_scale
+        self._last_update = now
+        day_seconds = ((now - self._start) * self._time_scale + self._phase + 6 * 3600) % 86400
+        sun = max(0.0, math.sin((day_seconds - 6 * 3600) / (12 * 3600) * math.pi))
+        self.production = round(6000 * sun * self._rng.uniform(0.95, 1.0))
+        self._consumption = min(5000, max(150, self._consumption + self._rng.gauss(0, 30)))
+        self.consumption = round(self._consumption)
+        surplus = self.production - self.consumption
+        soc = self._remaining_wh / self._capacity_wh
+        target = self.setpoint if self.operating_mode == "1" else -surplus  # Manual mode follows the setpoint
+        if (target < 0 and soc >= 1.0) or (target > 0 and soc <= 0.05):
+            self.pac = 0  # Battery full or empty
+        else:
+            self.pac = max(-3300, min(3300, target))  # Positive when discharging
+        self._remaining_wh = min(self._capacity_wh, max(0.0, self._remaining_wh - self.pac * dt / 3600))
+        self.grid_feed_in = surplus + self.pac
+        self.frequency = round(50 + self._rng.gauss(0, 0.01), 3)
+        self.timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+
+    def status(self) -> dict:
+        """Return the /api/status payload."""
+        self._advance()
+        soc = round(100 * self._remaining_wh / self._capacity_wh)
+        status = dict(STATUS)
+        status.update({
+            "BatteryCharging": self.pac < 0,
+            "BatteryDischarging": self.pac > 0,
+            "Consumption_Avg": self.consumption,
+            "Consumption_W": self.consumption,
+            "Fac": self.frequency,
+            "GridFeedIn_W": self.grid_feed_in,
+            "OperatingMode": self.operating_mode,
+            "Pac_total_W": self.pac,
+            "Production_W": self.production,
+            "RSOC": soc,
+            "RemainingCapacity_Wh": round(self._remaining_wh),
+            "Timestamp": self.timestamp,
+            "USOC": max(0, soc - 3),
+        })
+        return status
+
+    def latestdata(self) -> dict:
+        """Return the /api/v2/latestdata payload."""
+        status = self.status()
+        latestdata = copy.deepcopy(LATESTDATA)
+        for key in ("Consumption_W", "GridFeedIn_W", "Pac_total_W", "Production_W", "RSOC", "USOC", "Timestamp"):
+            latestdata[key] = status[key]
+        latestdata["SetPoint_W"] = self.setpoint
+        return latestdata
+
+
+class MockSonnenServer:
+    """aiohttp server simulating `batteries` SonnenBatterie hosts.
+
+    `latency` and `jitter` are in seconds. `error_rate` is the fraction of requests
+    answered with HTTP 500. `payload_padding` adds that many extra keys to the JSON
+    payloads, to benchmark larger payloads. Requests are counted per path below the
+    battery's prefix in `paths`, and paths in `failing_paths` are answered with HTTP 500.
+    """
+
+    def __init__(
+        self,
+        batteries: int = 1,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        payload_padding: int = 0,
+        time_scale: float = 1.0,
+        seed: int = 0,
+    ) -> None:
+        self._rng = random.Random(seed)
+        self.batteries = [SimulatedBattery(number, self._rng, time_scale) for number in range(batteries)]
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._padding = {f"Padding_{n}": n for n in range(payload_padding)}
+        self.requests = 0
+        self.paths: Counter[str] = Counter()  # Requests per path, e.g. "/api/status"
+        self.failing_paths: set[str] = set()
+        self._runner: web.AppRunner | None = None
+        self.host = "127.0.0.1"
+        self.port: int | None = None
+
+    def url(self, battery: int = 0) -> str:
+        """Return the URL of a simulated battery."""
+        return f"http://{self.host}:{self.port}/battery/{battery}"
+
+    def _app(self) -> web.Application:
+        app = web.Application()
+        for prefix in ("", "/battery/{battery}"):
+            app.router.add_get(f"{prefix}/api/ready", self._ready)
+            app.router.add_get(f"{prefix}/api/status", self._status)
+            app.router.add_get(f"{prefix}/api/v2/latestdata", self._latestdata)
+            app.router.add_put(f"{prefix}/api/v2/configurations", self._put_configurations)
+            app.router.add_get(f"{prefix}/api/v2/configurations/{{key}}", self._get_configuration)
+            app.router.add_post(f"{prefix}/api/v2/setpoint/{{direction}}/{{power}}", self._setpoint)
+            app.router.add_get(f"{prefix}/dash/dashboard", self._dashboard)
+            app.router.add_get(f"{prefix}/dash/device-id.js", self._device_id)
+        return app
+
+    async def _respond(self, request: web.Request, body, content_type: str = "application/json") -> web.Response:
+        self.requests += 1
+        path = request.path.removeprefix(f"/battery/{request.match_info.get('battery')}")
+        self.paths[path] += 1
+        delay = self.latency + (self._rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if path in self.failing_paths or (self.error_rate and self._rng.random() < self.error_rate):
+            return web.Response(status=500, text="Internal Server Error")
+        if request.path.startswith("/api/") and request.headers.get("Auth-Token") != API_TOKEN:
+            return web.Response(status=401, text="Unauthorized")
+        if content_type == "application/json":
+            if isinstance(body, dict) and self._padding:
+                body = {**body, **self._padding}
+            body = json.dumps(body)
+        return web.Response(text=body, content_type=content_type)
+
+    def _battery(self, request: web.Request) -> SimulatedBattery:
+        number = int(request.match_info.get("battery", 0))
+        if not 0 <= number < len(self.batteries):
+            raise web.HTTPNotFound()
+        return self.batteries[number]
+
+    async def _ready(self, request: web.Request) -> web.Response:
+        self._battery(request)
+        return await self._respond(request, "go")  # JSON encoded, i.e. "go" in quotes
+
+    async def _status(self, request: web.Request) -> web.Response:
+        return await self._respond(request, self._battery(request).status())
+
+    async def _latestdata(self, request: web.Request) -> web.Response:
+        return await self._respond(request, self._battery(request).latestdata())
+
+    async def _put_configurations(self, request: web.Request) -> web.Response:
+        battery = self._battery(request)
+        configuration = await request.json()
+        if "EM_OperatingMode" in configuration:
+            battery.record_write()
+            if battery.apply_writes:
+                battery.operating_mode = str(configuration["EM_OperatingMode"])
+        return await self._respond(request, {"EM_OperatingMode": battery.operating_mode})
+
+    async def _get_configuration(self, request: web.Request) -> web.Response:
+        battery = self._battery(request)
+        if request.match_info["key"] != "EM_OperatingMode":
+            raise web.HTTPNotFound()
+        return await self._respond(request, {"EM_OperatingMode": battery.operating_mode})
+
+    async def _setpoint(self, request: web.Request) -> web.Response:
+        battery = self._battery(request)
+        direction = request.match_info["direction"]
+        if direction not in ("charge", "discharge") or not request.match_info["power"].isdigit():
+            raise web.HTTPBadRequest()
+        battery.record_write()
+        power = int(request.match_info["power"])
+        if battery.apply_writes:
+            battery.setpoint = power if direction == "discharge" else -power
+        return await self._respond(request, True)
+
+    async def _dashboard(self, request: web.Request) -> web.Response:
+        self._battery(request)
+        return await self._respond(request, DASHBOARD_HTML, "text/html")
+
+    async def _device_id(self, request: web.Request) -> web.Response:
+        battery = self._battery(request)
+        script = DEVICE_ID_SCRIPT.replace(SERIAL_NUMBER, battery.serial_number)
+        return await self._respond(request, script, "application/javascript")
+
+    async def start(self, port: int = 0, host: str = "127.0.0.1") -> None:
+        """Start serving on `host`, on a free port if `port` is 0.
+
+        Any address of 127.0.0.0/8 can be used as `host`, to serve several batteries on
+        different addresses of one network, e.g. to benchmark a scan of the network.
+        """
+        self.host = host
+        self._runner = web.AppRunner(self._app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        """Stop serving."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> MockSonnenServer:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    server = MockSonnenServer(
+        batteries=args.batteries,
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.error_rate,
+        payload_padding=args.padding,
+        time_scale=args.time_scale,
+    )
+    await server.start(args.port, args.host)
+    print(f"Serving {args.batteries} simulated batteries at {server.url(0)} .. {server.url(args.batteries - 1)}")
+    print(f"API token: {API_TOKEN}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1", help="Address to serve on, any of 127.0.0.0/8")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--batteries", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0, help="Milliseconds per request")
+    parser.add_argument("--jitter", type=float, default=0, help="Milliseconds of random latency variation")
+    parser.add_argument("--error-rate", type=float, default=0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--padding", type=int, default=0, help="Extra keys added to the JSON payloads")
+    parser.add_argument("--time-scale", type=float, default=1, help="Simulated seconds per real second")
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
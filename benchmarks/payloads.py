@@ -0,0 +1,150 @@
+"""Sample payloads of the SonnenBatterie API, as returned by an eco 8 battery."""
+
+STATUS = {
+    "Apparent_output": 225,
+    "BackupBuffer": "0",
+    "BatteryCharging": False,
+    "BatteryDischarging": True,
+    "Consumption_Avg": 486,
+    "Consumption_W": 488,
+    "Fac": 49.98500061035156,
+    "FlowConsumptionBattery": True,
+    "FlowConsumptionGrid": False,
+    "FlowConsumptionProduction": False,
+    "FlowGridBattery": False,
+    "FlowProductionBattery": False,
+    "FlowProductionGrid": False,
+    "GridFeedIn_W": -2,
+    "IsSystemInstalled": 1,
+    "OperatingMode": "2",
+    "Pac_total_W": 486,
+    "Production_W": 0,
+    "RSOC": 52,
+    "RemainingCapacity_Wh": 4725,
+    "Sac1": 75,
+    "Sac2": 75,
+    "Sac3": 75,
+    "SystemStatus": "OnGrid",
+    "Timestamp": "2024-11-09 21:14:03",
+    "USOC": 49,
+    "Uac": 232,
+    "Ubat": 54,
+    "dischargeNotAllowed": False,
+    "generator_autostart": False,
+}
+
+LATESTDATA = {
+    "Consumption_W": 488,
+    "FullChargeCapacity": 10200,
+    "GridFeedIn_W": -2,
+    "Pac_total_W": 486,
+    "Production_W": 0,
+    "RSOC": 52,
+    "SetPoint_W": 0,
+    "Timestamp": "2024-11-09 21:14:03",
+    "USOC": 49,
+    "UTC_Offet": 1,
+    "ic_status": {
+        "DC Shutdown Reason": {
+            "Critical BMS Alarm": False,
+            "Electrolyte Leakage": False,
+            "Error condition in BMS initialization": False,
+            "HW_Shutdown": False,
+            "HardWire Over Voltage": False,
+            "HardWired Dry Signal A": False,
+            "HardWired Under Voltage": False,
+            "Holding Circuit Error": False,
+            "Initialization Timeout": False,
+            "Initialization of AC contactor failed": False,
+            "Initialization of BMS hardware failed": False,
+            "Initialization of DC contactor failed": False,
+            "Initialization of Inverter failed": False,
+            "Invalid or no SystemType was set": False,
+            "Inverter Over Temperature": False,
+            "Inverter Under Voltage": False,
+            "Inverter Version Too Low For Dc-Module": False,
+            "Manual shutdown by user": False,
+            "Minimum rSOC of System reached": False,
+            "Modules voltage out of range": False,
+            "No Setpoint received by HC": False,
+            "Odd number of battery modules": False,
+            "One single module detected and module voltage is out of range": False,
+            "Only one single module detected": False,
+            "Shutdown Timer started": False,
+            "System Validation failed": False,
+            "Voltage Monitor Changed": False,
+        },
+        "Eclipse Led": {
+            "Blinking Red": False,
+            "Brightness": 100,
+            "Pulsing Green": False,
+            "Pulsing Orange": False,
+            "Pulsing White": True,
+            "Solid Red": False,
+        },
+        "MISC Status Bits": {
+            "Discharge not allowed": False,
+            "F1 open": False,
+            "Min System SOC": False,
+            "Min User SOC": False,
+            "Setpoint Timeout": False,
+        },
+        "Microgrid Status": {
+            "Continious Power Violation": False,
+            "Discharge Current Limit Violation": False,
+            "Low Temperature": False,
+            "Max System SOC": False,
+            "Max User SOC": False,
+            "Microgrid Enabled": False,
+            "Min System SOC": False,
+            "Min User SOC": False,
+            "Over Charge Current": False,
+            "Over Discharge Current": False,
+            "Peak Power Violation": False,
+            "Protect is activated": False,
+            "Transition to Ongrid Pending": False,
+        },
+        "Setpoint Priority": {
+            "BMS": False,
+            "Energy Manager": True,
+            "Full Charge Request": False,
+            "Inverter": False,
+            "Min User SOC": False,
+            "Trickle Charge": False,
+        },
+        "System Validation": {
+            "Country Code Set status flag 1": False,
+            "Country Code Set status flag 2": False,
+            "Self test Error DC Wiring": False,
+            "Self test Postponed": False,
+            "Self test Precondition not met": False,
+            "Self test Running": False,
+            "Self test successful finished": False,
+        },
+        "nrbatterymodules": 4,
+        "nrbatterymodulesinparallel": 1,
+        "nrbatterymodulesinseries": 4,
+        "secondssincefullcharge": 52334,
+        "statebms": "ready",
+        "statecorecontrolmodule": "ongrid",
+        "stateinverter": "running",
+        "timestamp": "Sat Nov  9 21:14:02 2024",
+    },
+}
+
+SERIAL_NUMBER = "123456"
+
+DASHBOARD_HTML = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>sonnenBatterie</title>
+<link rel="stylesheet" href="/dash/assets/application.css"></head>
+<body>
+<div id="app"></div>
+<script src="/dash/assets/vendor.js"></script>
+<script src="/dash/device-id.js?v=1"></script>
+<script src="/dash/assets/application.js"></script>
+</body>
+</html>
+"""
+
+DEVICE_ID_SCRIPT = f"var SPREE_ID = '{SERIAL_NUMBER}';\n"
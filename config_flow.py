@@ -1,14 +1,46 @@
 """Config flow for Sonnen Batterie integration."""
 
+import ipaddress
 import logging
 
 from aiohttp.client_exceptions import ClientConnectorError
 import voluptuous as vol
 
 from homeassistant import config_entries
+from homeassistant.components.network import async_get_source_ip
+from homeassistant.core import callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 
-from .const import DOMAIN, ENTRY_API_TOKEN, ENTRY_NAME, ENTRY_SERIAL_NUMBER, ENTRY_URL
+from .const import (
+    DEFAULT_ADAPTIVE_POLLING,
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_FLEET_DEVICE,
+    DEFAULT_MAX_POLL_INTERVAL,
+    DEFAULT_MIN_POLL_INTERVAL,
+    DEFAULT_READ_TIMEOUT,
+    DEFAULT_SCAN_PORT,
+    DOMAIN,
+    ENTRY_API_TOKEN,
+    ENTRY_NAME,
+    ENTRY_SERIAL_NUMBER,
+    ENTRY_SERIAL_NUMBER_URI,
+    ENTRY_URL,
+    OPTION_ADAPTIVE_POLLING,
+    OPTION_CONNECT_TIMEOUT,
+    OPTION_FLEET_DEVICE,
+    OPTION_MAX_POLL_INTERVAL,
+    OPTION_MIN_POLL_INTERVAL,
+    OPTION_READ_TIMEOUT,
+    SCAN_CONCURRENCY,
+    SCAN_NETWORK,
+    SCAN_PARALLEL_PROBES,
+    SCAN_PORT,
+    SCAN_PROBE_TIMEOUT,
+    SCAN_TIMEOUT,
+)
 from .sonnen_host import SonnenBatterieHost
+from .sonnen_host.scan import scan_network
 from .utils import (
     check_entries_for_duplicate_name,
     check_entries_for_duplicate_serial_number,
@@ -23,14 +55,25 @@ class SonnenBatterieConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     VERSION = 1
     CONNECTION_CLASS = config_entries.CONN_CLASS_LOCAL_POLL
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        """Get the options flow for this handler."""
+        return SonnenBatterieOptionsFlow(config_entry)
+
     def __init__(self):
         """Initialize the config flow."""
         super().__init__()
         self.user_input = {}
         self.sonnen_batterie_host = None
+        self.scanned_batteries = {}  # URL -> ScannedBattery, found by the discover step
 
     async def async_step_user(self, user_input=None):
-        """Handle the initial step."""
+        """Handle the initial step, a choice between scanning the network and entering the URL."""
+        return self.async_show_menu(step_id="user", menu_options=["discover", "manual"])
+
+    async def async_step_manual(self, user_input=None):
+        """Handle the entry of the URL and API token of a battery."""
 
         errors = {}
         if user_input is not None:
@@ -42,6 +85,7 @@ class SonnenBatterieConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 # If no exception was raised, the connection was successful
                 _LOGGER.info("Connection to Sonnen Batterie at %s successful", user_input[ENTRY_URL])
                 user_input[ENTRY_SERIAL_NUMBER] = self.sonnen_batterie_host.serial_number
+                user_input[ENTRY_SERIAL_NUMBER_URI] = self.sonnen_batterie_host.static_data["serial_number_uri"]
                 self.user_input = user_input  # Store the user input for the next step
 
                 # Check that no other entry exists for this host name or serial number
@@ -60,7 +104,7 @@ class SonnenBatterieConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
 
         return self.async_show_form(
-            step_id="user",
+            step_id="manual",
             data_schema=vol.Schema(
                 {
                     vol.Required(ENTRY_NAME, default="My Sonnen Batterie"): str,
@@ -71,26 +115,159 @@ class SonnenBatterieConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             errors=errors,
         )
 
+    async def async_step_discover(self, user_input=None):
+        """Handle the scan of a network for batteries."""
+        errors = {}
+        if user_input is not None:
+            _LOGGER.debug("Scanning %s for Sonnen Batteries", user_input[SCAN_NETWORK])
+            try:
+                scanned = await scan_network(
+                    user_input[SCAN_NETWORK],
+                    user_input[ENTRY_API_TOKEN],
+                    session=async_get_clientsession(hass=self.hass),
+                    port=user_input[SCAN_PORT],
+                    concurrency=user_input[SCAN_PARALLEL_PROBES],
+                    timeout=user_input[SCAN_TIMEOUT],
+                )
+            except ValueError as e:
+                _LOGGER.warning("Unable to scan %s: %s", user_input[SCAN_NETWORK], e)
+                errors[SCAN_NETWORK] = "invalid_network"
+            else:
+                # Only offer batteries that can be identified and are not configured yet
+                self.scanned_batteries = {
+                    battery.url: battery
+                    for battery in scanned
+                    if battery.serial_number is not None
+                    and not check_entries_for_duplicate_serial_number(hass=self.hass, serial_number=battery.serial_number)
+                }
+                _LOGGER.info(
+                    "Found %d Sonnen Batteries in %s, %d not configured yet",
+                    len(scanned), user_input[SCAN_NETWORK], len(self.scanned_batteries),
+                )
+                if not scanned:
+                    errors["base"] = "no_batteries_found"
+                elif not self.scanned_batteries:
+                    errors["base"] = "no_new_batteries_found"
+                else:
+                    self.user_input = {ENTRY_API_TOKEN: user_input[ENTRY_API_TOKEN]}
+                    return await self.async_step_discover_select()
+
+        return self.async_show_form(
+            step_id="discover",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(SCAN_NETWORK, default=await self._default_network()): str,
+                    vol.Required(SCAN_PORT, default=DEFAULT_SCAN_PORT): vol.All(vol.Coerce(int), vol.Range(min=1, max=65535)),
+                    vol.Required(ENTRY_API_TOKEN): str,
+                    vol.Required(SCAN_TIMEOUT, default=SCAN_PROBE_TIMEOUT): vol.All(vol.Coerce(float), vol.Range(min=0.1, max=30)),
+                    vol.Required(SCAN_PARALLEL_PROBES, default=SCAN_CONCURRENCY): vol.All(vol.Coerce(int), vol.Range(min=1, max=256)),
+                }
+            ),
+            errors=errors,
+        )
+
+    async def async_step_discover_select(self, user_input=None):
+        """Handle the choice of a battery found by the scan."""
+        errors = {}
+        if user_input is not None:
+            battery = self.scanned_batteries[user_input[ENTRY_URL]]
+            if check_entries_for_duplicate_name(hass=self.hass, name=user_input[ENTRY_NAME]):
+                errors["base"] = "duplicate_name"
+            else:
+                self.user_input.update(
+                    {
+                        ENTRY_NAME: user_input[ENTRY_NAME],
+                        ENTRY_URL: battery.url,
+                        ENTRY_SERIAL_NUMBER: battery.serial_number,
+                        ENTRY_SERIAL_NUMBER_URI: battery.serial_number_uri,
+                    }
+                )
+                return await self.async_step_finish()
+
+        return self.async_show_form(
+            step_id="discover_select",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(ENTRY_URL): vol.In({url: battery.label for url, battery in self.scanned_batteries.items()}),
+                    vol.Required(ENTRY_NAME, default="My Sonnen Batterie"): str,
+                }
+            ),
+            errors=errors,
+        )
+
     async def async_step_finish(self):
         """Finish the config flow and create the entry."""
-        await self.sonnen_batterie_host.close_session()  # Close the session
+        if self.sonnen_batterie_host is not None:
+            await self.sonnen_batterie_host.close_session()  # Release the connection, the session itself is shared
         return self.async_create_entry(title=self.user_input[ENTRY_NAME], data=self.user_input)
 
-    async def async_abort(self, reason):
-        """Abort the config flow."""
-        if self.sonnen_batterie_host:
-            await self.sonnen_batterie_host.close()  # Close the session if the flow is aborted
-        return await super().async_abort(reason)
 
+    async def _default_network(self) -> str:
+        """Return the /24 network of Home Assistant's address, where the battery most likely is."""
+        try:
+            source_ip = await async_get_source_ip(self.hass)
+        except HomeAssistantError:
+            return ""
+        return str(ipaddress.ip_network(f"{source_ip}/24", strict=False))
 
     # # # Sonnen Batterie Host methods # # #
 
     async def _create_sonnen_batterie_host(self, host_url, api_token) -> SonnenBatterieHost:
-        """Create a SonnenBatterieHost object."""
-        # aiohttp_session = async_get_clientsession(hass=self.hass)
+        """Create a SonnenBatterieHost object on Home Assistant's shared session."""
         self.sonnen_batterie_host = await SonnenBatterieHost.create(
             url=host_url,
             api_token=api_token,
-            # aiohttp_session=aiohttp_session
+            aiohttp_session=async_get_clientsession(hass=self.hass),
         )
         return self.sonnen_batterie_host
+
+
+class SonnenBatterieOptionsFlow(config_entries.OptionsFlow):
+    """Handle the options of a Sonnen Batterie config entry."""
+
+    def __init__(self, config_entry):
+        """Initialize the options flow."""
+        self._config_entry = config_entry
+
+    async def async_step_init(self, user_input=None):
+        """Manage the polling options."""
+        errors = {}
+        if user_input is not None:
+            if user_input[OPTION_MIN_POLL_INTERVAL] > user_input[OPTION_MAX_POLL_INTERVAL]:
+                errors["base"] = "min_poll_interval_above_max"
+            else:
+                return self.async_create_entry(title="", data=user_input)
+
+        options = self._config_entry.options
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(
+                        OPTION_ADAPTIVE_POLLING,
+                        default=options.get(OPTION_ADAPTIVE_POLLING, DEFAULT_ADAPTIVE_POLLING),
+                    ): bool,
+                    vol.Required(
+                        OPTION_MIN_POLL_INTERVAL,
+                        default=options.get(OPTION_MIN_POLL_INTERVAL, DEFAULT_MIN_POLL_INTERVAL),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0.5, max=300)),
+                    vol.Required(
+                        OPTION_MAX_POLL_INTERVAL,
+                        default=options.get(OPTION_MAX_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0.5, max=300)),
+                    vol.Required(
+                        OPTION_CONNECT_TIMEOUT,
+                        default=options.get(OPTION_CONNECT_TIMEOUT, DEFAULT_CONNECT_TIMEOUT),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0.5, max=60)),
+                    vol.Required(
+                        OPTION_READ_TIMEOUT,
+                        default=options.get(OPTION_READ_TIMEOUT, DEFAULT_READ_TIMEOUT),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0.5, max=60)),
+                    vol.Required(
+                        OPTION_FLEET_DEVICE,
+                        default=options.get(OPTION_FLEET_DEVICE, DEFAULT_FLEET_DEVICE),
+                    ): bool,
+                }
+            ),
+            errors=errors,
+        )
@@ -1,53 +1,61 @@
 """Constants for the Sonnen Batterie integration."""
 
 DOMAIN = 'sonnen_batterie'
-CONST_COMPONENT_TYPES = ["sensor"]  # ["sensor","select","number","switch"]
+CONST_COMPONENT_TYPES = ["sensor", "number", "select"]
 
 # Configuration flow keys
 ENTRY_URL = 'host_url'
 ENTRY_NAME = 'name'
 ENTRY_API_TOKEN = 'api_token'
 ENTRY_SERIAL_NUMBER = 'serial_number'
+ENTRY_SERIAL_NUMBER_URI = 'serial_number_uri'  # Cached to skip scanning the dashboard
 
-POLL_FREQUENCY = 2  # Polling frequency in seconds
-
-DATA_TYPE_FLAG_GROUP = "flag_group"  # Custom data type for to indicate that the data is a group of boolean flags
-
-SENSORS_LIST = [
-    # ["name", "friendly name", "path in host data", "data type", "uom", "icon", "default value"]
-    ["serial_number", "Serial Number", "host.serial_number", "int", None, "mdi:identifier", None],
-    ["battery_charging", "Battery Charging", "status.BatteryCharging", "bool", None, "mdi:battery-charging", None],
-    ["battery_discharging", "Battery Discharging", "status.BatteryDischarging", "bool", None, "mdi:battery-charging", None],
-    ["consumption_avg", "Consumption Average", "status.Consumption_Avg", "int", "W", "mdi:flash", None],
-    ["consumption_w", "Consumption", "status.Consumption_W", "int", "W", "mdi:flash", None],
-    ["fac", "Frequency", "status.Fac", "float", "Hz", "mdi:sine-wave", None],
-    ["grid_feed_in_w", "Grid Feed-In", "status.GridFeedIn_W", "int", "W", "mdi:transmission-tower", None],
-    ["operating_mode", "Operating Mode", "status.OperatingMode", "str", None, "mdi:cog", None],
-    ["pac_total_w", "Total Power Consumption", "status.Pac_total_W", "int", "W", "mdi:flash", None],
-    ["production_w", "Production", "status.Production_W", "int", "W", "mdi:solar-panel", None],
-    ["rsoc", "Relative State of Charge", "status.RSOC", "int", "%", "mdi:battery", None],
-    ["remaining_capacity_wh", "Remaining Capacity", "status.RemainingCapacity_Wh", "int", "Wh", "mdi:battery", None],
-    ["system_status", "System Status", "status.SystemStatus", "str", None, "mdi:information", None],
-    # ["timestamp", "Timestamp", "status.Timestamp", "str", None, "mdi:clock", None],
-    ["usoc", "Usable State of Charge", "status.USOC", "int", "%", "mdi:battery", None],
-    ["uac", "AC Voltage", "status.Uac", "int", "V", "mdi:flash", None],
-    ["ubat", "Battery Voltage", "status.Ubat", "int", "V", "mdi:flash", None],
-    ["discharge_not_allowed", "Discharge Not Allowed", "status.dischargeNotAllowed", "bool", None, "mdi:alert", None],
-    ["full_charge_capacity", "Full Charge Capacity", "data.FullChargeCapacity", "int", "Wh", "mdi:battery", None],
-    ["set_point_w", "Set Point", "data.SetPoint_W", "int", "W", "mdi:flash", None],
-    ["utc_offset", "UTC Offset", "data.UTC_Offet", "int", "h", "mdi:clock", None],
-    ["eclipse_led_brightness", "Eclipse Led Brightness", "data.ic_status.Eclipse Led.Brightness", "int", "%", "mdi:brightness-6", None],
-    ["number_of_battery_modules", "Number of Battery Modules", "data.ic_status.nrbatterymodules", "int", None, "mdi:battery", None],
-    ["number_of_battery_modules_in_parallel", "Battery Modules in Parallel", "data.ic_status.nrbatterymodulesinparallel", "int", None, "mdi:battery", None],
-    ["number_of_battery_modules_in_series", "Battery Modules in Series", "data.ic_status.nrbatterymodulesinseries", "int", None, "mdi:battery", None],
-    ["seconds_since_full_charge", "Seconds Since Full Charge", "data.ic_status.secondssincefullcharge", "int", "s", "mdi:clock", None],
-    ["bms_state", "BMS State", "data.ic_status.statebms", "str", None, "mdi:information", None],
-    ["core_control_module_state", "Core Control Module State", "data.ic_status.statecorecontrolmodule", "str", None, "mdi:information", None],
-    ["inverter_state", "Inverter State", "data.ic_status.stateinverter", "str", None, "mdi:information", None],
-
-    ["dc_shutdown_reason", "DC Shutdown Reason", "data.ic_status.DC Shutdown Reason", DATA_TYPE_FLAG_GROUP, None, "mdi:alert", "Not shutdown"],
-    # ["droop_mode_status", "Droop mode status", "data.ic_status.Droop mode status", DATA_TYPE_FLAG_GROUP, None, "mdi:information", "Unknown"],
-    ["eclipse_led_mode", "Eclipse Led Mode", "data.ic_status.Eclipse Led", DATA_TYPE_FLAG_GROUP, None, "mdi:led-on", None, "Unknown"],
-    # ["microgrid_status", "Microgrid Status", "data.ic_status.Microgrid Status", DATA_TYPE_FLAG_GROUP, None, "mdi:led-on", None, "Unknown"]
-    ["setpoint_priority", "Setpoint Priority", "data.ic_status.Setpoint Priority", DATA_TYPE_FLAG_GROUP, None, "mdi:priority-high", None, "Unknown"]
+# Discovery step keys, to scan a network for batteries instead of entering the URL
+SCAN_NETWORK = 'network'
+SCAN_PORT = 'port'
+SCAN_TIMEOUT = 'probe_timeout'
+SCAN_PARALLEL_PROBES = 'parallel_probes'
+
+# Options flow keys
+OPTION_ADAPTIVE_POLLING = 'adaptive_polling'
+OPTION_MIN_POLL_INTERVAL = 'min_poll_interval'
+OPTION_MAX_POLL_INTERVAL = 'max_poll_interval'
+OPTION_CONNECT_TIMEOUT = 'connect_timeout'
+OPTION_READ_TIMEOUT = 'read_timeout'
+OPTION_FLEET_DEVICE = 'fleet_device'
+
+# Constants of the client, which does not depend on Home Assistant
+from .sonnen_host.const import *  # noqa: E402,F401,F403
+
+DEFAULT_FLEET_DEVICE = False  # Provide a virtual device with totals across all batteries
+DEFAULT_SCAN_PORT = 80  # Port of the battery API
+
+FLEET_SENSORS_LIST = [
+    # Totals across all configured batteries, presented by the virtual fleet device (see OPTION_FLEET_DEVICE).
+    # ["name", "friendly name", "aggregate", "data type", "uom", "icon", "default value"]
+    # Aggregates are defined in sonnen_host/fleet.py.
+    ["power", "Fleet Battery Power", "power", "int", "W", "mdi:flash", None],
+    ["production", "Fleet Production", "production", "int", "W", "mdi:solar-panel", None],
+    ["consumption", "Fleet Consumption", "consumption", "int", "W", "mdi:flash", None],
+    ["grid_feed_in", "Fleet Grid Feed-In", "grid_feed_in", "int", "W", "mdi:transmission-tower", None],
+    ["capacity", "Fleet Capacity", "capacity", "int", "Wh", "mdi:battery", None],
+    ["remaining_capacity", "Fleet Remaining Capacity", "remaining_capacity", "int", "Wh", "mdi:battery", None],
+    ["usable_capacity", "Fleet Usable Capacity", "usable_capacity", "int", "Wh", "mdi:battery", None],
+    ["state_of_charge", "Fleet State of Charge", "state_of_charge", "float", "%", "mdi:battery", None],
+    ["units_online", "Fleet Units Online", "units_online", "int", None, "mdi:counter", None],
+    ["units_charging", "Fleet Units Charging", "units_charging", "int", None, "mdi:battery-charging", None],
+    ["units_discharging", "Fleet Units Discharging", "units_discharging", "int", None, "mdi:battery-minus", None],
+]
+
+DIAGNOSTIC_SENSORS_LIST = [
+    # ["name", "friendly name", "attribute path on the host", "data type", "uom", "icon", "default value", "enabled by default"]
+    ["poll_interval", "Poll Interval", "scheduler.interval", "float", "s", "mdi:timer-outline", None, True],
+    ["circuit_breaker", "Circuit Breaker", "breaker.state", "str", None, "mdi:electric-switch", None, True],
+    ["consecutive_failures", "Consecutive Failures", "breaker.consecutive_failures", "int", None, "mdi:alert-circle-outline", None, True],
+    # Poll pipeline instrumentation, see sonnen_host/metrics.py. Latencies are 95th percentiles since start.
+    ["status_latency_p95", "Status Latency P95", "metrics.latency.status.p95", "float", "ms", "mdi:timer-sand", None, False],
+    ["latestdata_latency_p95", "Latest Data Latency P95", "metrics.latency.data.p95", "float", "ms", "mdi:timer-sand", None, False],
+    ["poll_duration_p95", "Poll Duration P95", "metrics.stages.poll.p95", "float", "ms", "mdi:timer-sand", None, False],
+    ["publish_duration_p95", "Publish Duration P95", "metrics.stages.publish.p95", "float", "ms", "mdi:timer-sand", None, False],
+    ["bytes_received", "Bytes Received", "metrics.total_bytes", "int", "B", "mdi:download-network-outline", None, False],
 ]
@@ -0,0 +1,24 @@
+"""Diagnostics support for the Sonnen Batterie integration."""
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import ENTRY_API_TOKEN
+from .utils import get_sonnen_host_by_entry_id
+
+TO_REDACT = {ENTRY_API_TOKEN}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, config_entry: ConfigEntry) -> dict[str, Any]:
+    """Return diagnostics for a config entry, with the poll pipeline's counters and latency histograms."""
+    sonnen_host = get_sonnen_host_by_entry_id(hass=hass, entry_id=config_entry.entry_id)
+    return {
+        "entry": {
+            "data": async_redact_data(dict(config_entry.data), TO_REDACT),
+            "options": dict(config_entry.options),
+        },
+        "host": None if sonnen_host is None else sonnen_host.diagnostics,
+    }
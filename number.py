@@ -0,0 +1,73 @@
+"""Number platform for Sonnen Batterie integration. This platform creates the charge and discharge setpoints."""
+
+from homeassistant.components.number import NumberEntity, NumberMode
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import MAX_SETPOINT_POWER
+from .sonnen_host import SonnenBatterieHost
+from .utils import get_device_info, get_entity_publisher_by_entry_id, get_sonnen_host_by_entry_id, normalize_host_name
+
+SETPOINT_DIRECTIONS = {
+    # direction: (friendly name, icon, sign of the setpoint for this direction)
+    "charge": ("Charge Setpoint", "mdi:battery-arrow-up", -1),
+    "discharge": ("Discharge Setpoint", "mdi:battery-arrow-down", 1),
+}
+
+
+async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, async_add_entities):
+    """Set up the setpoints from a config entry."""
+    sonnen_host: SonnenBatterieHost = get_sonnen_host_by_entry_id(hass=hass, entry_id=config_entry.entry_id)
+    entities = [SonnenBatterieSetpointNumber(sonnen_host, direction) for direction in SETPOINT_DIRECTIONS]
+    publisher = get_entity_publisher_by_entry_id(hass=hass, entry_id=config_entry.entry_id)
+    publisher.control_entities = publisher.control_entities + entities  # Published when the setpoint changes
+    async_add_entities(entities)
+
+
+class SonnenBatterieSetpointNumber(NumberEntity):
+    """Charge or discharge setpoint of a Sonnen Batterie in W.
+
+    Both entities present and write the same setpoint, SetPoint_W in latestdata, which
+    is positive when discharging and negative when charging. Setting one replaces the
+    other. The battery only applies setpoints in manual operating mode.
+    """
+
+    def __init__(self, sonnen_host: SonnenBatterieHost, direction: str) -> None:
+        """Initialize the setpoint."""
+        self._sonnen_host = sonnen_host
+        name, icon, self._sign = SETPOINT_DIRECTIONS[direction]
+        self.slot = sonnen_host.extraction_plan.slot_of("set_point_w")  # Index in the host snapshot
+
+        host_name_normalized = normalize_host_name(sonnen_host.name)
+        self._attr_should_poll = False  # States are written by the entity publisher when the setpoint changes
+        self._attr_name = name
+        self._attr_icon = icon
+        self._attr_native_min_value = 0
+        self._attr_native_max_value = MAX_SETPOINT_POWER
+        self._attr_native_step = 1
+        self._attr_native_unit_of_measurement = "W"
+        self._attr_mode = NumberMode.BOX
+        self._attr_unique_id = f"sonnen_batterie_{sonnen_host.serial_number}_{direction}_setpoint"
+        self.entity_id = f"number.{host_name_normalized}_{direction}_setpoint"
+
+    @property
+    def native_value(self):
+        """Return the setpoint in this direction, 0 while the setpoint is in the other direction."""
+        setpoint = self._sonnen_host.snapshot[self.slot]
+        if type(setpoint) is not int:  # noqa: E721
+            return None
+        return max(self._sign * setpoint, 0)
+
+    @property
+    def available(self):
+        """Return False while polling of the host is paused by its circuit breaker."""
+        return not self._sonnen_host.breaker.is_open
+
+    @property
+    def device_info(self):
+        """Return information to link this entity to a device."""
+        return get_device_info(self._sonnen_host)
+
+    async def async_set_native_value(self, value: float) -> None:
+        """Queue a write of the setpoint to the battery."""
+        await self._sonnen_host.set_setpoint(self._sign * round(value))
@@ -0,0 +1,312 @@
+"""Time-boxed profiling of the poll and entity update path, see the `profile` service.
+
+While a session runs, the poll methods of SonnenBatterieHost and the `state` property
+of the sensor entities are replaced by wrappers. A wrapper enables cProfile only while
+the wrapped code runs, and measures how long each call blocks the event loop. With
+allocation tracking, tracemalloc traces every allocation for the whole session, which
+slows down all code, and the wrappers attribute the allocations made while the wrapped
+code runs to it. Coroutines are timed per step between two awaits, as the event loop
+runs other tasks while they wait. A monitor task measures how late the event loop
+wakes it up, i.e. how long anything blocked the loop.
+
+The original methods are restored when the session ends, so nothing is wrapped and
+there is no overhead when no session runs. Steps of calls still running then, e.g. a
+poll waiting for a response, are no longer profiled.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import functools
+import inspect
+import os
+import pstats
+import time
+import tracemalloc
+
+from .sensor import SonnenBatterieEntity
+from .sonnen_host import SonnenBatterieHost
+
+# Methods of the poll path. The scheduler calls `poll`, which fetches and extracts the
+# data in `_get_current_data_from_host`, adds the samples to the statistics and energy
+# counters in `_record_samples` and passes the changes to the entity publisher in `publish_changes`.
+# `update` is the same path for the initial update and the refresh of the static data.
+PROFILED_HOST_METHODS = ("update", "_get_current_data_from_host", "_record_samples", "publish_changes")
+
+LOOP_LAG_INTERVAL = 0.05  # Seconds between two wake-ups of the event loop monitor
+LOOP_BLOCKED_THRESHOLD = 0.1  # Seconds the event loop is late at least to count as blocked
+SUMMARY_TOP_FUNCTIONS = 25
+SUMMARY_TOP_ALLOCATIONS = 10
+# Functions of the coroutine driver below, left out of the top functions
+_DRIVER_FUNCTIONS = {"<method 'send' of 'coroutine' objects>", "<method 'throw' of 'coroutine' objects>"}
+
+
+class TargetStats:
+    """Calls of a profiled method and the time they blocked the event loop."""
+
+    __slots__ = ("calls", "blocking", "max_step")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.blocking = 0.0  # Seconds, total of all steps of all calls
+        self.max_step = 0.0  # Seconds, longest step, i.e. the longest time a call blocked the event loop at once
+
+    def add_step(self, elapsed: float) -> None:
+        self.blocking += elapsed
+        if elapsed > self.max_step:
+            self.max_step = elapsed
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "blocking_ms": round(self.blocking * 1000, 3),
+            "blocking_ms_per_call": round(self.blocking * 1000 / self.calls, 3) if self.calls else None,
+            "max_step_ms": round(self.max_step * 1000, 3),
+        }
+
+
+class _ProfiledCoroutine:
+    """Drive a coroutine, profiling each step between two awaits."""
+
+    __slots__ = ("_session", "_stats", "_coroutine")
+
+    def __init__(self, session: ProfilingSession, stats: TargetStats, coroutine) -> None:
+        self._session = session
+        self._stats = stats
+        self._coroutine = coroutine
+
+    def __await__(self):
+        coroutine = self._coroutine
+        send, value = coroutine.send, None
+        self._stats.calls += 1
+        while True:
+            self._session.enter()
+            start = time.perf_counter()
+            try:
+                yielded = send(value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self._stats.add_step(time.perf_counter() - start)
+                self._session.exit()
+            try:
+                value = yield yielded
+                send = coroutine.send
+            except GeneratorExit:
+                coroutine.close()
+                raise
+            except BaseException as e:  # E.g. the cancellation of the task, passed on to the coroutine
+                send, value = coroutine.throw, e
+
+
+class ProfilingSession:
+    """Profile the poll path of all hosts and the entity states until `stop` is called.
+
+    With `trace_allocations`, the memory allocated while the profiled code runs is
+    traced as well, which slows it down considerably more than cProfile alone.
+    """
+
+    def __init__(self, hosts: list[SonnenBatterieHost], trace_allocations: bool = True) -> None:
+        self.hosts = hosts
+        self.trace_allocations = trace_allocations
+        self.targets: dict[str, TargetStats] = {}
+        self.profiler = cProfile.Profile()
+        self.polls = 0
+        self.allocated = 0  # Bytes allocated at peak by the profiled code, summed over its steps
+        self.loop_lag = {"wakeups": 0, "total": 0.0, "max": 0.0, "blocked": 0, "blocked_total": 0.0}
+        self.started: float | None = None
+        self.duration = 0.0
+        self._depth = 0  # Nesting of profiled calls, as profiled methods call each other
+        self._allocated_at_enter = 0
+        self._patches: list[tuple[type, str, object]] = []  # Class, attribute, original value
+        self._monitor: asyncio.Task | None = None
+        self._was_tracing = False
+        self._snapshot: tracemalloc.Snapshot | None = None
+        self._stopped = False
+
+    def enter(self) -> None:
+        """Start profiling a step of the profiled code, unless it is called from profiled code or the session stopped."""
+        if self._stopped:
+            return  # E.g. a poll started during the session, while the profile is written in an executor
+        self._depth += 1
+        if self._depth == 1:
+            if self.trace_allocations:
+                self._allocated_at_enter = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+            self.profiler.enable()
+
+    def exit(self) -> None:
+        """Stop profiling at the end of the outermost profiled step."""
+        if self._stopped:
+            return
+        self._depth -= 1
+        if self._depth == 0:
+            self.profiler.disable()
+            if self.trace_allocations:
+                self.allocated += tracemalloc.get_traced_memory()[1] - self._allocated_at_enter
+
+    def _wrap_function(self, name: str, function):
+        stats = self.targets[name] = TargetStats()
+        if inspect.iscoroutinefunction(function):
+
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                return await _ProfiledCoroutine(self, stats, function(*args, **kwargs))
+
+        else:
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                stats.calls += 1
+                self.enter()
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    stats.add_step(time.perf_counter() - start)
+                    self.exit()
+
+        return wrapper
+
+    def _patch(self, cls: type, attribute: str) -> None:
+        original = vars(cls)[attribute]
+        name = f"{cls.__name__}.{attribute}"
+        if isinstance(original, property):
+            patched = property(self._wrap_function(name, original.fget), original.fset, original.fdel, original.__doc__)
+        else:
+            patched = self._wrap_function(name, original)
+        self._patches.append((cls, attribute, original))
+        setattr(cls, attribute, patched)
+
+    def _count_poll(self, host: SonnenBatterieHost) -> None:
+        self.polls += 1
+
+    async def _monitor_loop_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        lag = self.loop_lag
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            late = max(0.0, loop.time() - start - LOOP_LAG_INTERVAL)
+            lag["wakeups"] += 1
+            lag["total"] += late
+            lag["max"] = max(lag["max"], late)
+            if late >= LOOP_BLOCKED_THRESHOLD:
+                lag["blocked"] += 1
+                lag["blocked_total"] += late
+
+    def start(self) -> None:
+        """Wrap the profiled methods and start the event loop monitor."""
+        for attribute in PROFILED_HOST_METHODS:
+            self._patch(SonnenBatterieHost, attribute)
+        entity_classes = [SonnenBatterieEntity]
+        for cls in entity_classes:
+            entity_classes.extend(cls.__subclasses__())
+        for cls in entity_classes:
+            if "state" in vars(cls):
+                self._patch(cls, "state")
+        for host in self.hosts:
+            host.poll_listeners.append(self._count_poll)
+        if self.trace_allocations:
+            self._was_tracing = tracemalloc.is_tracing()
+            if not self._was_tracing:
+                tracemalloc.start()
+        self._monitor = asyncio.get_running_loop().create_task(self._monitor_loop_lag(), name="sonnen_profiling_loop_monitor")
+        self.started = time.monotonic()
+
+    async def stop(self) -> None:
+        """Restore the profiled methods and stop the event loop monitor."""
+        self._stopped = True
+        self.duration = time.monotonic() - self.started
+        for cls, attribute, original in reversed(self._patches):
+            setattr(cls, attribute, original)
+        self._patches.clear()
+        for host in self.hosts:
+            if self._count_poll in host.poll_listeners:
+                host.poll_listeners.remove(self._count_poll)
+        self._monitor.cancel()
+        try:
+            await self._monitor
+        except asyncio.CancelledError:
+            pass
+        if self.trace_allocations:
+            # Allocations still held by the integration's code, e.g. growing caches
+            self._snapshot = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(True, os.path.join(os.path.dirname(__file__), "*")), tracemalloc.Filter(False, __file__)]
+            )
+            if not self._was_tracing:
+                tracemalloc.stop()
+
+    def summary(self) -> dict:
+        """Return the results of the stopped session."""
+        lag = self.loop_lag
+        summary = {
+            "duration_s": round(self.duration, 1),
+            "hosts": len(self.hosts),
+            "polls": self.polls,
+            "targets": {name: stats.as_dict() for name, stats in self.targets.items() if stats.calls},
+            "event_loop": {
+                "max_lag_ms": round(lag["max"] * 1000, 1),
+                "mean_lag_ms": round(lag["total"] * 1000 / lag["wakeups"], 3) if lag["wakeups"] else None,
+                "blocked_count": lag["blocked"],
+                "blocked_ms": round(lag["blocked_total"] * 1000, 1),
+            },
+            "top_functions": [],
+        }
+        if self.trace_allocations:
+            summary["allocated_kib_per_poll"] = round(self.allocated / 1024 / self.polls, 1) if self.polls else None
+            summary["retained_allocations"] = [
+                f"{statistic.traceback}: {statistic.size / 1024:.1f} KiB in {statistic.count} blocks"
+                for statistic in self._snapshot.statistics("lineno")[:SUMMARY_TOP_ALLOCATIONS]
+            ]
+        if self.profiler.getstats():
+            stats = pstats.Stats(self.profiler).sort_stats(pstats.SortKey.CUMULATIVE)
+            functions = [
+                function for function in stats.fcn_list if function[0] != __file__ and function[2] not in _DRIVER_FUNCTIONS
+            ]
+            for function in functions[:SUMMARY_TOP_FUNCTIONS]:
+                _, calls, own_time, cumulative_time, _ = stats.stats[function]
+                summary["top_functions"].append(
+                    f"{cumulative_time * 1000:.1f} ms cumulative, {own_time * 1000:.1f} ms own, "
+                    f"{calls} calls: {pstats.func_std_string(function)}"
+                )
+        return summary
+
+    def write(self, path: str) -> dict:
+        """Write the profile to `path`.prof and the summary to `path`.txt, and return the summary.
+
+        Does blocking I/O, call it in an executor.
+        """
+        self.profiler.dump_stats(f"{path}.prof")
+        summary = self.summary()
+        with open(f"{path}.txt", "w", encoding="utf-8") as file:
+            file.write(format_summary(summary))
+        summary["files"] = [f"{path}.prof", f"{path}.txt"]
+        return summary
+
+
+def format_summary(summary: dict) -> str:
+    """Return the summary of a session as text."""
+    lines = [
+        f"Profiled {summary['polls']} polls of {summary['hosts']} Sonnen Batteries in {summary['duration_s']} s",
+        "",
+        "Event loop:",
+        *(f"  {key}: {value}" for key, value in summary["event_loop"].items()),
+        "",
+        "Time blocking the event loop:",
+        *(
+            f"  {name}: {stats['calls']} calls, {stats['blocking_ms']} ms total, "
+            f"{stats['blocking_ms_per_call']} ms per call, longest step {stats['max_step_ms']} ms"
+            for name, stats in summary["targets"].items()
+        ),
+    ]
+    if "allocated_kib_per_poll" in summary:
+        lines += [
+            "",
+            f"Allocated per poll: {summary['allocated_kib_per_poll']} KiB",
+            "Allocations still held by the integration:",
+            *(f"  {allocation}" for allocation in summary["retained_allocations"]),
+        ]
+    lines += ["", "Top functions by cumulative time:", *(f"  {function}" for function in summary["top_functions"])]
+    return "\n".join(lines) + "\n"
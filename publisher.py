@@ -0,0 +1,103 @@
+"""Writing the states of the entities when the values they present change.
+
+The client reports what changed after each poll, see SonnenBatterieHost.publish_changes
+and SonnenFleet.publish_changes. The entities themselves only live in the integration.
+"""
+
+from __future__ import annotations
+
+from typing import List
+
+from homeassistant.helpers.entity import Entity
+
+from .sonnen_host import SonnenBatterieHost, StateChanges
+
+
+class EntityPublisher:
+    """Entities of a host, written by the host's change listener `write_states`.
+
+    Only the entities presenting the changed slots, derived metrics and statistics are
+    written, and only once they have been added to Home Assistant. The energy and
+    diagnostic entities are refreshed on every publish. The enabled entities also decide
+    which endpoints the host fetches, see `required_slots`.
+    """
+
+    def __init__(self, sonnen_host: SonnenBatterieHost) -> None:
+        self._sonnen_host = sonnen_host
+        self._entities: List[Entity] = []  # Entities presenting a sensor value
+        self._control_entities: List[Entity] = []  # Number and select entities writing to the host
+        self._entities_by_slot: dict[int, List[Entity]] = {}
+        self.diagnostic_entities: List[Entity] = []  # Entities presenting the host's own state, e.g. the poll interval
+        self.statistics_entities: List[Entity] = []  # Entities presenting downsampled statistics of sensors
+        self.energy_entities: List[Entity] = []  # Entities presenting the energy counters
+        self.derived_entities: List[Entity] = []  # Entities presenting the derived metrics
+        sonnen_host.change_listeners.append(self.write_states)
+
+    def close(self) -> None:
+        """Stop writing the states of the entities, e.g. when the entry is unloaded."""
+        if self.write_states in self._sonnen_host.change_listeners:
+            self._sonnen_host.change_listeners.remove(self.write_states)
+        self._sonnen_host.required_slots = None
+
+    @property
+    def entities(self) -> List[Entity]:
+        """Entities presenting a sensor value of the host."""
+        return self._entities
+
+    @entities.setter
+    def entities(self, entities: List[Entity]) -> None:
+        self._entities = entities
+        self._index_entities()
+
+    @property
+    def control_entities(self) -> List[Entity]:
+        """Number and select entities that write to the host and present a sensor value."""
+        return self._control_entities
+
+    @control_entities.setter
+    def control_entities(self, entities: List[Entity]) -> None:
+        self._control_entities = entities
+        self._index_entities()
+
+    def _index_entities(self) -> None:
+        self._entities_by_slot = {}
+        for entity in self._entities + self._control_entities:
+            self._entities_by_slot.setdefault(entity.slot, []).append(entity)
+        # The host fetches all endpoints until the sensor entities are set
+        self._sonnen_host.required_slots = self.required_slots if self._entities else None
+        self._sonnen_host.republish_all()  # Publish all values to the new entities
+
+    def required_slots(self) -> set[int]:
+        """Slots read by at least one enabled entity, including the number and select entities."""
+        required = {
+            entity.slot
+            for entity in self._entities + self.statistics_entities + self.energy_entities + self._control_entities
+            if entity.enabled
+        }
+        required.update(slot for entity in self.derived_entities if entity.enabled for slot in entity.input_slots)
+        return required
+
+    def write_states(self, changes: StateChanges) -> None:
+        """Write the states of the entities whose values changed. Change listener of the host."""
+        for slot in changes.slots:
+            for entity in self._entities_by_slot.get(slot, ()):
+                if entity.hass is not None:  # Entity has been added to Home Assistant
+                    entity.async_write_ha_state()
+        if changes.derived:
+            for entity in self.derived_entities:
+                if entity.hass is not None and entity.metric_name in changes.derived:
+                    entity.async_write_ha_state()
+        if changes.statistics:
+            for entity in self.statistics_entities:
+                if entity.hass is not None and entity.statistic_name in changes.statistics:
+                    entity.async_write_ha_state()
+        for entity in self.energy_entities + self.diagnostic_entities:
+            if entity.hass is not None and entity.refresh():
+                entity.async_write_ha_state()
+
+
+def write_fleet_states(entities: List[Entity], values: dict) -> None:
+    """Write the states of the fleet entities whose values changed. Change listener of the fleet."""
+    for entity in entities:
+        if entity.hass is not None and entity.refresh(values):
+            entity.async_write_ha_state()
@@ -0,0 +1,55 @@
+"""Select platform for Sonnen Batterie integration. This platform creates the operating mode selection."""
+
+from homeassistant.components.select import SelectEntity
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import OPERATING_MODES
+from .sonnen_host import SonnenBatterieHost
+from .utils import get_device_info, get_entity_publisher_by_entry_id, get_sonnen_host_by_entry_id, normalize_host_name
+
+
+async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, async_add_entities):
+    """Set up the operating mode selection from a config entry."""
+    sonnen_host: SonnenBatterieHost = get_sonnen_host_by_entry_id(hass=hass, entry_id=config_entry.entry_id)
+    entities = [SonnenBatterieOperatingModeSelect(sonnen_host)]
+    publisher = get_entity_publisher_by_entry_id(hass=hass, entry_id=config_entry.entry_id)
+    publisher.control_entities = publisher.control_entities + entities  # Published when the mode changes
+    async_add_entities(entities)
+
+
+class SonnenBatterieOperatingModeSelect(SelectEntity):
+    """Operating mode of a Sonnen Batterie, see OPERATING_MODES."""
+
+    def __init__(self, sonnen_host: SonnenBatterieHost) -> None:
+        """Initialize the selection."""
+        self._sonnen_host = sonnen_host
+        self.slot = sonnen_host.extraction_plan.slot_of("operating_mode")  # Index in the host snapshot
+        self._modes = {name: mode for mode, name in OPERATING_MODES.items()}
+
+        host_name_normalized = normalize_host_name(sonnen_host.name)
+        self._attr_should_poll = False  # States are written by the entity publisher when the mode changes
+        self._attr_name = "Operating Mode"
+        self._attr_icon = "mdi:cog"
+        self._attr_options = list(self._modes)
+        self._attr_unique_id = f"sonnen_batterie_{sonnen_host.serial_number}_operating_mode_select"
+        self.entity_id = f"select.{host_name_normalized}_operating_mode"
+
+    @property
+    def current_option(self):
+        """Return the name of the current operating mode."""
+        return OPERATING_MODES.get(self._sonnen_host.snapshot[self.slot])
+
+    @property
+    def available(self):
+        """Return False while polling of the host is paused by its circuit breaker."""
+        return not self._sonnen_host.breaker.is_open
+
+    @property
+    def device_info(self):
+        """Return information to link this entity to a device."""
+        return get_device_info(self._sonnen_host)
+
+    async def async_select_option(self, option: str) -> None:
+        """Queue a write of the operating mode to the battery."""
+        await self._sonnen_host.set_operating_mode(self._modes[option])
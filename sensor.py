@@ -1,17 +1,38 @@
 """Sensor platform for Sonnen Batterie integration. This platform creates sensors for the Sonnen Batterie integration."""
 
 from collections.abc import Coroutine
+import functools
 import logging
 from typing import Any
 
-from homeassistant.components.sensor import SensorEntity
+from homeassistant.components.sensor import SensorDeviceClass, SensorEntity, SensorStateClass
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers.entity import EntityCategory
+from homeassistant.helpers.restore_state import RestoreEntity
 
-from .const import DATA_TYPE_FLAG_GROUP, SENSORS_LIST
-from .sonnen_host import SonnenBatterieHost
-from .utils import get_sonnen_host_by_entry_id
+from .const import (
+    DEFAULT_FLEET_DEVICE,
+    DERIVED_SENSORS_LIST,
+    DIAGNOSTIC_SENSORS_LIST,
+    ENERGY_SENSORS_LIST,
+    FLEET_SENSORS_LIST,
+    OPTION_FLEET_DEVICE,
+    SENSORS_LIST,
+    STATISTICS_SENSORS_LIST,
+)
+from .publisher import EntityPublisher, write_fleet_states
+from .sonnen_host import SonnenBatterieHost, SonnenFleet
+from .utils import (
+    get_device_info,
+    get_entity_publisher_by_entry_id,
+    get_fleet,
+    get_fleet_device_info,
+    get_fleet_entity_adders,
+    get_sonnen_host_by_entry_id,
+    normalize_host_name,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -20,10 +41,11 @@ async def async_setup_entry(hass, config_entry:ConfigEntry, async_add_entities):
     """Set up sensors from a config entry."""
     sonnen_host: SonnenBatterieHost = get_sonnen_host_by_entry_id(hass=hass, entry_id=config_entry.entry_id)
 
-    # Create a sensor for each sensor in the list and 
-    # add them to the host object for reference (to be able
-    # to update the state of the sensors later)
-    sonnen_host.entities = [
+    # Create a sensor for each sensor in the list and
+    # add them to the entry's publisher, which writes
+    # their states when the host reports changed values
+    publisher: EntityPublisher = get_entity_publisher_by_entry_id(hass=hass, entry_id=config_entry.entry_id)
+    publisher.entities = [
         SonnenBatterieEntity(
             hass=hass,
             sonnen_host=sonnen_host,
@@ -31,18 +53,93 @@ async def async_setup_entry(hass, config_entry:ConfigEntry, async_add_entities):
             config_entry=config_entry
         )
         for sensor_config in SENSORS_LIST
+    ] + [
+        SonnenBatterieDiscoveredEntity(
+            hass=hass,
+            sonnen_host=sonnen_host,
+            sensor_config=sensor_config,
+            config_entry=config_entry
+        )
+        for sensor_config in sonnen_host.discovered_sensors
+    ]
+
+    # Sensors presenting metrics derived from other values
+    publisher.derived_entities = [
+        SonnenBatterieDerivedEntity(
+            hass=hass,
+            sonnen_host=sonnen_host,
+            sensor_config=sensor_config,
+            config_entry=config_entry
+        )
+        for sensor_config in DERIVED_SENSORS_LIST
+    ]
+
+    # Sensors presenting downsampled statistics of the high-rate sensors
+    publisher.statistics_entities = [
+        SonnenBatterieStatisticsEntity(
+            hass=hass,
+            sonnen_host=sonnen_host,
+            sensor_config=sensor_config,
+            config_entry=config_entry
+        )
+        for sensor_config in STATISTICS_SENSORS_LIST
+    ]
+
+    # Sensors presenting the energy integrated from the power sensors
+    publisher.energy_entities = [
+        SonnenBatterieEnergyEntity(
+            hass=hass,
+            sonnen_host=sonnen_host,
+            sensor_config=sensor_config,
+            config_entry=config_entry
+        )
+        for sensor_config in ENERGY_SENSORS_LIST
+    ]
+
+    # Sensors presenting the state of the host connection itself
+    publisher.diagnostic_entities = [
+        SonnenBatterieDiagnosticEntity(
+            hass=hass,
+            sonnen_host=sonnen_host,
+            sensor_config=sensor_config,
+            config_entry=config_entry
+        )
+        for sensor_config in DIAGNOSTIC_SENSORS_LIST
     ]
 
     # Add the entities to Home Assistant
-    async_add_entities(sonnen_host.entities)
+    async_add_entities(
+        publisher.entities
+        + publisher.derived_entities
+        + publisher.statistics_entities
+        + publisher.energy_entities
+        + publisher.diagnostic_entities
+    )
 
     # Register the device
     device_registry = dr.async_get(hass)
     device_registry.async_get_or_create(
         config_entry_id=config_entry.entry_id,
-        **sonnen_host.device_info  # Unpack the device info
+        **get_device_info(sonnen_host)  # Unpack the device info
     )
 
+    # Sensors presenting the totals across all batteries, provided by one config entry. Every
+    # entry enabling them registers how to add them, to take over when the owner is unloaded.
+    if config_entry.options.get(OPTION_FLEET_DEVICE, DEFAULT_FLEET_DEVICE):
+        add_fleet_entities = functools.partial(_async_add_fleet_entities, hass, config_entry, async_add_entities)
+        get_fleet_entity_adders(hass)[config_entry.entry_id] = add_fleet_entities
+        if get_fleet(hass).owner_entry_id == config_entry.entry_id:
+            add_fleet_entities()
+
+
+def _async_add_fleet_entities(hass: HomeAssistant, config_entry: ConfigEntry, async_add_entities) -> None:
+    """Add the fleet entities and the fleet device to the sensor platform of the fleet's owner."""
+    fleet = get_fleet(hass)
+    entities = [SonnenBatterieFleetEntity(fleet=fleet, sensor_config=sensor_config) for sensor_config in FLEET_SENSORS_LIST]
+    fleet.change_listeners.append(functools.partial(write_fleet_states, entities))
+    async_add_entities(entities)
+    dr.async_get(hass).async_get_or_create(config_entry_id=config_entry.entry_id, **get_fleet_device_info())
+
 
 class SonnenBatterieEntity(SensorEntity):
     """Sensor for Sonnen Batterie data.
@@ -68,16 +165,23 @@ class SonnenBatterieEntity(SensorEntity):
         self._data_path = sensor_config[2]
         self._data_type = sensor_config[3]
         self._default_value = sensor_config[6]  # Default value for sensor data cannot be retrieved
+        self._init_value_source()
 
         self.host_name = self._sonnen_host.name
-        self.host_name_normalized = "".join([c for c in self.host_name.replace(" ", "_") if c.isalnum() or c == '_']).lower()
+        self.host_name_normalized = normalize_host_name(self.host_name)
 
+        self._attr_should_poll = False  # States are written by the entity publisher when values change
         self._attr_name = sensor_config[1]
         self._attr_unit_of_measurement = sensor_config[4]
         self._attr_icon = sensor_config[5]
         self._attr_unique_id = f"sonnen_batterie_{self._sonnen_host.serial_number}_{self._measurement_name}"
         self._attr_entity_id = f"sensor.{self.host_name_normalized}_{self._measurement_name}"
 
+    def _init_value_source(self) -> None:
+        """Prepare reading the sensor value."""
+        self.slot = self._sonnen_host.extraction_plan.slot_of(self._measurement_name)  # Index in the host snapshot
+        self._endpoint = self._sonnen_host.extraction_plan.endpoints[self.slot]
+
     @property
     def name(self):
         """Return the name of the sensor."""
@@ -111,37 +215,216 @@ class SonnenBatterieEntity(SensorEntity):
     @property
     def state(self):
         """Return the state of the sensor."""
+        # Values are extracted once per poll into the host's snapshot (see ExtractionPlan),
+        # so the state is a plain index lookup.
+        return self._sonnen_host.snapshot[self.slot]
 
-        # Use self._data_path to retrieve the data from the host's data property (dict).
-        # The data_path is a string with keys separated by periods.
-        try:
-            data = self._sonnen_host.data
-            for key in self._data_path.split("."):
-                data = data[key]
-
-            # If the data type is a flag group, the data path will be a group of boolean flags. The
-            # flag set to True will be the state of the sensor.
-            if self._data_type == DATA_TYPE_FLAG_GROUP:
-                for flag, value in data.items():
-                    if value is True:  # Ensure that only keys with booleans are considered
-                        return flag
-                # If no flag is set, return Default
-                return self._default_value
-
-            # Simple data type. Return data as is.
-            else:
-                return data
-
-        except KeyError:
-            _LOGGER.error("Could not find data for sensor %s in data from host %s. Returning default value.", self._attr_name, self._sonnen_host.url)
-            return self._default_value
+    @property
+    def available(self):
+        """Return False while polling of the host is paused by its circuit breaker."""
+        return not self._sonnen_host.breaker.is_open
+
+    @property
+    def extra_state_attributes(self):
+        """Mark the state as stale, with the age of its data, if the last fetch of its endpoint failed."""
+        endpoint_state = self._sonnen_host.endpoint_states.get(self._endpoint)
+        if endpoint_state is None or not endpoint_state.stale:
+            return None
+        age = endpoint_state.age
+        return {"stale": True, "data_age": None if age is None else round(age)}
 
     @property
     def device_info(self):
         """Return information to link this entity to a device."""
-        return self._sonnen_host.device_info
+        return get_device_info(self._sonnen_host)
 
     def async_update_ha_state(self, force_refresh: bool = False) -> Coroutine[Any, Any, None]:
         """Update the state of the sensor."""
         # Added only to see that it exists
         return super().async_update_ha_state(force_refresh)
+
+
+class SonnenBatterieDiscoveredEntity(SonnenBatterieEntity):
+    """Sensor for a payload field found by sensor discovery, see sonnen_host/schema.py.
+
+    Disabled by default, so it adds no polling or recorder load until it is enabled.
+    """
+
+    _attr_entity_registry_enabled_default = False
+
+
+class SonnenBatterieDerivedEntity(SonnenBatterieEntity):
+    """Sensor for a metric derived from other Sonnen Batterie values, e.g. the autarky.
+
+    The data path is the name of the formula. The value is computed by the host's
+    DerivedMetrics when one of its inputs changes.
+    """
+
+    def _init_value_source(self) -> None:
+        """Prepare reading the sensor value."""
+        self.metric_name = self._measurement_name
+        self.input_slots = self._sonnen_host.derived.slots_of(self.metric_name)
+        self._endpoint = None
+        self._attr_state_class = SensorStateClass.MEASUREMENT
+
+    @property
+    def state(self):
+        """Return the state of the sensor."""
+        value = self._sonnen_host.derived.values[self.metric_name]
+        return self._default_value if value is None else value
+
+
+class SonnenBatterieStatisticsEntity(SonnenBatterieEntity):
+    """Sensor for a statistic of a Sonnen Batterie sensor over fixed periods, e.g. the 1 minute mean.
+
+    The data path is the name of the source sensor. The state is updated once per period.
+    """
+
+    def _init_value_source(self) -> None:
+        """Prepare reading the sensor value."""
+        self.statistic_name = self._measurement_name
+        self._statistic = self._sonnen_host.statistics[self.statistic_name]
+        self.slot = self._sonnen_host.extraction_plan.slot_of(self._data_path)  # Slot of the source sensor
+        self._endpoint = self._sonnen_host.extraction_plan.endpoints[self.slot]
+        self._attr_state_class = SensorStateClass.MEASUREMENT
+
+    @property
+    def state(self):
+        """Return the state of the sensor."""
+        value = self._statistic.value
+        return self._default_value if value is None else round(value, 2)
+
+
+class RefreshedEntityMixin:
+    """Sensor whose state is computed by the host rather than read from the snapshot.
+
+    The entity publisher calls `refresh` after each poll and writes the state if it changed.
+    """
+
+    _last_value = None
+
+    def refresh(self) -> bool:
+        """Return True if the value changed since the last call."""
+        value = self.state
+        changed = value != self._last_value
+        self._last_value = value
+        return changed
+
+
+class SonnenBatterieEnergyEntity(RefreshedEntityMixin, RestoreEntity, SonnenBatterieEntity):
+    """Sensor for the energy in kWh integrated from a Sonnen Batterie power sensor.
+
+    The data path is the name of the power sensor. The total is restored after a restart.
+    """
+
+    def __init__(self, *args, sensor_config:dict, **kwargs) -> None:
+        """Initialize the sensor."""
+        self._direction = sensor_config[7]
+        super().__init__(*args, sensor_config=sensor_config, **kwargs)
+
+    def _init_value_source(self) -> None:
+        """Prepare reading the sensor value."""
+        self.slot = self._sonnen_host.extraction_plan.slot_of(self._data_path)  # Slot of the power sensor
+        self._endpoint = self._sonnen_host.extraction_plan.endpoints[self.slot]
+        self._counter = self._sonnen_host.energy_counters[self.slot]
+        self._attr_device_class = SensorDeviceClass.ENERGY
+        self._attr_state_class = SensorStateClass.TOTAL_INCREASING
+
+    async def async_added_to_hass(self) -> None:
+        """Continue counting from the total before the restart."""
+        await super().async_added_to_hass()
+        last_state = await self.async_get_last_state()
+        if last_state is None:
+            return
+        try:
+            self._counter.restore(self._direction, float(last_state.state) * 1000)
+        except ValueError:
+            _LOGGER.debug("Not restoring %s from state %s", self.entity_id, last_state.state)
+
+    @property
+    def state(self):
+        """Return the state of the sensor."""
+        return round(self._counter.energy_wh(self._direction) / 1000, 3)
+
+
+class SonnenBatterieDiagnosticEntity(RefreshedEntityMixin, SonnenBatterieEntity):
+    """Diagnostic sensor for the state of the connection to a Sonnen Batterie.
+
+    The data path is an attribute path on the SonnenBatterieHost object,
+    e.g. "scheduler.interval" for the current poll interval. Path elements
+    may also be dict keys, e.g. "metrics.latency.status.p95".
+    """
+
+    def __init__(self, *args, sensor_config:dict, **kwargs) -> None:
+        """Initialize the sensor."""
+        super().__init__(*args, sensor_config=sensor_config, **kwargs)
+        self._attr_entity_registry_enabled_default = sensor_config[7]
+
+    def _init_value_source(self) -> None:
+        """Prepare reading the sensor value."""
+        self._path = self._data_path.split(".")
+        self._endpoint = None
+        self._attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def _get_value(self, value):
+        for key in self._path:
+            value = value[key] if isinstance(value, dict) else getattr(value, key)
+        return value
+
+    @property
+    def available(self):
+        """Return True, diagnostic sensors are also available while the host is unreachable."""
+        return True
+
+    @property
+    def state(self):
+        """Return the state of the sensor."""
+        try:
+            return self._get_value(self._sonnen_host)
+        except (AttributeError, KeyError):
+            return self._default_value
+
+
+class SonnenBatterieFleetEntity(SensorEntity):
+    """Sensor for a total across all Sonnen Batteries, e.g. the total battery power.
+
+    Values are aggregated by the SonnenFleet and published by its scheduler.
+    """
+
+    def __init__(self, fleet:SonnenFleet, sensor_config:dict) -> None:
+        """Initialize the sensor."""
+        self._fleet = fleet
+        self._aggregate = sensor_config[2]
+        self._data_type = sensor_config[3]
+        self._default_value = sensor_config[6]
+        self._value = None
+
+        self._attr_should_poll = False
+        self._attr_name = sensor_config[1]
+        self._attr_unit_of_measurement = sensor_config[4]
+        self._attr_icon = sensor_config[5]
+        self._attr_state_class = SensorStateClass.MEASUREMENT
+        self._attr_unique_id = f"sonnen_batterie_fleet_{sensor_config[0]}"
+        self.entity_id = f"sensor.sonnen_batterie_fleet_{sensor_config[0]}"
+        self._attr_device_info = get_fleet_device_info()
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit of measurement of this entity."""
+        return self._attr_unit_of_measurement
+
+    @property
+    def state(self):
+        """Return the state of the sensor."""
+        if self._value is None:
+            self.refresh(self._fleet.values)  # Not published by the fleet yet
+        return self._default_value if self._value is None else self._value
+
+    def refresh(self, values:dict) -> bool:
+        """Take over the value from the fleet aggregates. Return True if it changed."""
+        value = values[self._aggregate]
+        if self._data_type == "int" and value is not None:
+            value = round(value)
+        changed = value != self._value
+        self._value = value
+        return changed
@@ -0,0 +1,98 @@
+"""Services of the Sonnen Batterie integration."""
+
+import asyncio
+import logging
+import time
+
+import voluptuous as vol
+
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import config_validation as cv, device_registry as dr
+
+from .const import DOMAIN, MAX_SETPOINT_POWER, OPERATING_MODES
+from .sonnen_host import SonnenBatterieHost
+from .utils import get_fleet
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_SET_SETPOINT = "set_setpoint"
+SERVICE_SET_OPERATING_MODE = "set_operating_mode"
+SERVICE_PROFILE = "profile"
+
+ATTR_DEVICE_ID = "device_id"
+ATTR_POWER = "power"
+ATTR_OPERATING_MODE = "operating_mode"
+ATTR_DURATION = "duration"
+ATTR_TRACE_ALLOCATIONS = "trace_allocations"
+
+DATA_PROFILING = f"{DOMAIN}_profiling"  # Key in hass.data of the running profiling session
+
+SET_SETPOINT_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_DEVICE_ID): cv.string,
+        vol.Required(ATTR_POWER): vol.All(vol.Coerce(int), vol.Range(min=-MAX_SETPOINT_POWER, max=MAX_SETPOINT_POWER)),
+    }
+)
+SET_OPERATING_MODE_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_DEVICE_ID): cv.string,
+        vol.Required(ATTR_OPERATING_MODE): vol.In(list(OPERATING_MODES.values())),
+    }
+)
+PROFILE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_DURATION, default=60): vol.All(vol.Coerce(float), vol.Range(min=1, max=600)),
+        vol.Optional(ATTR_TRACE_ALLOCATIONS, default=True): cv.boolean,
+    }
+)
+
+
+def _get_host(hass: HomeAssistant, device_id: str) -> SonnenBatterieHost:
+    """Return the host of a Sonnen Batterie device."""
+    device = dr.async_get(hass).async_get(device_id)
+    if device is not None:
+        for domain, serial_number in device.identifiers:
+            host = get_fleet(hass).get_by_serial_number(serial_number) if domain == DOMAIN else None
+            if host is not None:
+                return host
+    raise HomeAssistantError(f"Device {device_id} is not a configured Sonnen Batterie")
+
+
+async def async_register_services(hass: HomeAssistant) -> None:
+    """Register the services writing to the batteries, and the profiling service.
+
+    Writes are queued per battery, see CommandQueue, so services may be called often,
+    e.g. by automations following the solar production.
+    """
+
+    async def set_setpoint(call: ServiceCall) -> None:
+        await _get_host(hass, call.data[ATTR_DEVICE_ID]).set_setpoint(call.data[ATTR_POWER])
+
+    async def set_operating_mode(call: ServiceCall) -> None:
+        modes = {name: mode for mode, name in OPERATING_MODES.items()}
+        await _get_host(hass, call.data[ATTR_DEVICE_ID]).set_operating_mode(modes[call.data[ATTR_OPERATING_MODE]])
+
+    async def profile(call: ServiceCall) -> ServiceResponse:
+        from .profiling import ProfilingSession  # Only needed while profiling
+
+        if DATA_PROFILING in hass.data:
+            raise HomeAssistantError("A profiling session of Sonnen Batterie is already running")
+        session = hass.data[DATA_PROFILING] = ProfilingSession(list(get_fleet(hass)), call.data[ATTR_TRACE_ALLOCATIONS])
+        _LOGGER.info("Profiling the polls of %d Sonnen Batteries for %s s", len(session.hosts), call.data[ATTR_DURATION])
+        session.start()
+        try:
+            await asyncio.sleep(call.data[ATTR_DURATION])
+        finally:
+            await session.stop()
+            del hass.data[DATA_PROFILING]
+        path = hass.config.path(f"{DOMAIN}_profile_{time.strftime('%Y%m%d_%H%M%S')}")
+        summary = await hass.async_add_executor_job(session.write, path)
+        _LOGGER.info("Profiled %d polls of Sonnen Batteries, written to %s.prof and %s.txt", session.polls, path, path)
+        return summary if call.return_response else None
+
+    hass.services.async_register(DOMAIN, SERVICE_SET_SETPOINT, set_setpoint, schema=SET_SETPOINT_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_SET_OPERATING_MODE, set_operating_mode, schema=SET_OPERATING_MODE_SCHEMA)
+    hass.services.async_register(
+        DOMAIN, SERVICE_PROFILE, profile, schema=PROFILE_SCHEMA, supports_response=SupportsResponse.OPTIONAL
+    )
@@ -1,2 +1,25 @@
-"""The Sonnen Batterie integration."""
-from .sonnen_host import SonnenBatterieHost
+"""Asynchronous client for the SonnenBatterie API.
+
+The client does not depend on Home Assistant; the integration is a thin adapter around
+it. It can also be used on its own, e.g. by the command line poller in `__main__.py`.
+The classes are imported on first access, so light modules like `sonnen_host.const`
+can be imported without importing aiohttp.
+"""
+
+import importlib
+
+_LAZY_IMPORTS = {
+    "SonnenBatterieHost": ".sonnen_host",
+    "SonnenFleet": ".fleet",
+    "StateChanges": ".sonnen_host",
+}
+
+__all__ = list(_LAZY_IMPORTS)
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_IMPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,210 @@
+"""Poll SonnenBatterie hosts from the command line, without Home Assistant.
+
+Each host is polled by its own scheduler, as in the integration. After each poll the
+sensor values are printed, and optionally appended to a file as JSON lines. The raw
+responses can be recorded to a capture file (--record), and a capture can be replayed
+through the same pipeline instead of polling a battery (--replay), see capture.py.
+
+Run with the path of this package, e.g. from the integration's directory:
+
+    python sonnen_host http://192.168.1.10 --token TOKEN [--interval 2] [--count 10]
+    python sonnen_host http://10.0.0.2 http://10.0.0.3 --token TOKEN --json --output polls.jsonl
+    python sonnen_host http://192.168.1.10 --token TOKEN --record battery.cap --duration 3600
+    python sonnen_host --replay battery.cap --speed max
+
+or with `python -m sonnen_host` where the package is on the path. The integration's
+directory itself must not be on the path, as its `select.py` shadows the standard library.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+from pathlib import Path
+import sys
+import time
+from typing import TextIO
+
+if __name__ == "__main__" and not __package__:
+    # Run by path. Import the package by its location, without the directories around it on the path.
+    import importlib.util
+
+    sys.path.pop(0)  # This package's directory
+    _spec = importlib.util.spec_from_file_location(
+        "sonnen_host", Path(__file__).parent / "__init__.py", submodule_search_locations=[str(Path(__file__).parent)]
+    )
+    sys.modules["sonnen_host"] = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(sys.modules["sonnen_host"])
+    from sonnen_host.__main__ import main
+
+    sys.exit(main())
+
+import aiohttp
+
+from .const import DERIVED_SENSORS_LIST, POLL_FREQUENCY, SENSORS_LIST
+from .capture import ReplayTransport
+from .sonnen_host import SonnenBatterieHost
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _speed(value: str) -> float | None:
+    if value == "max":
+        return None
+    speed = float(value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("must be positive or 'max'")
+    return speed
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="sonnen_host", description=__doc__.split("\n\n")[0])
+    parser.add_argument("urls", nargs="*", metavar="URL", help="URL of a battery, e.g. http://192.168.1.10")
+    parser.add_argument("--token", help="API token, the same for all batteries")
+    parser.add_argument("--interval", type=float, default=POLL_FREQUENCY, help="seconds between polls (default: %(default)s)")
+    parser.add_argument("--count", type=int, help="stop after this many polls of each battery")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    parser.add_argument("--discover", action="store_true", help="also print the fields not in the sensors list, see schema.py")
+    parser.add_argument("--no-static", dest="static", action="store_false", help="do not fetch the serial numbers")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per poll instead of text")
+    parser.add_argument("--output", type=argparse.FileType("a"), help="append one JSON object per poll to this file")
+    parser.add_argument(
+        "--record", metavar="FILE", help="append the raw responses to a capture file, numbered FILE.1, FILE.2, ... for several batteries"
+    )
+    parser.add_argument("--replay", metavar="FILE", action="append", default=[], help="poll a capture file instead of a battery, may be repeated")
+    parser.add_argument("--speed", type=_speed, default=1.0, help="replay speed, a factor of real time or 'max' (default: %(default)s)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log debug messages")
+    args = parser.parse_args(argv)
+    if bool(args.urls) == bool(args.replay):
+        parser.error("give either the URLs of batteries or --replay")
+    if args.urls and not args.token:
+        parser.error("--token is required to poll batteries")
+    return args
+
+
+class SnapshotPrinter:
+    """Poll listener writing the values of a host after each poll."""
+
+    def __init__(self, host: SonnenBatterieHost, as_json: bool, output: TextIO | None, count: int | None, done: asyncio.Event) -> None:
+        self._host = host
+        self._as_json = as_json
+        self._output = output
+        self._remaining = count
+        self._done = done
+        self._printed: dict = {}  # Values as last printed, text output only prints changes
+        plan = host.extraction_plan
+        self._slots = [
+            (sensor_config[0], plan.slot_of(sensor_config[0])) for sensor_config in SENSORS_LIST + host.discovered_sensors
+        ]
+
+    def record(self) -> dict:
+        """Return the sensor and derived values of the host's current snapshot."""
+        values = self._host.snapshot.values
+        record_values = {name: values[slot] for name, slot in self._slots}
+        record_values.update({name: self._host.derived.values[name] for name, *_ in DERIVED_SENSORS_LIST})
+        return {
+            "time": time.time(),
+            "url": self._host.url,
+            "serial_number": self._host.serial_number,
+            "version": self._host.snapshot.version,
+            "available": self._host.has_current_data,
+            "values": record_values,
+        }
+
+    def __call__(self, host: SonnenBatterieHost) -> None:
+        record = self.record()
+        if self._output is not None:
+            self._output.write(json.dumps(record) + "\n")
+            self._output.flush()
+        if self._as_json:
+            print(json.dumps(record), flush=True)
+        else:
+            changes = {name: value for name, value in record["values"].items() if self._printed.get(name, ...) != value}
+            self._printed.update(changes)
+            state = "" if record["available"] else " (unavailable)"
+            line = " ".join(f"{name}={value}" for name, value in changes.items())
+            print(f"{time.strftime('%H:%M:%S')} {host.url}{state} {line}".rstrip(), flush=True)
+        if self._remaining is not None:
+            self._remaining -= 1
+            if self._remaining <= 0:
+                self._done.set()
+        if isinstance(host.transport, ReplayTransport) and host.transport.finished:
+            self._done.set()
+
+
+def _capture_path(path: str, number: int, hosts: int) -> str:
+    return path if hosts == 1 else f"{path}.{number + 1}"
+
+
+async def replay_as_fast_as_possible(host: SonnenBatterieHost, done: asyncio.Event) -> None:
+    """Poll a host replaying a capture from one captured poll to the next, until `done` or the end of the capture."""
+    transport: ReplayTransport = host.transport
+    start = time.perf_counter()
+    first = transport.clock()
+    polls = 0
+    while not done.is_set() and transport.step():
+        await host.poll()
+        polls += 1
+    done.set()
+    _LOGGER.info(
+        "Replayed %d polls covering %.0f s of %s in %.2f s",
+        polls, transport.clock() - first, transport.reader.path, time.perf_counter() - start,
+    )
+
+
+async def run(args: argparse.Namespace) -> int:
+    if args.replay:
+        hosts = [await SonnenBatterieHost.create_replay(path, speed=args.speed) for path in args.replay]
+    else:
+        hosts = [await SonnenBatterieHost.create(url=url, api_token=args.token) for url in args.urls]
+    done = [asyncio.Event() for _ in hosts]
+    replays = []
+    try:
+        if args.static and not args.replay:
+            await asyncio.gather(*(host.update(update_static_data=True, update_current_data=False) for host in hosts))
+        if args.discover:
+            await asyncio.gather(*(host.update() for host in hosts))
+            for host in hosts:
+                if host.schema_fingerprint is not None:
+                    host.use_discovered_sensors(host.schema_fingerprint, host.discover_sensors())
+        if args.record:
+            for number, host in enumerate(hosts):
+                await host.start_capture(_capture_path(args.record, number, len(hosts)))
+        for host, host_done in zip(hosts, done):
+            host.poll_listeners.append(SnapshotPrinter(host, args.json, args.output, args.count, host_done))
+            if args.replay and args.speed is None:
+                replays.append(asyncio.create_task(replay_as_fast_as_possible(host, host_done)))
+            else:
+                host.scheduler.interval = args.interval / args.speed if args.replay else args.interval
+                if not args.replay:
+                    host.size_sample_buffers(args.interval)
+                    host.configure_energy_gap(args.interval)
+                host.scheduler.start()
+        waiting = asyncio.gather(*(event.wait() for event in done), *replays)
+        try:
+            await asyncio.wait_for(waiting, timeout=args.duration)
+        except TimeoutError:
+            pass  # Duration elapsed
+    except (TimeoutError, aiohttp.ClientError, LookupError) as e:  # E.g. the serial number could not be fetched
+        _LOGGER.error("Failed to set up Sonnen Batterie: %s", e)
+        return 1
+    finally:
+        for host in hosts:
+            await host.scheduler.stop()
+            await host.close_session()
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    try:
+        return asyncio.run(run(args))
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+"""Adaptive poll interval driven by how fast the battery readings change."""
+
+from __future__ import annotations
+
+
+class AdaptiveInterval:
+    """Compute the poll interval from consecutive sensor snapshots.
+
+    The interval drops to `min_interval` as soon as one of the watched numeric values
+    moves by more than its threshold, or one of the watched states (e.g. charging) flips.
+    While readings are stable the interval grows by `backoff` per poll, up to `max_interval`.
+    """
+
+    def __init__(
+        self,
+        min_interval: float,
+        max_interval: float,
+        numeric_slots: list[int],
+        state_slots: list[int],
+        absolute_threshold: float,
+        relative_threshold: float,
+        backoff: float,
+    ) -> None:
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self._numeric_slots = numeric_slots
+        self._state_slots = state_slots
+        self._absolute_threshold = absolute_threshold
+        self._relative_threshold = relative_threshold
+        self._backoff = backoff
+
+        self.interval = min_interval
+        self._last_values = None
+
+    def _is_volatile(self, values) -> bool:
+        last_values = self._last_values
+        for slot in self._state_slots:
+            if values[slot] != last_values[slot]:
+                return True
+        for slot in self._numeric_slots:
+            value, last = values[slot], last_values[slot]
+            if type(value) not in (int, float) or type(last) not in (int, float):  # noqa: E721
+                continue  # Missing, or a raw value the extraction plan could not coerce
+            delta = abs(value - last)
+            if delta > self._absolute_threshold and delta > self._relative_threshold * abs(last):
+                return True
+        return False
+
+    def observe(self, values) -> float:
+        """Update the interval from the values of a new snapshot and return it."""
+        if self._last_values is not None:
+            if self._is_volatile(values):
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.max_interval, self.interval * self._backoff)
+        self._last_values = values
+        return self.interval
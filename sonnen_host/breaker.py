@@ -0,0 +1,61 @@
+"""Circuit breaker for polling a SonnenBatterie host."""
+
+from __future__ import annotations
+
+STATE_CLOSED = "closed"  # Polling normally
+STATE_OPEN = "open"  # Host unreachable, polling stopped and the host is probed on a backoff
+
+
+class CircuitBreaker:
+    """Stop polling a host after `failure_threshold` consecutive failed polls.
+
+    While open, the host is probed after `initial_backoff` seconds, doubling after each
+    failed probe up to `max_backoff`. A successful probe closes the breaker again.
+    """
+
+    def __init__(self, failure_threshold: int, initial_backoff: float, max_backoff: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        self.backoff = initial_backoff
+        self._next_probe = 0.0  # Monotonic time of the next probe while open
+
+    @property
+    def is_open(self) -> bool:
+        """Return True if polling is stopped."""
+        return self.state == STATE_OPEN
+
+    def record_success(self) -> None:
+        """Record a successful poll."""
+        self.consecutive_failures = 0
+
+    def record_failure(self, now: float) -> bool:
+        """Record a failed poll. Return True if this opened the breaker."""
+        self.consecutive_failures += 1
+        if self.state == STATE_CLOSED and self.consecutive_failures >= self.failure_threshold:
+            self.state = STATE_OPEN
+            self.times_opened += 1
+            self.backoff = self.initial_backoff
+            self._next_probe = now + self.backoff
+            return True
+        return False
+
+    def probe_due(self, now: float) -> bool:
+        """Return True if the breaker is open and the host should be probed."""
+        return self.state == STATE_OPEN and now >= self._next_probe
+
+    def probe_failed(self, now: float) -> None:
+        """Record a failed probe and back off before the next one."""
+        self.consecutive_failures += 1
+        self.backoff = min(self.max_backoff, self.backoff * 2)
+        self._next_probe = now + self.backoff
+
+    def close(self) -> None:
+        """Record a successful probe and resume polling."""
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.backoff = self.initial_backoff
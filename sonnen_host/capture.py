@@ -0,0 +1,355 @@
+"""Capture of raw responses from a SonnenBatterie host, and their replay.
+
+A capture file starts with MAGIC followed by records. Each record is a header
+(timestamp, kind, endpoint id, HTTP status, payload length) and a payload:
+
+- KIND_SESSION: JSON metadata of a capture session, e.g. the URL and serial number.
+  Endpoint ids are numbered from 0 in each session.
+- KIND_ENDPOINT: the URI of the next endpoint id, written before its first response.
+- KIND_FULL: a response body, compressed with zlib.
+- KIND_REF: a response body identical to the previous body of the endpoint, no payload.
+- KIND_TIMEOUT: the request timed out, no payload.
+- KIND_ERROR: the request failed, the payload is the error message. The status is the
+  HTTP status of an error response, or 0 if there was no response.
+
+Records are only appended, so a capture survives a crash up to the last complete
+record, and sessions can be appended to an existing file. The writer only keeps a
+fingerprint per endpoint and a bounded queue of responses to write, and the reader maps
+the file into memory, so memory use does not grow with the length of a capture.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager
+import hashlib
+import json
+import logging
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import aiohttp
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+_LOGGER = logging.getLogger(__name__)
+
+MAGIC = b"SNBCAP\x00\x01"  # File type and format version
+_HEADER = struct.Struct("<dBHHI")  # Timestamp, kind, endpoint id, status, payload length
+
+KIND_SESSION = 0
+KIND_ENDPOINT = 1
+KIND_FULL = 2
+KIND_REF = 3
+KIND_TIMEOUT = 4
+KIND_ERROR = 5
+
+COMPRESSION_LEVEL = 6
+QUEUE_SIZE = 256  # Responses waiting to be written. Further responses are dropped.
+POLL_WINDOW = 0.1  # Seconds. Requests sent within this time of each other belong to the same poll.
+
+
+class CaptureWriter:
+    """Append the responses of a host to a capture file.
+
+    `record` and `record_error` only queue a response, so they can be called from the
+    event loop. A writer thread fingerprints, compresses and writes the responses, buffered
+    by the file object. Responses are dropped when the queue is full, e.g. while the disk
+    stalls, and once the file exceeds `max_bytes`, so a forgotten capture does not fill
+    the disk. The constructor opens the file and `close` waits for the queued responses,
+    so call both in an executor.
+    """
+
+    def __init__(self, path: str | os.PathLike, metadata: dict | None = None, max_bytes: int | None = None) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self._file = open(path, "ab")  # noqa: SIM115  Closed by `close`
+        self.size = self._file.tell()  # Bytes in the capture file
+        if self.size == 0:
+            self._file.write(MAGIC)
+            self.size = len(MAGIC)
+        self._endpoint_ids: dict[str, int] = {}
+        self._fingerprints: dict[int, bytes] = {}  # Endpoint id -> fingerprint of the last body
+        self.records = 0
+        self.references = 0  # Bodies stored as a reference to the previous body
+        self.dropped = 0  # Records dropped after reaching `max_bytes`, or failing to be written
+        self.queue_full = 0  # Responses dropped with a full queue. Only counted by the event loop.
+        self._write(time.time(), KIND_SESSION, 0, 0, json.dumps(metadata or {}).encode())
+        self._queue: queue.Queue[tuple | None] = queue.Queue(QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name=f"sonnen_capture_{os.path.basename(path)}", daemon=True)
+        self._thread.start()
+
+    def record(self, timestamp: float, uri: str, status: int, body: bytes) -> None:
+        """Queue a response body to be appended."""
+        self._put((self._record, timestamp, uri, status, body))
+
+    def record_error(self, timestamp: float, uri: str, error: Exception) -> None:
+        """Queue a failed request to be appended."""
+        self._put((self._record_error, timestamp, uri, error))
+
+    def _put(self, item: tuple) -> None:
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.queue_full += 1
+
+    def _run(self) -> None:
+        while (item := self._queue.get()) is not None:
+            method, *arguments = item
+            try:
+                method(*arguments)
+            except OSError as e:
+                _LOGGER.error("Failed to write to capture %s: %s", self.path, e)
+                self.dropped += 1
+
+    def _record(self, timestamp: float, uri: str, status: int, body: bytes) -> None:
+        endpoint_id = self._endpoint_id(timestamp, uri)
+        fingerprint = hashlib.blake2b(body, digest_size=16).digest()
+        if self._fingerprints.get(endpoint_id) == fingerprint:
+            if self._write(timestamp, KIND_REF, endpoint_id, status, b""):
+                self.references += 1
+            return
+        if self._write(timestamp, KIND_FULL, endpoint_id, status, zlib.compress(body, COMPRESSION_LEVEL)):
+            self._fingerprints[endpoint_id] = fingerprint
+
+    def _record_error(self, timestamp: float, uri: str, error: Exception) -> None:
+        endpoint_id = self._endpoint_id(timestamp, uri)
+        if isinstance(error, TimeoutError):
+            self._write(timestamp, KIND_TIMEOUT, endpoint_id, 0, b"")
+        elif isinstance(error, aiohttp.ClientResponseError):
+            self._write(timestamp, KIND_ERROR, endpoint_id, error.status, error.message.encode())
+        else:
+            self._write(timestamp, KIND_ERROR, endpoint_id, 0, str(error).encode())
+
+    def _endpoint_id(self, timestamp: float, uri: str) -> int:
+        endpoint_id = self._endpoint_ids.get(uri)
+        if endpoint_id is None:
+            endpoint_id = self._endpoint_ids[uri] = len(self._endpoint_ids)
+            self._write(timestamp, KIND_ENDPOINT, endpoint_id, 0, uri.encode())
+        return endpoint_id
+
+    def _write(self, timestamp: float, kind: int, endpoint_id: int, status: int, payload: bytes) -> bool:
+        if self.max_bytes is not None and self.size + _HEADER.size + len(payload) > self.max_bytes and kind != KIND_ENDPOINT:
+            if not self.dropped:
+                _LOGGER.warning("Capture %s reached its maximum size of %d bytes, dropping further responses", self.path, self.max_bytes)
+            self.dropped += 1
+            return False
+        self._file.write(_HEADER.pack(timestamp, kind, endpoint_id, status, len(payload)))
+        self._file.write(payload)
+        self.size += _HEADER.size + len(payload)
+        self.records += 1
+        return True
+
+    def close(self) -> None:
+        """Write the queued responses, then flush and close the capture file."""
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+
+    @property
+    def stats(self) -> dict:
+        """Return the record counters."""
+        return {
+            "records": self.records,
+            "references": self.references,
+            "dropped": self.dropped + self.queue_full,
+            "bytes": self.size,
+        }
+
+
+class CaptureRecord:
+    """A response read from a capture. The body is decompressed on access."""
+
+    __slots__ = ("timestamp", "uri", "kind", "status", "_data", "_offset", "_length")
+
+    def __init__(self, timestamp: float, uri: str, kind: int, status: int, data, offset: int, length: int) -> None:
+        self.timestamp = timestamp
+        self.uri = uri
+        self.kind = kind  # KIND_FULL, KIND_TIMEOUT or KIND_ERROR. References are resolved to the full body.
+        self.status = status
+        self._data = data
+        self._offset = offset
+        self._length = length
+
+    @property
+    def body(self) -> bytes:
+        """Return the response body, or the error message of a failed request."""
+        payload = self._data[self._offset:self._offset + self._length]
+        return zlib.decompress(payload) if self.kind == KIND_FULL else payload
+
+
+class CaptureReader:
+    """Read the responses of a capture file through a memory map, in the order they were captured."""
+
+    def __init__(self, path: str | os.PathLike) -> None:
+        self.path = path
+        with open(path, "rb") as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a SonnenBatterie capture")
+            self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.metadata: dict = {}  # Metadata of the first session
+        for kind, _, _, _, offset, length in self._records():
+            if kind == KIND_SESSION:
+                self.metadata = json.loads(self._data[offset:offset + length])
+                break
+
+    def _records(self) -> Iterator[tuple]:
+        data = self._data
+        position = len(MAGIC)
+        end = len(data)
+        while position + _HEADER.size <= end:
+            timestamp, kind, endpoint_id, status, length = _HEADER.unpack_from(data, position)
+            position += _HEADER.size
+            if position + length > end:
+                _LOGGER.debug("Capture %s ends with an incomplete record", self.path)
+                return
+            yield kind, timestamp, endpoint_id, status, position, length
+            position += length
+
+    def __iter__(self) -> Iterator[CaptureRecord]:
+        uris: list[str] = []
+        last_full: dict[int, tuple[int, int]] = {}  # Endpoint id -> offset and length of the last body
+        for kind, timestamp, endpoint_id, status, offset, length in self._records():
+            if kind == KIND_SESSION:
+                uris = []
+                last_full = {}
+            elif kind == KIND_ENDPOINT:
+                uris.append(self._data[offset:offset + length].decode())
+            elif kind == KIND_REF:
+                offset, length = last_full[endpoint_id]
+                yield CaptureRecord(timestamp, uris[endpoint_id], KIND_FULL, status, self._data, offset, length)
+            else:
+                if kind == KIND_FULL:
+                    last_full[endpoint_id] = (offset, length)
+                yield CaptureRecord(timestamp, uris[endpoint_id], kind, status, self._data, offset, length)
+
+    def close(self) -> None:
+        """Unmap the capture file."""
+        self._data.close()
+
+    def __enter__(self) -> CaptureReader:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class ReplayContent:
+    """Body of a ReplayResponse, with the parts of aiohttp.StreamReader the host uses."""
+
+    def __init__(self, body: bytes) -> None:
+        self._body = body
+
+    async def iter_chunked(self, n: int) -> AsyncIterator[bytes]:
+        for start in range(0, len(self._body), n):
+            yield self._body[start:start + n]
+
+
+class ReplayResponse:
+    """Response served from a capture, with the parts of aiohttp.ClientResponse the host uses."""
+
+    charset = "utf-8"
+
+    def __init__(self, url: str, status: int, body: bytes) -> None:
+        self.url = url
+        self.status = status
+        self.content = ReplayContent(body)
+        self._body = body
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def text(self) -> str:
+        return self._body.decode(self.charset)
+
+    def raise_for_status(self) -> None:
+        if self.status >= 400:
+            request_info = aiohttp.RequestInfo(URL(self.url), "GET", CIMultiDictProxy(CIMultiDict()))
+            raise aiohttp.ClientResponseError(request_info, (), status=self.status, message=self._body.decode())
+
+
+class ReplayTransport:
+    """Serve the responses of a capture in place of a SonnenTransport.
+
+    A request is answered with the latest response to its URI at the replay clock, so the
+    host polls the capture as it would have polled the battery at that time. The clock
+    runs `speed` times as fast as real time from the first request, or with `speed`
+    None it is moved from one captured poll to the next by `step`, to replay as fast as
+    the host can poll. Use `clock` as the host's clocks, so endpoint intervals and
+    energy integration follow the captured time.
+    """
+
+    def __init__(self, reader: CaptureReader, speed: float | None = 1.0) -> None:
+        self.reader = reader
+        self.speed = speed
+        self.url = reader.metadata.get("url", str(reader.path))
+        self._records = iter(reader)
+        self._next: CaptureRecord | None = next(self._records, None)
+        self._latest: dict[str, CaptureRecord] = {}  # URI -> latest response at the clock
+        self._origin = self._next.timestamp + POLL_WINDOW if self._next is not None else 0.0  # Clock at the start
+        self._clock = self._origin
+        self._started: float | None = None  # Monotonic time the paced replay started
+        self.closed = False
+
+    def clock(self) -> float:
+        """Return the replay clock, i.e. the captured wall clock time being replayed."""
+        if self.speed is not None:
+            if self._started is None:
+                self._started = time.monotonic()
+            self._clock = self._origin + (time.monotonic() - self._started) * self.speed
+        return self._clock
+
+    @property
+    def finished(self) -> bool:
+        """Return True once the clock passed the last captured response."""
+        self._advance(self.clock())
+        return self._next is None
+
+    def step(self) -> bool:
+        """Move the clock to the next captured poll. Return False at the end of the capture."""
+        if self._next is None:
+            return False
+        self._clock = self._next.timestamp + POLL_WINDOW
+        self._advance(self._clock)
+        return True
+
+    def _advance(self, clock: float) -> None:
+        while self._next is not None and self._next.timestamp <= clock:
+            self._latest[self._next.uri] = self._next
+            self._next = next(self._records, None)
+
+    @asynccontextmanager
+    async def request(self, method: str, uri: str, **kwargs) -> AsyncIterator[ReplayResponse]:
+        """Yield the captured response to `uri`. Writes are answered with 405 Method Not Allowed."""
+        await asyncio.sleep(0)  # Yield to the event loop, like a request to the host
+        url = f"{self.url}{uri}"
+        if method != "GET":
+            yield ReplayResponse(url, 405, b"Not supported in a replay")
+            return
+        self._advance(self.clock())
+        record = self._latest.get(uri)
+        if record is None:
+            # Not captured, or not yet at this time. The host is assumed to be up.
+            yield ReplayResponse(url, 200, b'"go"') if uri == "/api/ready" else ReplayResponse(url, 404, b"Not captured")
+        elif record.kind == KIND_TIMEOUT:
+            raise TimeoutError
+        elif record.kind == KIND_ERROR and not record.status:
+            raise aiohttp.ClientConnectionError(record.body.decode())
+        else:
+            yield ReplayResponse(url, record.status, record.body)
+
+    def get(self, uri: str):
+        """Yield the captured response to a GET request for `uri`."""
+        return self.request("GET", uri)
+
+    async def close(self) -> None:
+        """Unmap the capture."""
+        if not self.closed:
+            self.reader.close()
+            self.closed = True
@@ -0,0 +1,105 @@
+"""Change detection between the sensor snapshots and the entity states published to Home Assistant."""
+
+from __future__ import annotations
+
+from array import array
+
+_NEVER = object()  # Sentinel for slots that have not been published yet
+
+
+class Deadband:
+    """Absolute and/or relative band around the last published value in which changes are ignored."""
+
+    __slots__ = ("absolute", "relative")
+
+    def __init__(self, absolute: float = 0.0, relative: float = 0.0) -> None:
+        self.absolute = absolute
+        self.relative = relative  # Fraction of the last published value, e.g. 0.01 for 1%
+
+    def contains(self, last, value) -> bool:
+        """Return True if the change from `last` to `value` is within the deadband."""
+        delta = abs(value - last)
+        return delta <= self.absolute or delta <= self.relative * abs(last)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class ChangeFilter:
+    """Decide which sensor values need to be published after a poll.
+
+    A value is published when it differs from the value last published for the same
+    slot, unless it is numeric and within the slot's deadband. The deadband only holds
+    a value back for `max_age` seconds after the last publish, so the state converges
+    to the reading.
+
+    Unchanged values are never republished. This deliberately deviates from the
+    max-staleness heartbeat that republished every value after `max_age`: Home
+    Assistant drops writes that change neither the state nor its attributes, so the
+    heartbeat only cost the writes, and a heartbeat that reaches the recorder would
+    need `force_update` on the entities, which records every poll of an unchanged
+    value. Sensors with a state class get periodic statistics from the recorder without
+    it.
+    """
+
+    def __init__(self, size: int, deadbands: dict[int, Deadband] | None = None, max_age: float | None = None) -> None:
+        self._last_values = [_NEVER] * size
+        self._last_published = array("d", [0.0] * size)
+        self._deadbands = deadbands or {}
+        self.max_age = max_age
+
+        self.published = 0  # Number of values published
+        self.suppressed = 0  # Number of values not published, as unchanged or within deadband
+
+    def changed_slots(self, values, now: float, slots=None) -> list[int]:
+        """Return the slots of `values` that should be published and record them as published.
+
+        `now` is a monotonic timestamp in seconds. `slots` optionally restricts the
+        check to the given slots.
+        """
+        last_values = self._last_values
+        last_published = self._last_published
+        deadbands = self._deadbands
+        stale_before = now - self.max_age if self.max_age else None
+
+        changed = []
+        for slot in range(len(last_values)) if slots is None else slots:
+            value = values[slot]
+            last = last_values[slot]
+            if last is not _NEVER:
+                if value == last:
+                    continue
+                deadband = deadbands.get(slot)
+                if (
+                    deadband is not None
+                    and (stale_before is None or last_published[slot] > stale_before)
+                    and _is_number(value)
+                    and _is_number(last)
+                    and deadband.contains(last, value)
+                ):
+                    continue
+            last_values[slot] = value
+            last_published[slot] = now
+            changed.append(slot)
+
+        self.published += len(changed)
+        self.suppressed += (len(last_values) if slots is None else len(slots)) - len(changed)
+        return changed
+
+    def invalidate(self, slot: int | None = None) -> None:
+        """Force the slot (or all slots) to be published on the next check."""
+        if slot is None:
+            self._last_values = [_NEVER] * len(self._last_values)
+        else:
+            self._last_values[slot] = _NEVER
+
+    @property
+    def stats(self) -> dict:
+        """Return the publish counters."""
+        total = self.published + self.suppressed
+        return {
+            "published": self.published,
+            "suppressed": self.suppressed,
+            "suppressed_ratio": self.suppressed / total if total else 0.0,
+        }
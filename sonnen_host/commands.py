@@ -0,0 +1,163 @@
+"""Queue of write commands to a SonnenBatterie host."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable
+import logging
+import time
+
+import aiohttp
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class Command:
+    """A write to the host.
+
+    `key` identifies the setting that is written, e.g. "setpoint". A command supersedes a
+    pending command with the same key. `send` writes the value and `confirm` reads it
+    back, returning True if the host applied it. `settle`, if given, is called with
+    whether the write was confirmed once the command is done.
+    """
+
+    __slots__ = ("key", "send", "confirm", "settle", "description", "futures")
+
+    def __init__(
+        self,
+        key: str,
+        send: Callable[[], Awaitable[None]],
+        confirm: Callable[[], Awaitable[bool]],
+        description: str = "",
+        settle: Callable[[bool], Awaitable[None]] | None = None,
+    ) -> None:
+        self.key = key
+        self.send = send
+        self.confirm = confirm
+        self.settle = settle
+        self.description = description or key
+        self.futures: list[asyncio.Future] = []  # Futures of this command and the commands it superseded
+
+
+class CommandQueue:
+    """Send commands to a host one at a time, at most one write every `min_interval` seconds.
+
+    Commands submitted while an earlier command for the same setting is still pending
+    replace it, so only the latest value is written, e.g. when an automation adjusts a
+    setpoint every second. After each write the value is read back up to
+    `confirm_attempts` times, `confirm_delay` seconds apart.
+    """
+
+    def __init__(
+        self,
+        min_interval: float,
+        confirm_attempts: int,
+        confirm_delay: float,
+        name: str = "",
+    ) -> None:
+        self.min_interval = min_interval
+        self.confirm_attempts = confirm_attempts
+        self.confirm_delay = confirm_delay
+        self.name = name
+
+        self._pending: dict[str, Command] = {}  # Key -> latest command, in order of submission
+        self._worker: asyncio.Task | None = None
+        self._current: Command | None = None  # Command being sent or confirmed
+        self._last_write = float("-inf")  # Monotonic time of the last write
+
+        self.sent = 0  # Number of writes sent to the host
+        self.coalesced = 0  # Number of commands superseded before they were sent
+        self.confirmed = 0  # Number of writes read back successfully
+        self.failed = 0  # Number of writes that failed or could not be confirmed
+
+    def submit(self, command: Command) -> asyncio.Future:
+        """Queue a command. The returned future resolves to True when it was confirmed.
+
+        If the command is superseded, its future resolves with the result of the superseding command.
+        """
+        future = asyncio.get_running_loop().create_future()
+        command.futures.append(future)
+        previous = self._pending.get(command.key)
+        if previous is not None:
+            self.coalesced += 1
+            command.futures = previous.futures + command.futures
+        self._pending[command.key] = command  # Keeps the position of a superseded command
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run(), name=f"sonnen_commands_{self.name}")
+        return future
+
+    @property
+    def pending(self) -> int:
+        """Number of commands waiting to be sent."""
+        return len(self._pending)
+
+    async def _run(self) -> None:
+        while self._pending:
+            # Wait for the rate limit. Commands submitted meanwhile supersede the pending ones.
+            delay = self._last_write + self.min_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            command = self._pending.pop(next(iter(self._pending)))
+            self._last_write = time.monotonic()
+            self._current = command
+            confirmed = False
+            try:
+                confirmed = await self._execute(command)
+                if command.settle is not None:
+                    await command.settle(confirmed)
+            except Exception:  # Keep the worker alive, so the futures are resolved and later commands are sent
+                _LOGGER.exception("Unexpected error writing %s to Sonnen Batterie at %s", command.description, self.name)
+                if not confirmed:
+                    self.failed += 1
+            self._current = None
+            for future in command.futures:
+                if not future.done():
+                    future.set_result(confirmed)
+
+    async def _execute(self, command: Command) -> bool:
+        _LOGGER.debug("Sending %s to %s", command.description, self.name)
+        self.sent += 1
+        try:
+            await command.send()
+            for _ in range(self.confirm_attempts):
+                await asyncio.sleep(self.confirm_delay)
+                if await command.confirm():
+                    self.confirmed += 1
+                    return True
+                if command.key in self._pending:
+                    return False  # Superseded while confirming, the new value is written next
+        except (TimeoutError, aiohttp.ClientError, ValueError) as e:  # ValueError: malformed response
+            _LOGGER.error("Failed to send %s to Sonnen Batterie at %s: %s", command.description, self.name, e)
+        else:
+            _LOGGER.warning("Sonnen Batterie at %s did not confirm %s", self.name, command.description)
+        self.failed += 1
+        return False
+
+    async def stop(self) -> None:
+        """Drop the pending commands and cancel a command in progress."""
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+        commands = list(self._pending.values())
+        if self._current is not None:
+            commands.append(self._current)
+        for command in commands:
+            for future in command.futures:
+                future.cancel()
+        self._pending.clear()
+        self._current = None
+
+    @property
+    def stats(self) -> dict:
+        """Return the command counters."""
+        return {
+            "pending": self.pending,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "confirmed": self.confirmed,
+            "failed": self.failed,
+        }
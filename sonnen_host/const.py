@@ -0,0 +1,214 @@
+"""Constants of the SonnenBatterie client."""
+
+POLL_FREQUENCY = 2  # Polling frequency in seconds
+
+# HTTP transport, see sonnen_host/transport.py. The timeouts can be changed in the options of an entry.
+DEFAULT_CONNECT_TIMEOUT = 5  # Seconds to establish a connection to the battery
+DEFAULT_READ_TIMEOUT = 10  # Seconds to wait for data from the battery
+DEFAULT_MAX_CONNECTIONS = 2  # Concurrent reads per host, one per polled endpoint. Writes have a slot of their own.
+KEEPALIVE_TIMEOUT = 30  # Seconds an idle connection is kept open, longer than the poll interval
+
+# Writes to the battery, see sonnen_host/commands.py. Writes of the same setting within
+# COMMAND_MIN_INTERVAL are merged, only the latest value is sent.
+COMMAND_MIN_INTERVAL = 5  # Seconds between two writes to a battery
+COMMAND_CONFIRM_ATTEMPTS = 3  # Read-backs of a written value before it is reported as not applied
+COMMAND_CONFIRM_DELAY = 1  # Seconds between a write and each read-back
+
+# Values of EM_OperatingMode in /api/v2/configurations. Charge and discharge setpoints
+# are only applied by the battery in manual mode.
+OPERATING_MODE_MANUAL = "1"
+OPERATING_MODES = {
+    OPERATING_MODE_MANUAL: "Manual",
+    "2": "Self-Consumption",
+    "6": "Battery-Module-Extension",
+    "10": "Time-Of-Use",
+}
+MAX_SETPOINT_POWER = 10000  # W, upper bound of the charge and discharge setpoints
+
+# Adaptive polling. The poll interval drops to the minimum when the watched power values
+# move by more than both thresholds or a watched state flips, and grows by
+# ADAPTIVE_POLL_BACKOFF per poll up to the maximum while readings are stable.
+DEFAULT_ADAPTIVE_POLLING = False
+DEFAULT_MIN_POLL_INTERVAL = 1  # Seconds
+DEFAULT_MAX_POLL_INTERVAL = 30  # Seconds
+ADAPTIVE_POLL_NUMERIC_SENSORS = ["pac_total_w", "production_w", "consumption_w"]
+ADAPTIVE_POLL_STATE_SENSORS = ["battery_charging", "battery_discharging"]
+ADAPTIVE_POLL_ABSOLUTE_THRESHOLD = 50  # W
+ADAPTIVE_POLL_RELATIVE_THRESHOLD = 0.1  # Fraction of the previous value
+ADAPTIVE_POLL_BACKOFF = 1.25
+# Endpoints of the battery API, named as the first key of the data paths in SENSORS_LIST
+ENDPOINT_STATUS = "status"  # /api/status, mainly power values that change every second
+ENDPOINT_LATESTDATA = "data"  # /api/v2/latestdata, mainly configuration and states that rarely change
+
+# Minimum seconds between two fetches of each endpoint. Polls happen every POLL_FREQUENCY
+# seconds (or at the adaptive interval) and only fetch the endpoints that are due.
+ENDPOINT_POLL_INTERVALS = {
+    ENDPOINT_STATUS: 0,  # Every poll
+    ENDPOINT_LATESTDATA: 30,
+}
+
+# Seconds each endpoint may take to respond before its previous data is kept and marked
+# as stale, and the total seconds a poll may take
+ENDPOINT_DEADLINES = {
+    ENDPOINT_STATUS: 1.5,
+    ENDPOINT_LATESTDATA: 5,
+}
+POLL_TIME_BUDGET = 8
+
+# Circuit breaker. After this many consecutive failed polls, polling stops and the
+# battery is probed on an exponential backoff until it responds again.
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_INITIAL_BACKOFF = 5  # Seconds
+BREAKER_MAX_BACKOFF = 300  # Seconds
+
+LOG_SUMMARY_INTERVAL = 300  # Seconds between log entries for the same repeated error
+
+# Keys in /api/status whose change triggers an immediate fetch of /api/v2/latestdata
+LATESTDATA_REFRESH_TRIGGERS = ["SystemStatus", "OperatingMode"]
+
+# Changes within these bands of the last published value are not published, for at most DEADBAND_MAX_AGE.
+# Keys are sensor names, values are {"absolute": <in sensor uom>, "relative": <fraction of last value>}
+# Not a heartbeat: unchanged values are never republished, see ChangeFilter.
+DEADBAND_MAX_AGE = 300  # Seconds after which a value held back by its deadband is published when it is next read
+SENSOR_DEADBANDS = {
+    "consumption_avg": {"absolute": 5},
+    "consumption_w": {"absolute": 5},
+    "fac": {"absolute": 0.01},
+    "grid_feed_in_w": {"absolute": 5},
+    "pac_total_w": {"absolute": 5},
+    "production_w": {"absolute": 5},
+}
+
+DATA_TYPE_FLAG_GROUP = "flag_group"  # Custom data type for to indicate that the data is a group of boolean flags
+
+SENSORS_LIST = [
+    # ["name", "friendly name", "path in host data", "data type", "uom", "icon", "default value"]
+    ["serial_number", "Serial Number", "host.serial_number", "str", None, "mdi:identifier", None],
+    ["battery_charging", "Battery Charging", "status.BatteryCharging", "bool", None, "mdi:battery-charging", None],
+    ["battery_discharging", "Battery Discharging", "status.BatteryDischarging", "bool", None, "mdi:battery-charging", None],
+    ["consumption_avg", "Consumption Average", "status.Consumption_Avg", "int", "W", "mdi:flash", None],
+    ["consumption_w", "Consumption", "status.Consumption_W", "int", "W", "mdi:flash", None],
+    ["fac", "Frequency", "status.Fac", "float", "Hz", "mdi:sine-wave", None],
+    ["grid_feed_in_w", "Grid Feed-In", "status.GridFeedIn_W", "int", "W", "mdi:transmission-tower", None],
+    ["operating_mode", "Operating Mode", "status.OperatingMode", "str", None, "mdi:cog", None],
+    ["pac_total_w", "Total Power Consumption", "status.Pac_total_W", "int", "W", "mdi:flash", None],
+    ["production_w", "Production", "status.Production_W", "int", "W", "mdi:solar-panel", None],
+    ["rsoc", "Relative State of Charge", "status.RSOC", "int", "%", "mdi:battery", None],
+    ["remaining_capacity_wh", "Remaining Capacity", "status.RemainingCapacity_Wh", "int", "Wh", "mdi:battery", None],
+    ["system_status", "System Status", "status.SystemStatus", "str", None, "mdi:information", None],
+    # ["timestamp", "Timestamp", "status.Timestamp", "str", None, "mdi:clock", None],
+    ["usoc", "Usable State of Charge", "status.USOC", "int", "%", "mdi:battery", None],
+    ["uac", "AC Voltage", "status.Uac", "int", "V", "mdi:flash", None],
+    ["ubat", "Battery Voltage", "status.Ubat", "int", "V", "mdi:flash", None],
+    ["discharge_not_allowed", "Discharge Not Allowed", "status.dischargeNotAllowed", "bool", None, "mdi:alert", None],
+    ["full_charge_capacity", "Full Charge Capacity", "data.FullChargeCapacity", "int", "Wh", "mdi:battery", None],
+    ["set_point_w", "Set Point", "data.SetPoint_W", "int", "W", "mdi:flash", None],
+    ["utc_offset", "UTC Offset", "data.UTC_Offet", "int", "h", "mdi:clock", None],
+    ["eclipse_led_brightness", "Eclipse Led Brightness", "data.ic_status.Eclipse Led.Brightness", "int", "%", "mdi:brightness-6", None],
+    ["number_of_battery_modules", "Number of Battery Modules", "data.ic_status.nrbatterymodules", "int", None, "mdi:battery", None],
+    ["number_of_battery_modules_in_parallel", "Battery Modules in Parallel", "data.ic_status.nrbatterymodulesinparallel", "int", None, "mdi:battery", None],
+    ["number_of_battery_modules_in_series", "Battery Modules in Series", "data.ic_status.nrbatterymodulesinseries", "int", None, "mdi:battery", None],
+    ["seconds_since_full_charge", "Seconds Since Full Charge", "data.ic_status.secondssincefullcharge", "int", "s", "mdi:clock", None],
+    ["bms_state", "BMS State", "data.ic_status.statebms", "str", None, "mdi:information", None],
+    ["core_control_module_state", "Core Control Module State", "data.ic_status.statecorecontrolmodule", "str", None, "mdi:information", None],
+    ["inverter_state", "Inverter State", "data.ic_status.stateinverter", "str", None, "mdi:information", None],
+
+    ["dc_shutdown_reason", "DC Shutdown Reason", "data.ic_status.DC Shutdown Reason", DATA_TYPE_FLAG_GROUP, None, "mdi:alert", "Not shutdown"],
+    # ["droop_mode_status", "Droop mode status", "data.ic_status.Droop mode status", DATA_TYPE_FLAG_GROUP, None, "mdi:information", "Unknown"],
+    ["eclipse_led_mode", "Eclipse Led Mode", "data.ic_status.Eclipse Led", DATA_TYPE_FLAG_GROUP, None, "mdi:led-on", "Unknown"],
+    # ["microgrid_status", "Microgrid Status", "data.ic_status.Microgrid Status", DATA_TYPE_FLAG_GROUP, None, "mdi:led-on", None, "Unknown"]
+    ["setpoint_priority", "Setpoint Priority", "data.ic_status.Setpoint Priority", DATA_TYPE_FLAG_GROUP, None, "mdi:priority-high", "Unknown"]
+]
+
+# Curated definitions of payload fields found by sensor discovery (see sonnen_host/schema.py),
+# replacing the inferred data type, unit and icon. Fields mapped to None are not discovered,
+# e.g. duplicates of other sensors. Discovered sensors are disabled by default.
+DISCOVERY_OVERRIDES = {
+    # "path in host data": ["friendly name", "data type", "uom", "icon", "default value"] or None
+    "status.Apparent_output": ["Apparent Output", "int", "VA", "mdi:flash", None],
+    "status.BackupBuffer": ["Backup Buffer", "int", "%", "mdi:battery-lock", None],
+    "status.FlowConsumptionBattery": ["Flow Battery to Consumption", "bool", None, "mdi:transfer", None],
+    "status.FlowConsumptionGrid": ["Flow Grid to Consumption", "bool", None, "mdi:transfer", None],
+    "status.FlowConsumptionProduction": ["Flow Production to Consumption", "bool", None, "mdi:transfer", None],
+    "status.FlowGridBattery": ["Flow Grid to Battery", "bool", None, "mdi:transfer", None],
+    "status.FlowProductionBattery": ["Flow Production to Battery", "bool", None, "mdi:transfer", None],
+    "status.FlowProductionGrid": ["Flow Production to Grid", "bool", None, "mdi:transfer", None],
+    "status.IsSystemInstalled": ["System Installed", "bool", None, "mdi:check-circle", None],
+    "status.Sac1": ["Apparent Power L1", "int", "VA", "mdi:flash", None],
+    "status.Sac2": ["Apparent Power L2", "int", "VA", "mdi:flash", None],
+    "status.Sac3": ["Apparent Power L3", "int", "VA", "mdi:flash", None],
+    "status.generator_autostart": ["Generator Autostart", "bool", None, "mdi:engine", None],
+    "data.ic_status.Droop mode status": ["Droop Mode Status", DATA_TYPE_FLAG_GROUP, None, "mdi:information", "Unknown"],
+    "data.ic_status.MISC Status Bits": ["Status Bits", DATA_TYPE_FLAG_GROUP, None, "mdi:alert", "None"],
+    "data.ic_status.Microgrid Status": ["Microgrid Status", DATA_TYPE_FLAG_GROUP, None, "mdi:transmission-tower", "Unknown"],
+    "data.ic_status.System Validation": ["System Validation", DATA_TYPE_FLAG_GROUP, None, "mdi:check-decagram", "Unknown"],
+    # Timestamps change on every poll
+    "status.Timestamp": None,
+    "data.Timestamp": None,
+    "data.ic_status.timestamp": None,
+    # Duplicates of the status sensors
+    "data.Consumption_W": None,
+    "data.GridFeedIn_W": None,
+    "data.Pac_total_W": None,
+    "data.Production_W": None,
+    "data.RSOC": None,
+    "data.USOC": None,
+}
+DISCOVERY_UNIT_SUFFIXES = {"_Wh": "Wh", "_W": "W", "_VA": "VA", "_V": "V", "_A": "A", "_Hz": "Hz"}  # Key suffix -> uom
+DISCOVERY_MAX_CACHED_SCHEMAS = 10  # Fingerprints of payload structures whose discovered sensors are cached
+
+# Scan of a network for batteries, see sonnen_host/scan.py. Every address is probed on
+# /api/ready, at most SCAN_CONCURRENCY at a time, so a /24 takes about
+# 254 / SCAN_CONCURRENCY * SCAN_PROBE_TIMEOUT seconds, 16 s, if no address answers.
+# Both are defaults of the discover step of the config flow, e.g. to scan faster on a
+# network with more capable devices, or slower on one with a busy battery.
+SCAN_CONCURRENCY = 32  # Addresses probed at the same time
+SCAN_PROBE_TIMEOUT = 2  # Seconds an address may take to answer /api/ready
+SCAN_IDENTIFY_TIMEOUT = 5  # Seconds a responding battery may take per request for its serial number
+SCAN_REVERSE_DNS_TIMEOUT = 1  # Seconds for the host name of a responding address
+SCAN_MAX_ADDRESSES = 1024  # Largest network scanned, a /22
+
+# Numeric sensors whose recent samples are kept at full resolution, e.g. for troubleshooting
+SAMPLE_HISTORY_SENSORS = ["consumption_w", "grid_feed_in_w", "pac_total_w", "production_w", "rsoc", "fac"]
+SAMPLE_HISTORY_DURATION = 3600  # Seconds of samples kept, at most one per poll at the shortest poll interval
+
+STATISTICS_SENSORS_LIST = [
+    # Downsampled statistics of numeric sensors, updated once per period, so the raw sensors can be excluded from the recorder.
+    # ["name", "friendly name", "source sensor", "data type", "uom", "icon", "default value", "statistic", "period in s"]
+    # Statistics are "mean", "min", "max", "median" and "p95".
+    ["consumption_w_mean_1m", "Consumption 1 min Mean", "consumption_w", "float", "W", "mdi:flash", None, "mean", 60],
+    ["consumption_w_max_1m", "Consumption 1 min Peak", "consumption_w", "float", "W", "mdi:flash", None, "max", 60],
+    ["production_w_mean_1m", "Production 1 min Mean", "production_w", "float", "W", "mdi:solar-panel", None, "mean", 60],
+    ["grid_feed_in_w_mean_1m", "Grid Feed-In 1 min Mean", "grid_feed_in_w", "float", "W", "mdi:transmission-tower", None, "mean", 60],
+    ["pac_total_w_mean_1m", "Total Power Consumption 1 min Mean", "pac_total_w", "float", "W", "mdi:flash", None, "mean", 60],
+]
+
+DERIVED_SENSORS_LIST = [
+    # Metrics computed from other values, recomputed only when one of their inputs changed.
+    # ["name", "friendly name", "formula", "data type", "uom", "icon", "default value", ["input", ...]]
+    # Formulas are defined in sonnen_host/derived.py. Inputs are paths in host data or names of other derived metrics.
+    ["self_consumption", "Self-Consumption", "self_consumption", "float", "%", "mdi:home-percent", None, ["status.Production_W", "status.GridFeedIn_W"]],
+    ["autarky", "Autarky", "autarky", "float", "%", "mdi:home-battery", None, ["status.Consumption_W", "status.GridFeedIn_W"]],
+    ["time_to_empty", "Time to Empty", "time_to_empty", "float", "h", "mdi:battery-clock", None, ["status.RemainingCapacity_Wh", "status.Pac_total_W"]],
+    ["time_to_full", "Time to Full", "time_to_full", "float", "h", "mdi:battery-clock", None, ["data.FullChargeCapacity", "status.RemainingCapacity_Wh", "status.Pac_total_W"]],
+    ["usable_energy", "Usable Energy", "usable_energy", "float", "kWh", "mdi:battery", None, ["status.USOC", "data.FullChargeCapacity"]],
+]
+
+# Seconds between two power samples at most integrated into energy. A longer gap, e.g.
+# while the host was unreachable, is counted as ENERGY_MAX_GAP. With adaptive polling the
+# gap is raised to the maximum poll interval plus ENERGY_GAP_MARGIN, see
+# SonnenBatterieHost.configure_energy_gap, so polls at a backed off interval count in full.
+ENERGY_MAX_GAP = 60
+ENERGY_GAP_MARGIN = 30  # Seconds a poll may be late, e.g. by the time budget of the previous poll
+
+ENERGY_SENSORS_LIST = [
+    # Energy counters integrated from power sensors on every poll, for the Energy dashboard.
+    # ["name", "friendly name", "source sensor", "data type", "uom", "icon", "default value", "direction"]
+    # The direction is the sign of the power that is counted, "positive" or "negative".
+    ["grid_import_energy", "Grid Import", "grid_feed_in_w", "float", "kWh", "mdi:transmission-tower-import", None, "negative"],
+    ["grid_export_energy", "Grid Export", "grid_feed_in_w", "float", "kWh", "mdi:transmission-tower-export", None, "positive"],
+    ["battery_charge_energy", "Battery Charge", "pac_total_w", "float", "kWh", "mdi:battery-arrow-up", None, "negative"],
+    ["battery_discharge_energy", "Battery Discharge", "pac_total_w", "float", "kWh", "mdi:battery-arrow-down", None, "positive"],
+    ["production_energy", "Production Energy", "production_w", "float", "kWh", "mdi:solar-power", None, "positive"],
+    ["consumption_energy", "Consumption Energy", "consumption_w", "float", "kWh", "mdi:home-lightning-bolt", None, "positive"],
+]
@@ -0,0 +1,39 @@
+"""Streaming scanner for the device-id script in the SonnenBatterie dashboard HTML.
+
+Only imported when the serial number is not cached, to keep html.parser off the startup path.
+"""
+
+from __future__ import annotations
+
+import codecs
+from collections.abc import AsyncIterable
+from html.parser import HTMLParser
+
+
+class _Found(Exception):
+    """Raised by the parser to stop parsing once the script tag is found."""
+
+
+class _DeviceIdScriptParser(HTMLParser):
+    def handle_starttag(self, tag, attrs):
+        if tag == "script":
+            for name, value in attrs:
+                if name == "src" and value and "device-id" in value:
+                    raise _Found(value)
+
+
+async def find_device_id_script(chunks: AsyncIterable[bytes], encoding: str = "utf-8") -> str | None:
+    """Return the src of the first script tag containing "device-id", or None if there is none.
+
+    `chunks` is the response body as it arrives. Reading stops as soon as the tag is found.
+    """
+    parser = _DeviceIdScriptParser(convert_charrefs=True)
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    try:
+        async for chunk in chunks:
+            parser.feed(decoder.decode(chunk))
+        parser.feed(decoder.decode(b"", final=True))
+        parser.close()
+    except _Found as found:
+        return found.args[0]
+    return None
@@ -0,0 +1,131 @@
+"""Metrics derived from sensor values, recomputed only when their inputs change."""
+
+from __future__ import annotations
+
+from graphlib import TopologicalSorter
+from typing import Any, Callable
+
+from .extraction import ExtractionPlan
+
+
+def _self_consumption(production_w, grid_feed_in_w):
+    """Percentage of the production used on site."""
+    if production_w <= 0:
+        return None
+    return 100 * (production_w - max(grid_feed_in_w, 0)) / production_w
+
+
+def _autarky(consumption_w, grid_feed_in_w):
+    """Percentage of the consumption not drawn from the grid."""
+    if consumption_w <= 0:
+        return None
+    return 100 * (consumption_w - max(-grid_feed_in_w, 0)) / consumption_w
+
+
+def _time_to_empty(remaining_capacity_wh, pac_total_w):
+    """Hours until the battery is empty at the current discharge power."""
+    if pac_total_w <= 0:
+        return None  # Not discharging
+    return remaining_capacity_wh / pac_total_w
+
+
+def _time_to_full(full_charge_capacity_wh, remaining_capacity_wh, pac_total_w):
+    """Hours until the battery is full at the current charge power."""
+    if pac_total_w >= 0:
+        return None  # Not charging
+    return max(full_charge_capacity_wh - remaining_capacity_wh, 0) / -pac_total_w
+
+
+def _usable_energy(usoc, full_charge_capacity_wh):
+    """Usable energy in kWh."""
+    return usoc / 100 * full_charge_capacity_wh / 1000
+
+
+# Formulas referenced by name in DERIVED_SENSORS_LIST. Arguments are the input values in
+# the order of the inputs. Return None if the metric is undefined for the inputs.
+FORMULAS: dict[str, Callable[..., Any]] = {
+    "self_consumption": _self_consumption,
+    "autarky": _autarky,
+    "time_to_empty": _time_to_empty,
+    "time_to_full": _time_to_full,
+    "usable_energy": _usable_energy,
+}
+
+
+def input_paths(derived_list: list) -> set[str]:
+    """Return the data paths read by the derived metrics, i.e. inputs that are not derived metrics."""
+    names = {metric_config[0] for metric_config in derived_list}
+    return {path for metric_config in derived_list for path in metric_config[7] if path not in names}
+
+
+class DerivedMetrics:
+    """Dependency graph of the derived metrics in `derived_list`, see DERIVED_SENSORS_LIST.
+
+    Inputs are data paths of sensors in the extraction plan, or names of other derived
+    metrics. The graph is resolved once. On `update`, only the metrics with an input
+    that changed between two snapshots are recomputed, in dependency order.
+    """
+
+    def __init__(self, derived_list: list, plan: ExtractionPlan) -> None:
+        self.names = [metric_config[0] for metric_config in derived_list]
+        self.values: dict[str, Any] = dict.fromkeys(self.names)
+        self.defaults = {metric_config[0]: metric_config[6] for metric_config in derived_list}
+        slot_of_path = {}
+        for slot, path in enumerate(plan.paths):
+            slot_of_path.setdefault(path, slot)
+
+        self._formulas = {metric_config[0]: FORMULAS[metric_config[2]] for metric_config in derived_list}
+        self._inputs: dict[str, tuple] = {}  # Name -> inputs, each a slot or the name of a derived metric
+        dependents: dict[Any, list[str]] = {}  # Slot or name -> names of the metrics reading it
+        graph = {}
+        for name, _, _, _, _, _, _, inputs in derived_list:
+            resolved = tuple(input if input in self.values else slot_of_path[input] for input in inputs)
+            self._inputs[name] = resolved
+            graph[name] = {input for input in resolved if input in self.values}
+            for input in resolved:
+                dependents.setdefault(input, []).append(name)
+        self._order = list(TopologicalSorter(graph).static_order())  # Raises CycleError on cycles
+        self._position = {name: position for position, name in enumerate(self._order)}
+        self._dependents = dependents
+        self.input_slots = sorted(input for input in dependents if type(input) is int)  # noqa: E721
+
+    def slots_of(self, name: str) -> set[int]:
+        """Return the slots read by a metric, including those read through other derived metrics."""
+        slots = set()
+        for input in self._inputs[name]:
+            slots |= self.slots_of(input) if input in self.values else {input}
+        return slots
+
+    def update(self, previous_values: tuple, values: tuple) -> list[str]:
+        """Recompute the metrics whose inputs changed between two snapshots' values.
+
+        Return the names of the metrics whose value changed.
+        """
+        stale = {
+            name
+            for slot in self.input_slots
+            if previous_values[slot] != values[slot]
+            for name in self._dependents[slot]
+        }
+        return self._recompute(stale, values)
+
+    def _recompute(self, stale: set[str], values: tuple) -> list[str]:
+        changed = []
+        while stale:
+            name = min(stale, key=self._position.__getitem__)  # Inputs before the metrics reading them
+            stale.discard(name)
+            arguments = [self.values[input] if input in self.values else values[input] for input in self._inputs[name]]
+            if any(type(argument) not in (int, float) for argument in arguments):
+                value = self.defaults[name]  # An input is missing or not numeric
+            else:
+                try:
+                    value = self._formulas[name](*arguments)
+                except ZeroDivisionError:
+                    value = None
+                if type(value) is float:  # noqa: E721
+                    value = round(value, 2)  # Insignificant changes are not published
+            if value != self.values[name]:
+                self.values[name] = value
+                changed.append(name)
+                stale.update(self._dependents.get(name, ()))
+        return changed
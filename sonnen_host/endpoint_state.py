@@ -0,0 +1,46 @@
+"""Freshness of the data of a SonnenBatterie API endpoint."""
+
+from __future__ import annotations
+
+from collections.abc import Callable
+import time
+
+
+class EndpointState:
+    """Track when the data of an endpoint was last fetched successfully.
+
+    When a fetch fails or misses its deadline, the last good data is kept and the
+    endpoint is marked as stale until the next successful fetch. Times are read from
+    `clock`, the wall clock of the host.
+    """
+
+    __slots__ = ("clock", "last_success", "stale", "timeouts", "errors")
+
+    def __init__(self, clock: Callable[[], float] = time.time) -> None:
+        self.clock = clock
+        self.last_success: float | None = None  # Time on `clock` of the last successful fetch
+        self.stale = False
+        self.timeouts = 0  # Number of fetches that missed their deadline
+        self.errors = 0  # Number of fetches that failed
+
+    def succeeded(self) -> bool:
+        """Record a successful fetch. Return True if the endpoint was stale before."""
+        was_stale = self.stale
+        self.last_success = self.clock()
+        self.stale = False
+        return was_stale
+
+    def failed(self, timeout: bool = False) -> bool:
+        """Record a failed fetch. Return True if the endpoint was not stale before."""
+        if timeout:
+            self.timeouts += 1
+        else:
+            self.errors += 1
+        was_fresh = not self.stale
+        self.stale = True
+        return was_fresh
+
+    @property
+    def age(self) -> float | None:
+        """Seconds since the last successful fetch, or None if there was none."""
+        return None if self.last_success is None else self.clock() - self.last_success
@@ -0,0 +1,57 @@
+"""Integration of power samples into energy counters."""
+
+from __future__ import annotations
+
+DIRECTION_POSITIVE = "positive"  # Energy while the power is positive, e.g. grid feed-in (export)
+DIRECTION_NEGATIVE = "negative"  # Energy while the power is negative, e.g. grid import
+
+
+class EnergyCounter:
+    """Integrate a power in W into energy in Wh, separately for positive and negative power.
+
+    Samples are integrated with the trapezoidal rule. A trapezoid crossing zero is split
+    at the crossing, so each part is counted in the direction of its sign. The time
+    between two samples is limited to `max_dt` seconds, so after a gap, e.g. while the
+    host was unreachable, the last power is not assumed for the whole gap.
+    """
+
+    __slots__ = ("max_dt", "positive_wh", "negative_wh", "_last_time", "_last_power")
+
+    def __init__(self, max_dt: float) -> None:
+        self.max_dt = max_dt
+        self.positive_wh = 0.0
+        self.negative_wh = 0.0  # Counted as a positive amount
+        self._last_time: float | None = None
+        self._last_power = 0.0
+
+    def add(self, timestamp: float, power: float) -> None:
+        """Add a power sample. `timestamp` is a monotonic time in seconds."""
+        if self._last_time is not None and timestamp > self._last_time:
+            dt = min(timestamp - self._last_time, self.max_dt)
+            start = self._last_power
+            if (start >= 0) == (power >= 0):
+                self._count((start + power) / 2 * dt / 3600)
+            else:
+                # Split at the zero crossing of the line between the two samples
+                dt_start = dt * abs(start) / (abs(start) + abs(power))
+                self._count(start / 2 * dt_start / 3600)
+                self._count(power / 2 * (dt - dt_start) / 3600)
+        self._last_time = timestamp
+        self._last_power = power
+
+    def _count(self, energy_wh: float) -> None:
+        if energy_wh >= 0:
+            self.positive_wh += energy_wh
+        else:
+            self.negative_wh -= energy_wh
+
+    def energy_wh(self, direction: str) -> float:
+        """Return the energy counted in `direction`, one of DIRECTION_*."""
+        return self.positive_wh if direction == DIRECTION_POSITIVE else self.negative_wh
+
+    def restore(self, direction: str, energy_wh: float) -> None:
+        """Add a total counted before a restart to the energy counted in `direction`."""
+        if direction == DIRECTION_POSITIVE:
+            self.positive_wh += energy_wh
+        else:
+            self.negative_wh += energy_wh
@@ -0,0 +1,212 @@
+"""Compiled extraction of sensor values from the SonnenBatterie API payloads.
+
+The sensors list (see `SENSORS_LIST` in const.py) is compiled once into a tree of
+accessors. After every poll the tree is walked a single time and produces an immutable
+`SensorSnapshot` holding the value of every sensor, so entities can read their state
+by index instead of walking the nested payload dicts themselves.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable
+
+from .const import DATA_TYPE_FLAG_GROUP
+
+MISSING = object()  # Sentinel for values that could not be found in the payload
+
+
+def _coerce_int(value):
+    if type(value) is int:  # noqa: E721  Fast path, also excludes bool
+        return value
+    if isinstance(value, float):
+        return int(value)
+    return int(str(value).strip())
+
+
+def _coerce_float(value):
+    if type(value) is float:  # noqa: E721
+        return value
+    return float(value)
+
+
+def _coerce_bool(value):
+    if value is True or value is False:
+        return value
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "1", "on", "yes")
+    return bool(value)
+
+
+def _coerce_str(value):
+    return value if type(value) is str else str(value)  # noqa: E721
+
+
+COERCERS: dict[str, Callable[[Any], Any]] = {
+    "int": _coerce_int,
+    "float": _coerce_float,
+    "bool": _coerce_bool,
+    "str": _coerce_str,
+}
+
+
+def _make_resolver(data_type: str, default) -> Callable[[Any], Any]:
+    """Return a function converting a raw payload value into the sensor value."""
+    if data_type == DATA_TYPE_FLAG_GROUP:
+        # The value is a group of boolean flags. The flag set to True is the sensor value.
+        def resolve_flag_group(value):
+            if not isinstance(value, dict):
+                return MISSING
+            for flag, flag_value in value.items():
+                if flag_value is True:  # Ensure that only keys with booleans are considered
+                    return flag
+            return default
+        return resolve_flag_group
+
+    coerce = COERCERS.get(data_type)
+    if coerce is None:
+        return lambda value: value
+
+    def resolve(value):
+        if value is None:
+            return None
+        try:
+            return coerce(value)
+        except (TypeError, ValueError):
+            return value  # Keep the raw value rather than dropping it
+    return resolve
+
+
+class _Node:
+    """A key in the accessor tree, with (slot, resolver, name) of the sensors reading its value."""
+
+    __slots__ = ("children", "leaves", "items")
+
+    def __init__(self) -> None:
+        self.children: dict[str, _Node] = {}
+        self.leaves: list[tuple[int, Callable[[Any], Any], str]] = []
+        self.items: tuple = ()  # Frozen (key, child) pairs, see ExtractionPlan._freeze
+
+class SensorSnapshot:
+    """Immutable, versioned set of sensor values produced by a single extraction."""
+
+    __slots__ = ("version", "timestamp", "values", "missing")
+
+    def __init__(self, version: int, timestamp: float, values: tuple, missing: tuple = ()) -> None:
+        object.__setattr__(self, "version", version)
+        object.__setattr__(self, "timestamp", timestamp)
+        object.__setattr__(self, "values", values)
+        object.__setattr__(self, "missing", missing)  # Names of sensors that fell back to their default
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SensorSnapshot is immutable")
+
+    def __getitem__(self, slot: int):
+        return self.values[slot]
+
+    def replace(self, values: dict[int, Any], version: int) -> SensorSnapshot:
+        """Return a new snapshot with the values of some slots replaced."""
+        new_values = list(self.values)
+        for slot, value in values.items():
+            new_values[slot] = value
+        return SensorSnapshot(version, self.timestamp, tuple(new_values), self.missing)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class ExtractionPlan:
+    """Accessor tree compiled from a sensors list.
+
+    Each sensor is assigned a slot, i.e. its index in the values of the
+    snapshots produced by `extract`.
+    """
+
+    def __init__(self, sensors_list: list) -> None:
+        self.root = _Node()
+        self.slots: dict[str, int] = {}  # Sensor name -> slot
+        self.paths: list[str] = []  # Slot -> data path
+        self.endpoints: list[str] = []  # Slot -> first key of the data path, i.e. the data source
+        self.defaults: list = []  # Slot -> default value
+        for sensor_config in sensors_list:
+            self._add(sensor_config[0], sensor_config[2], sensor_config[3], sensor_config[6])
+        self._freeze(self.root)
+        self.endpoint_slots: dict[str, list[int]] = {}  # Endpoint -> slots of the sensors reading from it
+        for slot, endpoint in enumerate(self.endpoints):
+            self.endpoint_slots.setdefault(endpoint, []).append(slot)
+        self.empty_snapshot = SensorSnapshot(0, 0.0, tuple(self.defaults))
+
+    def _add(self, name: str, data_path: str, data_type: str, default) -> None:
+        node = self.root
+        for key in data_path.split("."):
+            node = node.children.setdefault(key, _Node())
+        slot = len(self.paths)
+        node.leaves.append((slot, _make_resolver(data_type, default), name))
+        self.slots[name] = slot
+        self.paths.append(data_path)
+        self.endpoints.append(data_path.split(".", 1)[0])
+        self.defaults.append(default)
+
+    def _freeze(self, node: _Node) -> None:
+        """Convert the children of each node into tuples, which are faster to iterate."""
+        node.items = tuple(node.children.items())
+        node.leaves = tuple(node.leaves)
+        for child in node.children.values():
+            self._freeze(child)
+
+    def slot_of(self, name: str) -> int:
+        """Return the slot of the sensor with the given name."""
+        return self.slots[name]
+
+    def extract(
+        self,
+        data: dict,
+        version: int,
+        timestamp: float = 0.0,
+        previous: SensorSnapshot | None = None,
+        endpoints=None,
+    ) -> SensorSnapshot:
+        """Walk the accessor tree once over `data` and return a snapshot of all sensor values.
+
+        If `endpoints` is given, only the values under these first keys of the data paths
+        are extracted and all other values are taken over from the `previous` snapshot.
+        """
+        if endpoints is None or previous is None:
+            values = list(self.defaults)
+            missing = []
+            self._walk(self.root, data, values, missing)
+        else:
+            values = list(previous.values)
+            for slot in self.slots_of_endpoints(endpoints):
+                values[slot] = self.defaults[slot]
+            missing = [name for name in previous.missing if self.endpoints[self.slots[name]] not in endpoints]
+            for key, child in self.root.items:
+                if key in endpoints:
+                    self._walk_child(key, child, data, values, missing)
+        return SensorSnapshot(version, timestamp, tuple(values), tuple(missing))
+
+    def slots_of_endpoints(self, endpoints) -> list[int]:
+        """Return the slots of the sensors reading from the given endpoints."""
+        return [slot for endpoint in endpoints for slot in self.endpoint_slots.get(endpoint, ())]
+
+    def _walk(self, node: _Node, data, values: list, missing: list) -> None:
+        for key, child in node.items:
+            self._walk_child(key, child, data, values, missing)
+
+    def _walk_child(self, key: str, child: _Node, data, values: list, missing: list) -> None:
+        value = data.get(key, MISSING) if type(data) is dict else MISSING  # noqa: E721
+        if value is MISSING:
+            self._collect_missing(child, missing)
+            return
+        for slot, resolve, name in child.leaves:
+            resolved = resolve(value)
+            if resolved is MISSING:
+                missing.append(name)
+            else:
+                values[slot] = resolved
+        if child.items:
+            self._walk(child, value, values, missing)
+
+    def _collect_missing(self, node: _Node, missing: list) -> None:
+        missing.extend(name for _, _, name in node.leaves)
+        for child in node.children.values():
+            self._collect_missing(child, missing)
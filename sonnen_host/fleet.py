@@ -0,0 +1,185 @@
+"""Index of the SonnenBatterie hosts and aggregates across them."""
+
+from __future__ import annotations
+
+import logging
+import math
+from typing import Callable, List
+
+from .const import POLL_FREQUENCY
+from .scheduler import PollScheduler
+from .sonnen_host import SonnenBatterieHost
+
+_LOGGER = logging.getLogger(__name__)
+
+FLEET_ID = "fleet"
+
+# Sums maintained across the hosts. Each host contributes one value per key.
+AGGREGATES = (
+    "units_online",
+    "power",
+    "production",
+    "consumption",
+    "grid_feed_in",
+    "capacity",
+    "remaining_capacity",
+    "usable_capacity",
+    "capacity_weighted_soc",  # Sum of RSOC x full charge capacity, divided by the capacity for the fleet SoC
+    "units_charging",
+    "units_discharging",
+)
+_NO_CONTRIBUTION = (0,) * len(AGGREGATES)
+# Updates of the sums after which they are recomputed from the contributions, dropping the rounding
+# errors the running sums of floats accumulate. Every 12 minutes for one host polled every 2 s.
+EXACT_SUM_INTERVAL = 360
+
+
+def _number(value) -> float:
+    return value if type(value) in (int, float) else 0  # noqa: E721  Missing values count as 0
+
+
+class SonnenFleet:
+    """Hosts indexed by config entry id and serial number, with aggregates across all of them.
+
+    A host that finished a poll is only marked as updated. Its contribution to the
+    aggregates is recomputed when the aggregates are read, e.g. once per poll interval
+    by the fleet's own scheduler publishing them, however many hosts
+    polled. The previous contribution is subtracted and the new one added, so an update
+    does not depend on the number of hosts. The sums are recomputed exactly when a host
+    is removed and every EXACT_SUM_INTERVAL updates, so rounding errors do not
+    accumulate, e.g. into a non-zero power of a fleet whose hosts all read 0 W.
+    """
+
+    def __init__(self) -> None:
+        self.hosts: dict[str, SonnenBatterieHost] = {}  # Config entry id -> host
+        self.hosts_by_serial_number: dict[str, SonnenBatterieHost] = {}
+        self._serial_numbers: dict[str, str] = {}  # Config entry id -> serial number the host is indexed by
+        self._contributions: dict[str, tuple] = {}  # Config entry id -> contribution to the sums
+        self._updated: set[str] = set()  # Config entry ids of the hosts that polled since the sums were updated
+        self._sums = dict.fromkeys(AGGREGATES, 0)
+        self._updates_since_exact_sums = 0
+        self._changed = False  # Sums changed since they were last published
+
+        self.owner_entry_id: str | None = None  # Config entry providing the fleet device, see OPTION_FLEET_DEVICE
+        self.change_listeners: List[Callable[[dict], None]] = []  # Called with the `values` when they changed
+        self.scheduler = PollScheduler(self.publish_changes, interval=POLL_FREQUENCY, name=FLEET_ID, jitter=False)
+
+    def __iter__(self):
+        return iter(self.hosts.values())
+
+    def __len__(self) -> int:
+        return len(self.hosts)
+
+    def get(self, entry_id: str) -> SonnenBatterieHost | None:
+        """Return the host of a config entry."""
+        return self.hosts.get(entry_id)
+
+    def get_by_serial_number(self, serial_number: str) -> SonnenBatterieHost | None:
+        """Return the host with the given serial number."""
+        return self.hosts_by_serial_number.get(serial_number)
+
+    def add(self, host: SonnenBatterieHost) -> None:
+        """Add a host and its contribution to the aggregates."""
+        self.hosts[host.entry_id] = host
+        host.poll_listeners.append(self.host_updated)
+        self.host_updated(host)
+
+    def remove(self, host: SonnenBatterieHost) -> None:
+        """Remove a host and its contribution to the aggregates."""
+        if self.hosts.get(host.entry_id) is not host:
+            return
+        del self.hosts[host.entry_id]
+        self._index_serial_number(host.entry_id, None)
+        if self.host_updated in host.poll_listeners:
+            host.poll_listeners.remove(self.host_updated)
+        self._updated.discard(host.entry_id)
+        if self._contributions.pop(host.entry_id, _NO_CONTRIBUTION) != _NO_CONTRIBUTION:
+            self._update_exact_sums()
+            self._changed = True
+
+    def host_updated(self, host: SonnenBatterieHost) -> None:
+        """Mark the contribution of a host to the aggregates as outdated, e.g. after it polled.
+
+        The serial number index is updated at once, as the serial number may only be known,
+        or may have changed, after the host was added.
+        """
+        if self._serial_numbers.get(host.entry_id) != host.serial_number:
+            self._index_serial_number(host.entry_id, host.serial_number)
+        self._updated.add(host.entry_id)
+
+    def _index_serial_number(self, entry_id: str, serial_number: str | None) -> None:
+        previous = self._serial_numbers.pop(entry_id, None)
+        if previous is not None and self.hosts_by_serial_number.get(previous) is not None:
+            if self.hosts_by_serial_number[previous].entry_id == entry_id:
+                del self.hosts_by_serial_number[previous]
+        if serial_number is not None:
+            self._serial_numbers[entry_id] = serial_number
+            self.hosts_by_serial_number[serial_number] = self.hosts[entry_id]
+
+    def _update_sums(self) -> None:
+        """Apply the contributions of the hosts that polled since the last update."""
+        updated, self._updated = self._updated, set()
+        for entry_id in updated:
+            self._apply(entry_id, self._contribution(self.hosts[entry_id]))
+        self._updates_since_exact_sums += len(updated)
+        if self._updates_since_exact_sums >= EXACT_SUM_INTERVAL:
+            self._update_exact_sums()
+
+    def _update_exact_sums(self) -> None:
+        """Recompute the sums from the contributions of all hosts."""
+        contributions = list(self._contributions.values())
+        for index, key in enumerate(AGGREGATES):
+            values = [contribution[index] for contribution in contributions]
+            self._sums[key] = sum(values) if all(type(value) is int for value in values) else math.fsum(values)  # noqa: E721
+        self._updates_since_exact_sums = 0
+
+    def _apply(self, entry_id: str, contribution: tuple) -> None:
+        previous = self._contributions.get(entry_id, _NO_CONTRIBUTION)
+        if contribution == previous:
+            return
+        sums = self._sums
+        for key, old, new in zip(AGGREGATES, previous, contribution):
+            if old != new:
+                sums[key] += new - old
+        self._contributions[entry_id] = contribution
+        self._changed = True
+
+    @staticmethod
+    def _contribution(host: SonnenBatterieHost) -> tuple:
+        """Return the values a host adds to each of the AGGREGATES."""
+        if host.breaker.is_open or not host.has_current_data:
+            return _NO_CONTRIBUTION  # Unreachable hosts are not part of the totals
+        values = host.snapshot.values
+        slot_of = host.extraction_plan.slot_of
+        capacity = _number(values[slot_of("full_charge_capacity")])
+        return (
+            1,
+            _number(values[slot_of("pac_total_w")]),
+            _number(values[slot_of("production_w")]),
+            _number(values[slot_of("consumption_w")]),
+            _number(values[slot_of("grid_feed_in_w")]),
+            capacity,
+            _number(values[slot_of("remaining_capacity_wh")]),
+            _number(values[slot_of("usoc")]) * capacity / 100,
+            _number(values[slot_of("rsoc")]) * capacity,
+            1 if values[slot_of("battery_charging")] is True else 0,
+            1 if values[slot_of("battery_discharging")] is True else 0,
+        )
+
+    @property
+    def values(self) -> dict:
+        """Aggregates across all hosts, with the capacity weighted state of charge."""
+        self._update_sums()
+        values = dict(self._sums)
+        capacity_weighted_soc = values.pop("capacity_weighted_soc")
+        values["state_of_charge"] = round(capacity_weighted_soc / values["capacity"], 1) if values["capacity"] else None
+        return values
+
+    async def publish_changes(self) -> None:
+        """Pass the aggregates to the `change_listeners` if one changed. Called by `self.scheduler`."""
+        values = self.values
+        if not self._changed:
+            return
+        self._changed = False
+        for listener in self.change_listeners:
+            listener(values)
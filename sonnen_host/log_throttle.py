@@ -0,0 +1,50 @@
+"""Rate-limited logging of repeated messages."""
+
+from __future__ import annotations
+
+import logging
+import time
+
+
+class ThrottledLogger:
+    """Log a message the first time it occurs, then at most one summary per `interval` seconds.
+
+    Messages are identical when their formatted text is identical. Repeats within the
+    interval are counted and reported in the summary, e.g. "... (repeated 42 times in 300 s)".
+    """
+
+    def __init__(self, logger: logging.Logger, interval: float) -> None:
+        self._logger = logger
+        self._interval = interval
+        self._seen: dict[str, list] = {}  # Message -> [monotonic time last logged, repeats since]
+
+    def log(self, level: int, msg: str, *args) -> None:
+        """Log `msg % args` at `level`, unless it was logged less than `interval` seconds ago."""
+        if not self._logger.isEnabledFor(level):
+            return
+        text = msg % args if args else msg
+        now = time.monotonic()
+        seen = self._seen.get(text)
+        if seen is None:
+            if len(self._seen) > 100:  # Bound the memory used by messages that are not repeated
+                self.flush()
+            self._seen[text] = [now, 0]
+            self._logger.log(level, text)
+        elif now - seen[0] >= self._interval:
+            repeats = seen[1] + 1
+            seen[0], seen[1] = now, 0
+            self._logger.log(level, "%s (repeated %d times in %g s)", text, repeats, self._interval)
+        else:
+            seen[1] += 1
+
+    def error(self, msg: str, *args) -> None:
+        """Log at ERROR level."""
+        self.log(logging.ERROR, msg, *args)
+
+    def warning(self, msg: str, *args) -> None:
+        """Log at WARNING level."""
+        self.log(logging.WARNING, msg, *args)
+
+    def flush(self) -> None:
+        """Forget all messages, e.g. after the host recovered, so they are logged again on the next occurrence."""
+        self._seen.clear()
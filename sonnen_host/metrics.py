@@ -0,0 +1,104 @@
+"""Constant-memory instrumentation of the poll pipeline."""
+
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+
+# Upper bounds of the histogram buckets in milliseconds. Durations above the last bound
+# are counted in an extra overflow bucket.
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+STAGE_FETCH = "fetch"  # Request sent until body received, per endpoint
+STAGE_DECODE = "decode"  # JSON decoding of a changed body
+STAGE_EXTRACT = "extract"  # Extraction of sensor values into the snapshot
+STAGE_PUBLISH = "publish"  # Change detection and the change listeners, e.g. entity state writes
+STAGE_POLL = "poll"  # A complete poll
+STAGES = (STAGE_FETCH, STAGE_DECODE, STAGE_EXTRACT, STAGE_PUBLISH, STAGE_POLL)
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram of durations."""
+
+    __slots__ = ("_counts", "count", "total", "max")
+
+    def __init__(self) -> None:
+        self._counts = array("Q", [0] * (len(LATENCY_BUCKETS_MS) + 1))
+        self.count = 0
+        self.total = 0.0  # Milliseconds
+        self.max = 0.0  # Milliseconds
+
+    def record(self, seconds: float) -> None:
+        """Add a duration, in seconds."""
+        ms = seconds * 1000
+        self._counts[bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, fraction: float) -> float | None:
+        """Return an upper estimate of the percentile in milliseconds, i.e. the bound of its bucket."""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        cumulative = 0
+        for bucket, count in enumerate(self._counts):
+            cumulative += count
+            if cumulative >= rank and count:
+                upper = LATENCY_BUCKETS_MS[bucket] if bucket < len(LATENCY_BUCKETS_MS) else self.max
+                return round(min(upper, self.max), 1)
+        return round(self.max, 1)
+
+    @property
+    def mean(self) -> float | None:
+        """Mean duration in milliseconds."""
+        return self.total / self.count if self.count else None
+
+    @property
+    def p50(self) -> float | None:
+        return self.percentile(0.50)
+
+    @property
+    def p95(self) -> float | None:
+        return self.percentile(0.95)
+
+    @property
+    def p99(self) -> float | None:
+        return self.percentile(0.99)
+
+    def as_dict(self) -> dict:
+        """Return the histogram as a dict, e.g. for diagnostics."""
+        buckets = {f"<={bound}ms": count for bound, count in zip(LATENCY_BUCKETS_MS, self._counts)}
+        buckets[f">{LATENCY_BUCKETS_MS[-1]}ms"] = self._counts[-1]
+        return {
+            "count": self.count,
+            "mean_ms": self.mean,
+            "p50_ms": self.p50,
+            "p95_ms": self.p95,
+            "p99_ms": self.p99,
+            "max_ms": self.max,
+            "buckets": buckets,
+        }
+
+
+class PipelineMetrics:
+    """Latency histograms per endpoint and per pipeline stage, and bytes received per endpoint."""
+
+    def __init__(self, endpoints) -> None:
+        self.latency = {endpoint: LatencyHistogram() for endpoint in endpoints}
+        self.stages = {stage: LatencyHistogram() for stage in STAGES}
+        self.bytes_received = dict.fromkeys(endpoints, 0)
+
+    @property
+    def total_bytes(self) -> int:
+        """Bytes received from all endpoints."""
+        return sum(self.bytes_received.values())
+
+    def as_dict(self) -> dict:
+        """Return all metrics as a dict, e.g. for diagnostics."""
+        return {
+            "endpoint_latency": {endpoint: histogram.as_dict() for endpoint, histogram in self.latency.items()},
+            "stages": {stage: histogram.as_dict() for stage, histogram in self.stages.items()},
+            "bytes_received": dict(self.bytes_received),
+        }
@@ -0,0 +1,170 @@
+"""Fixed-size sample buffers with incrementally maintained statistics."""
+
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left, insort
+from collections.abc import Iterator
+import math
+
+STATISTIC_MEAN = "mean"
+STATISTIC_MIN = "min"
+STATISTIC_MAX = "max"
+STATISTIC_MEDIAN = "median"
+STATISTIC_P95 = "p95"
+
+
+class RingBuffer:
+    """The last `capacity` samples of a numeric sensor, at most `max_age` seconds old.
+
+    Timestamps and values are kept in preallocated `array('d')` ring buffers, so the
+    memory used does not depend on how long the buffer runs. A sorted copy of the values
+    and a running sum are updated on every append and eviction, so min, max, mean and
+    percentiles are available without a pass over the samples.
+    """
+
+    __slots__ = ("capacity", "max_age", "_times", "_values", "_sorted", "_start", "_size", "_sum", "_updates")
+
+    def __init__(self, capacity: int, max_age: float = math.inf) -> None:
+        self.capacity = capacity
+        self.max_age = max_age
+        self._times = array("d", bytes(8 * capacity))
+        self._values = array("d", bytes(8 * capacity))
+        self._sorted = array("d")
+        self._start = 0  # Index of the oldest sample
+        self._size = 0
+        self._sum = 0.0
+        self._updates = 0  # Appends since the running sum was last recomputed
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, timestamp: float, value: float) -> None:
+        """Add a sample, evicting the oldest one if the buffer is full or samples are too old."""
+        self.evict(timestamp - self.max_age)
+        if self._size == self.capacity:
+            self._pop_oldest()
+        index = (self._start + self._size) % self.capacity
+        self._times[index] = timestamp
+        self._values[index] = value
+        self._size += 1
+        insort(self._sorted, value)
+        self._sum += value
+        self._updates += 1
+        if self._updates >= self.capacity:
+            # Limit the rounding error accumulated by the running sum
+            self._sum = math.fsum(self._sorted)
+            self._updates = 0
+
+    def evict(self, before: float) -> None:
+        """Drop the samples older than the timestamp `before`."""
+        while self._size and self._times[self._start] < before:
+            self._pop_oldest()
+
+    def clear(self) -> None:
+        """Drop all samples."""
+        self._start = 0
+        self._size = 0
+        self._sum = 0.0
+        self._updates = 0
+        del self._sorted[:]
+
+    def resize(self, capacity: int) -> None:
+        """Change the capacity, keeping the newest samples that fit."""
+        samples = list(self.samples())[-capacity:]
+        self.capacity = capacity
+        self._times = array("d", bytes(8 * capacity))
+        self._values = array("d", bytes(8 * capacity))
+        self.clear()
+        for timestamp, value in samples:
+            self.append(timestamp, value)
+
+    def _pop_oldest(self) -> None:
+        value = self._values[self._start]
+        del self._sorted[bisect_left(self._sorted, value)]
+        self._sum -= value
+        self._start = (self._start + 1) % self.capacity
+        self._size -= 1
+
+    def samples(self) -> Iterator[tuple[float, float]]:
+        """Iterate over the (timestamp, value) samples from the oldest to the newest."""
+        for offset in range(self._size):
+            index = (self._start + offset) % self.capacity
+            yield self._times[index], self._values[index]
+
+    @property
+    def mean(self) -> float | None:
+        return self._sum / self._size if self._size else None
+
+    @property
+    def min(self) -> float | None:
+        return self._sorted[0] if self._size else None
+
+    @property
+    def max(self) -> float | None:
+        return self._sorted[-1] if self._size else None
+
+    def percentile(self, fraction: float) -> float | None:
+        """Return the percentile of the values, using the nearest rank."""
+        if not self._size:
+            return None
+        return self._sorted[min(self._size - 1, max(0, math.ceil(fraction * self._size) - 1))]
+
+    def statistic(self, statistic: str) -> float | None:
+        """Return one of the STATISTIC_* statistics of the values."""
+        if statistic == STATISTIC_MEAN:
+            return self.mean
+        if statistic == STATISTIC_MIN:
+            return self.min
+        if statistic == STATISTIC_MAX:
+            return self.max
+        if statistic == STATISTIC_MEDIAN:
+            return self.percentile(0.5)
+        if statistic == STATISTIC_P95:
+            return self.percentile(0.95)
+        raise ValueError(f"Unknown statistic {statistic}")
+
+    @property
+    def stats(self) -> dict:
+        """Return the statistics of the values, e.g. for diagnostics."""
+        return {
+            "samples": self._size,
+            "mean": self.mean,
+            "min": self.min,
+            "max": self.max,
+            "median": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+        }
+
+
+class PeriodStatistic:
+    """A statistic of a sensor's samples over consecutive periods of `period` seconds.
+
+    Periods are aligned to the wall clock, e.g. to full minutes. The value is updated
+    once, when the first sample of the next period arrives, so the statistic is a
+    downsampled version of the raw sensor.
+    """
+
+    __slots__ = ("statistic", "period", "value", "_window", "_current_period")
+
+    def __init__(self, statistic: str, period: float, capacity: int) -> None:
+        self.statistic = statistic
+        self.period = period
+        self.value: float | None = None  # Statistic of the last complete period
+        self._window = RingBuffer(capacity)
+        self._current_period: int | None = None
+
+    def resize(self, capacity: int) -> None:
+        """Change the number of samples kept per period."""
+        self._window.resize(capacity)
+
+    def add(self, timestamp: float, value: float) -> bool:
+        """Add a sample. Return True if a period ended and the value was updated."""
+        current_period = int(timestamp // self.period)
+        ended = self._current_period is not None and current_period != self._current_period
+        if ended:
+            self.value = self._window.statistic(self.statistic)
+            self._window.clear()
+        self._current_period = current_period
+        self._window.append(timestamp, value)
+        return ended
@@ -0,0 +1,148 @@
+"""Scan of a local network for SonnenBatterie hosts.
+
+Every address of the network is probed on /api/ready, a small request answered by the
+battery without reading any data, with a short timeout and a bounded number of probes
+at the same time. Addresses without a battery refuse the connection or time out, so the
+scan of a /24 takes a few seconds. The serial numbers and host names of the responding
+batteries are then fetched in parallel, so they can be told apart and compared with the
+batteries already configured. The serial numbers are read from the dashboard like a
+SonnenBatterieHost reads them, over a transport sharing the session of the scan.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+import ipaddress
+import logging
+import socket
+
+import aiohttp
+
+from .const import (
+    SCAN_CONCURRENCY,
+    SCAN_IDENTIFY_TIMEOUT,
+    SCAN_MAX_ADDRESSES,
+    SCAN_PROBE_TIMEOUT,
+    SCAN_REVERSE_DNS_TIMEOUT,
+)
+from .dashboard import find_device_id_script
+from .sonnen_host import URI_DASHBOARD, URI_READY, parse_serial_number
+from .transport import SonnenTransport
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class ScannedBattery:
+    """A battery found by `scan_network`."""
+
+    url: str
+    address: str
+    hostname: str | None  # From a reverse DNS lookup of the address
+    serial_number: str | None  # None if the battery answered /api/ready but its serial number could not be read
+    serial_number_uri: str | None
+
+    @property
+    def label(self) -> str:
+        """Return a description of the battery to choose it from a list."""
+        location = f"{self.hostname} ({self.url})" if self.hostname else self.url
+        if self.serial_number is None:
+            return location
+        return f"{location}, serial number {self.serial_number}"
+
+
+def network_urls(network: str, port: int | None = None) -> list[tuple[str, str]]:
+    """Return the address and base URL of each host address of `network`, e.g. "192.168.1.0/24".
+
+    Raises ValueError if `network` is not a network or has more than SCAN_MAX_ADDRESSES addresses.
+    """
+    parsed = ipaddress.ip_network(network.strip(), strict=False)
+    if parsed.num_addresses > SCAN_MAX_ADDRESSES:
+        raise ValueError(f"{network} has more than {SCAN_MAX_ADDRESSES} addresses")
+    hosts = list(parsed.hosts()) if parsed.num_addresses > 1 else [parsed.network_address]
+    netloc = "{}" if parsed.version == 4 else "[{}]"
+    suffix = f":{port}" if port not in (None, 80) else ""
+    return [(str(address), f"http://{netloc.format(address)}{suffix}") for address in hosts]
+
+
+async def probe(url: str, api_token: str, session: aiohttp.ClientSession, timeout: float = SCAN_PROBE_TIMEOUT) -> bool:
+    """Return True if a battery at `url` answers /api/ready within `timeout` seconds."""
+    transport = SonnenTransport(url, api_token, session, connect_timeout=timeout, read_timeout=timeout, max_connections=1)
+    try:
+        async with asyncio.timeout(timeout):
+            async with transport.get(URI_READY) as response:
+                return response.status == 200 and await response.read() == b'"go"'
+    except (TimeoutError, aiohttp.ClientError, OSError):
+        return False
+
+
+async def reverse_lookup(address: str, timeout: float = SCAN_REVERSE_DNS_TIMEOUT) -> str | None:
+    """Return the host name of `address`, or None if it has none or the lookup takes longer than `timeout` seconds."""
+    try:
+        async with asyncio.timeout(timeout):
+            hostname, _ = await asyncio.get_running_loop().getnameinfo((address, 0), socket.NI_NAMEREQD)
+    except (TimeoutError, OSError):
+        return None
+    return hostname
+
+
+async def identify(transport: SonnenTransport) -> tuple[str | None, str | None]:
+    """Return the serial number and the URI of the serial number script of the battery of `transport`."""
+    try:
+        async with transport.get(URI_DASHBOARD) as response:
+            response.raise_for_status()
+            serial_number_uri = await find_device_id_script(
+                response.content.iter_chunked(4096), encoding=response.charset or "utf-8"
+            )
+        if serial_number_uri is None:
+            raise LookupError("device-id script not found")
+        async with transport.get(serial_number_uri) as response:
+            response.raise_for_status()
+            serial_number = parse_serial_number(await response.text())
+    except (TimeoutError, aiohttp.ClientError, LookupError) as e:
+        _LOGGER.debug("Failed to get the serial number of Sonnen Batterie at %s: %s", transport.url, e)
+        return None, None
+    return serial_number, serial_number_uri
+
+
+async def _identify_and_lookup(url: str, address: str, api_token: str, session: aiohttp.ClientSession) -> ScannedBattery:
+    transport = SonnenTransport(
+        url, api_token, session, connect_timeout=SCAN_IDENTIFY_TIMEOUT, read_timeout=SCAN_IDENTIFY_TIMEOUT, max_connections=1
+    )
+    (serial_number, serial_number_uri), hostname = await asyncio.gather(identify(transport), reverse_lookup(address))
+    return ScannedBattery(url, address, hostname, serial_number, serial_number_uri)
+
+
+async def scan_network(
+    network: str,
+    api_token: str,
+    session: aiohttp.ClientSession | None = None,
+    port: int | None = None,
+    concurrency: int = SCAN_CONCURRENCY,
+    timeout: float = SCAN_PROBE_TIMEOUT,
+) -> list[ScannedBattery]:
+    """Return the batteries answering on `port` at the addresses of `network`, in address order.
+
+    At most `concurrency` addresses are probed at the same time, each for at most
+    `timeout` seconds. If no session is given, a session is created for the scan.
+    Raises ValueError if `network` cannot be scanned, see `network_urls`.
+    """
+    urls = network_urls(network, port)
+    owns_session = session is None
+    if owns_session:
+        session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded_probe(url: str) -> bool:
+        async with semaphore:
+            return await probe(url, api_token, session, timeout)
+
+    try:
+        responding = await asyncio.gather(*(bounded_probe(url) for _, url in urls))
+        found = [(address, url) for (address, url), ready in zip(urls, responding) if ready]
+        _LOGGER.debug("Scanned %d addresses of %s, %d Sonnen Batteries responded", len(urls), network, len(found))
+        return list(await asyncio.gather(*(_identify_and_lookup(url, address, api_token, session) for address, url in found)))
+    finally:
+        if owns_session:
+            await session.close()
@@ -0,0 +1,156 @@
+"""Poll scheduler for a SonnenBatterie host."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable
+import logging
+import random
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class PollScheduler:
+    """Call a poll coroutine at a fixed interval, never running two polls at once.
+
+    Ticks that occur while the previous poll is still running are dropped and counted
+    in `skipped_ticks`, instead of being queued behind it. The first tick is offset by a
+    random phase within one interval, so several hosts polled at the same interval do
+    not send their requests at the same time. For each tick the drift, i.e. how late the
+    tick fired compared to its schedule, is recorded. When the interval is shortened, e.g.
+    by adaptive polling, the next tick is rescheduled one new interval after the last.
+    """
+
+    def __init__(
+        self,
+        poll: Callable[[], Awaitable[None]],
+        interval: float,
+        name: str = "",
+        jitter: bool = True,
+    ) -> None:
+        self._poll = poll
+        self._interval = interval
+        self.name = name
+        self._jitter = jitter
+
+        self._runner: asyncio.Task | None = None
+        self._poll_task: asyncio.Task | None = None
+        self._interval_shortened = asyncio.Event()  # Wakes the runner to reschedule the next tick
+
+        self.ticks = 0  # Number of ticks that started a poll
+        self.skipped_ticks = 0  # Number of ticks dropped as a poll was still running
+        self.last_drift = 0.0  # Seconds the last tick fired after its scheduled time
+        self.max_drift = 0.0
+        self._total_drift = 0.0
+        self._drift_samples = 0
+
+    @property
+    def interval(self) -> float:
+        """Seconds between ticks. May be changed while running."""
+        return self._interval
+
+    @interval.setter
+    def interval(self, interval: float) -> None:
+        shortened = interval < self._interval
+        self._interval = interval
+        if shortened:
+            self._interval_shortened.set()
+
+    @property
+    def running(self) -> bool:
+        """Return True if the scheduler is started."""
+        return self._runner is not None and not self._runner.done()
+
+    @property
+    def polling(self) -> bool:
+        """Return True while a poll is in progress."""
+        return self._poll_task is not None and not self._poll_task.done()
+
+    @property
+    def mean_drift(self) -> float:
+        """Return the mean drift of all fired ticks in seconds."""
+        return self._total_drift / self._drift_samples if self._drift_samples else 0.0
+
+    def start(self) -> None:
+        """Start scheduling polls."""
+        if self.running:
+            return
+        phase = random.uniform(0, self.interval) if self._jitter else 0.0
+        self._runner = asyncio.get_running_loop().create_task(self._run(phase), name=f"sonnen_poll_scheduler_{self.name}")
+
+    async def stop(self) -> None:
+        """Stop scheduling polls and cancel a poll in progress."""
+        for task in (self._runner, self._poll_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._runner = None
+        self._poll_task = None
+
+    async def _run(self, phase: float) -> None:
+        loop = asyncio.get_running_loop()
+        scheduled = loop.time() + phase
+        last_tick: float | None = None
+        self._interval_shortened.clear()
+        while True:
+            delay = scheduled - loop.time()
+            if delay > 0:
+                try:
+                    async with asyncio.timeout(delay):
+                        await self._interval_shortened.wait()
+                except TimeoutError:
+                    pass
+                else:
+                    # Tick one new interval after the last tick, at once if that has passed
+                    self._interval_shortened.clear()
+                    if last_tick is not None:
+                        scheduled = max(loop.time(), min(scheduled, last_tick + self.interval))
+                    continue
+            now = loop.time()
+            last_tick = now
+            self._interval_shortened.clear()
+            self._record_drift(now - scheduled)
+
+            if self.polling:
+                self.skipped_ticks += 1
+                _LOGGER.debug("Poll of %s still running, skipping tick", self.name)
+            else:
+                self.ticks += 1
+                self._poll_task = loop.create_task(self._run_poll())
+
+            # Schedule the next tick. Ticks that were missed entirely, e.g. because the
+            # event loop was blocked, are dropped and counted as skipped.
+            scheduled += self.interval
+            if scheduled <= now:
+                missed = int((now - scheduled) // self.interval) + 1
+                self.skipped_ticks += missed
+                scheduled += missed * self.interval
+
+    async def _run_poll(self) -> None:
+        try:
+            await self._poll()
+        except asyncio.CancelledError:
+            raise
+        except Exception:  # noqa: BLE001  A failing poll must not stop the scheduler
+            _LOGGER.exception("Unexpected error polling %s", self.name)
+
+    def _record_drift(self, drift: float) -> None:
+        self.last_drift = drift
+        self.max_drift = max(self.max_drift, drift)
+        self._total_drift += drift
+        self._drift_samples += 1
+
+    @property
+    def stats(self) -> dict:
+        """Return the scheduler counters."""
+        return {
+            "interval": self.interval,
+            "ticks": self.ticks,
+            "skipped_ticks": self.skipped_ticks,
+            "last_drift": self.last_drift,
+            "mean_drift": self.mean_drift,
+            "max_drift": self.max_drift,
+        }
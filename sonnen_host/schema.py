@@ -0,0 +1,113 @@
+"""Discovery of sensors from the fields of the SonnenBatterie API payloads.
+
+Fields not read by a sensor in SENSORS_LIST become discovered sensors, defined like
+the rows of SENSORS_LIST. The data type is inferred from the value, the unit from the
+key's suffix, and both are replaced by the curated definition in DISCOVERY_OVERRIDES
+where there is one. A dict of booleans becomes one flag group sensor.
+
+The structure of the payloads, i.e. their keys and how they are nested, changes with
+the firmware, not from poll to poll. It is summarized by `schema_fingerprint`, so
+discovered sensors can be cached by fingerprint and discovery only runs again when
+the firmware changes the payloads. The fingerprint leaves out the kinds of the values,
+as a nullable field alternates between null and a value, so the inferred data types
+must not depend on a single sample either: numbers are floats, whether a sample is an
+integer or not, and a null sample is typed by the key's unit suffix.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+
+from .const import DATA_TYPE_FLAG_GROUP, DISCOVERY_OVERRIDES, DISCOVERY_UNIT_SUFFIXES
+
+_WORD_BOUNDARY = re.compile(r"(?<=[a-z0-9])(?=[A-Z])|[_\s]+")
+_NAME_INVALID = re.compile(r"[^a-z0-9]+")
+
+
+def _kind(value) -> str:
+    """Return the kind of a value, as part of the structure. Only containers are told apart from other values."""
+    if isinstance(value, dict):
+        return "object"
+    if isinstance(value, list):
+        return "list"
+    return "value"
+
+
+def _structure(data: dict, prefix: str, lines: list[str]) -> None:
+    for key in sorted(data):
+        value = data[key]
+        path = f"{prefix}.{key}"
+        lines.append(f"{path}:{_kind(value)}")
+        if isinstance(value, dict):
+            _structure(value, path, lines)
+
+
+def schema_fingerprint(endpoint_data: dict[str, dict]) -> str:
+    """Return a fingerprint of the structure of the payloads, by endpoint."""
+    lines: list[str] = []
+    for endpoint in sorted(endpoint_data):
+        _structure(endpoint_data[endpoint], endpoint, lines)
+    return hashlib.blake2b("\n".join(lines).encode(), digest_size=16).hexdigest()
+
+
+def _friendly_name(key: str) -> str:
+    return " ".join(word[:1].upper() + word[1:] for word in _WORD_BOUNDARY.split(key) if word)
+
+
+def _sensor_config(path: str, key: str, value) -> list | None:
+    """Return the inferred sensor definition of a field, or None if it cannot be a sensor."""
+    name = _NAME_INVALID.sub("_", path.lower()).strip("_")
+    if path in DISCOVERY_OVERRIDES:
+        override = DISCOVERY_OVERRIDES[path]
+        return None if override is None else [name, override[0], path, *override[1:]]
+    if isinstance(value, dict):
+        data_type, icon = DATA_TYPE_FLAG_GROUP, "mdi:information"
+    elif value is True or value is False:
+        data_type, icon = "bool", "mdi:toggle-switch-outline"
+    elif isinstance(value, (int, float)):
+        data_type, icon = "float", "mdi:numeric"  # A field sampled as an integer may be a float in the next poll
+    elif isinstance(value, str) or value is None:
+        data_type, icon = "str", "mdi:information"
+    else:
+        return None  # Lists
+    uom = next((unit for suffix, unit in DISCOVERY_UNIT_SUFFIXES.items() if key.endswith(suffix)), None)
+    if uom is not None:
+        icon = "mdi:flash"
+        if value is None:
+            data_type = "float"  # A measurement, not yet reported
+    return [name, _friendly_name(key), path, data_type, uom, icon, None]
+
+
+def _discover(data: dict, prefix: str, known_paths: set[str], sensors: list) -> None:
+    for key, value in data.items():
+        path = f"{prefix}.{key}"
+        if "." in key:
+            continue  # Data paths are split at dots
+        if isinstance(value, dict):
+            if path in known_paths:
+                # A known flag group. Only its non-boolean values can be further sensors.
+                value = {child: child_value for child, child_value in value.items() if child_value is not True and child_value is not False}
+            elif value and all(child_value is True or child_value is False for child_value in value.values()):
+                sensor_config = _sensor_config(path, key, value)  # A group of flags is one sensor
+                if sensor_config is not None:
+                    sensors.append(sensor_config)
+                continue
+            _discover(value, path, known_paths, sensors)
+        elif path not in known_paths:
+            sensor_config = _sensor_config(path, key, value)
+            if sensor_config is not None:
+                sensors.append(sensor_config)
+
+
+def discover_sensors(endpoint_data: dict[str, dict], known_paths: set[str]) -> list[list]:
+    """Return definitions of sensors for the fields of the payloads not in `known_paths`.
+
+    The definitions have the columns of SENSORS_LIST and are sorted by data path. Names
+    are derived from the data path, so they are stable across discoveries.
+    """
+    sensors: list[list] = []
+    for endpoint, data in endpoint_data.items():
+        if isinstance(data, dict):
+            _discover(data, endpoint, known_paths, sensors)
+    return sorted(sensors, key=lambda sensor_config: sensor_config[2])
@@ -1,15 +1,62 @@
 """Asynchronous Python client for the SonnenBatterie API."""
 
 import asyncio
+import hashlib
+import json
 import logging
-from typing import List
+import math
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, List
 
 import aiohttp
-from bs4 import BeautifulSoup
 
-from homeassistant.helpers.entity import DeviceInfo, Entity
-
-from ..const import DOMAIN
+from .const import (
+    ADAPTIVE_POLL_ABSOLUTE_THRESHOLD,
+    ADAPTIVE_POLL_BACKOFF,
+    ADAPTIVE_POLL_NUMERIC_SENSORS,
+    ADAPTIVE_POLL_RELATIVE_THRESHOLD,
+    ADAPTIVE_POLL_STATE_SENSORS,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_INITIAL_BACKOFF,
+    BREAKER_MAX_BACKOFF,
+    COMMAND_CONFIRM_ATTEMPTS,
+    COMMAND_CONFIRM_DELAY,
+    COMMAND_MIN_INTERVAL,
+    DEADBAND_MAX_AGE,
+    DERIVED_SENSORS_LIST,
+    ENERGY_GAP_MARGIN,
+    ENERGY_MAX_GAP,
+    ENERGY_SENSORS_LIST,
+    ENDPOINT_DEADLINES,
+    ENDPOINT_LATESTDATA,
+    ENDPOINT_POLL_INTERVALS,
+    ENDPOINT_STATUS,
+    LATESTDATA_REFRESH_TRIGGERS,
+    LOG_SUMMARY_INTERVAL,
+    POLL_FREQUENCY,
+    POLL_TIME_BUDGET,
+    SAMPLE_HISTORY_DURATION,
+    SAMPLE_HISTORY_SENSORS,
+    SENSOR_DEADBANDS,
+    SENSORS_LIST,
+    STATISTICS_SENSORS_LIST,
+)
+from .adaptive import AdaptiveInterval
+from .breaker import CircuitBreaker
+from .capture import CaptureReader, CaptureWriter, ReplayTransport
+from .change_filter import ChangeFilter, Deadband
+from .commands import Command, CommandQueue
+from .derived import DerivedMetrics, input_paths
+from .endpoint_state import EndpointState
+from .energy import EnergyCounter
+from .extraction import ExtractionPlan, SensorSnapshot
+from .log_throttle import ThrottledLogger
+from .metrics import STAGE_DECODE, STAGE_EXTRACT, STAGE_FETCH, STAGE_POLL, STAGE_PUBLISH, PipelineMetrics
+from .ring_buffer import PeriodStatistic, RingBuffer
+from .scheduler import PollScheduler
+from .schema import discover_sensors, schema_fingerprint
+from .transport import SonnenTransport
 
 URI_STATUS = "/api/status"
 URI_DATA = "/api/v2/latestdata"
@@ -17,8 +64,63 @@ URI_READY = "/api/ready"
 
 URI_DASHBOARD = "/dash/dashboard"
 
+URI_CONFIGURATIONS = "/api/v2/configurations"
+URI_SETPOINT = "/api/v2/setpoint/{direction}/{power}"  # Direction is "charge" or "discharge"
+CONFIGURATION_OPERATING_MODE = "EM_OperatingMode"
+
+ENDPOINT_URIS = {
+    ENDPOINT_STATUS: URI_STATUS,
+    ENDPOINT_LATESTDATA: URI_DATA,
+}
+
 _LOGGER = logging.getLogger(__name__)
 
+try:
+    import orjson  # Faster JSON decoder, shipped with Home Assistant
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+
+def parse_serial_number(script: str) -> str:
+    """Return the serial number assigned to SPREE_ID in the device-id script. Raises IndexError if there is none."""
+    return script.split('SPREE_ID = ')[1].split(';')[0].strip("'")
+
+
+@dataclass
+class StateChanges:
+    """Values changed since the previous publish, passed to the `change_listeners` of a host."""
+
+    slots: list[int]  # Snapshot slots with changed values, or all slots when everything is republished
+    derived: set[str]  # Names of the changed derived metrics
+    statistics: set[str]  # Names of the changed statistics
+
+
+def _fingerprint(body: bytes) -> bytes:
+    """Return a cheap fingerprint of a response body, used to detect unchanged payloads."""
+    return hashlib.blake2b(body, digest_size=16).digest()
+
+_extraction_plans: dict[str | None, ExtractionPlan] = {}  # Schema fingerprint -> plan
+
+
+def get_extraction_plan(fingerprint: str | None = None, discovered_sensors: list = ()) -> ExtractionPlan:
+    """Return the extraction plan for SENSORS_LIST and the sensors discovered for a payload structure.
+
+    A plan is compiled once per schema fingerprint (see schema.py) and shared by all
+    hosts. Inputs of derived metrics that are not read by a sensor are added as sensors
+    named by their path. Discovered sensors come last, so all other sensors have the
+    same slots in every plan.
+    """
+    plan = _extraction_plans.get(fingerprint)
+    if plan is None:
+        sensor_paths = {sensor_config[2] for sensor_config in SENSORS_LIST}
+        inputs = [
+            [path, None, path, "float", None, None, None]
+            for path in sorted(input_paths(DERIVED_SENSORS_LIST) - sensor_paths)
+        ]
+        plan = _extraction_plans[fingerprint] = ExtractionPlan(SENSORS_LIST + inputs + list(discovered_sensors))
+    return plan
+
 
 class SonnenBatterieHost:
     """Asynchronous Python client for the SonnenBatterie API."""
@@ -29,38 +131,113 @@ class SonnenBatterieHost:
         api_token: str,
         name: str,
         entry_id: str,
-        aiohttp_session: aiohttp.ClientSession
+        transport: SonnenTransport
     ) -> None:
         """WARNING: Do not call this method directly. Use the create method instead."""
         self.url = url
         self.api_token = api_token
         self.name = name
         self.entry_id = entry_id
-        self.aiohttp_session = aiohttp_session
+        self.transport = transport
+        # Clocks for the data, i.e. endpoint intervals, deadbands, snapshots and samples. A replay of a
+        # capture replaces both with its clock, see `create_replay`.
+        self.clock: Callable[[], float] = time.monotonic
+        self.wall_clock: Callable[[], float] = time.time
+        self.capture: CaptureWriter | None = None  # Set by `start_capture`
 
-        self.data_status = None
-        self.data_latestdata = None
-        self._data_dashboard_html = None
+        self._endpoint_data: dict[str, dict | None] = dict.fromkeys(ENDPOINT_URIS)  # Decoded payload per endpoint
+        self._endpoint_fingerprints: dict[str, bytes] = {}  # Fingerprint of the last decoded body per endpoint
+        # Read the wall clock through the host, as a replay replaces it after the host is created
+        self.endpoint_states = {endpoint: EndpointState(lambda: self.wall_clock()) for endpoint in ENDPOINT_URIS}
+        self._unextracted_endpoints: set[str] = set()  # Endpoints with changed data, not yet extracted into the snapshot
+        self.changed_endpoints: set[str] = set()  # Endpoints with changed values, not yet published
+        # Slot -> command writing it and the written value, applied over each extraction until the write
+        # is confirmed or reverted, see `_publish_optimistic`
+        self._optimistic: dict[int, tuple[Command, Any]] = {}
+        self.decode_stats = {endpoint: {"cache_hits": 0, "decodes": 0} for endpoint in ENDPOINT_URIS}
+        self.metrics = PipelineMetrics(ENDPOINT_URIS)  # Latency histograms and bytes received, see diagnostics.py
+        self._publish_all = True  # Check all values on the next call of `publish_changes`
         self._serial_number_uri = None
         self.serial_number = None
 
-        self.entities:List[Entity] = []  # List of entities that are associated with this host
+        self.extraction_plan = get_extraction_plan()
+        self.discovered_sensors: list[list] = []  # Set by use_discovered_sensors
+        self.snapshot: SensorSnapshot = self.extraction_plan.empty_snapshot
+        self.change_filter = self._create_change_filter()
 
-        self._device_info = DeviceInfo(
-            identifiers = {(DOMAIN, self.serial_number)},
-            name = "Sonnen Batterie",
-            manufacturer = "Sonnen GmbH",
-            model="Unknown",  # TODO: Get the model from the host
-            serial_number=self.serial_number,
-            # sw_version = "Unknown",  # TODO: Get the software version from the host
-            # entity_picture="/local/custom_components/sonnen_batterie/icon.png"  # Path to your custom PNG icon
+        # Recent samples of numeric sensors at full resolution, and downsampled statistics of them.
+        # The buffers hold a sample per poll over their duration, at the shortest poll interval,
+        # see `size_sample_buffers`. Their time window is enforced by the sample timestamps.
+        plan = self.extraction_plan
+        self.sample_history = {
+            plan.slot_of(name): RingBuffer(
+                capacity=math.ceil(SAMPLE_HISTORY_DURATION / POLL_FREQUENCY), max_age=SAMPLE_HISTORY_DURATION
+            )
+            for name in SAMPLE_HISTORY_SENSORS
+        }
+        self.statistics = {
+            sensor_config[0]: PeriodStatistic(
+                statistic=sensor_config[7],
+                period=sensor_config[8],
+                capacity=math.ceil(sensor_config[8] / POLL_FREQUENCY) + 1,
+            )
+            for sensor_config in STATISTICS_SENSORS_LIST
+        }
+        self._statistics_by_slot: dict[int, list[tuple[str, PeriodStatistic]]] = {}
+        for sensor_config in STATISTICS_SENSORS_LIST:
+            self._statistics_by_slot.setdefault(plan.slot_of(sensor_config[2]), []).append(
+                (sensor_config[0], self.statistics[sensor_config[0]])
+            )
+        self._changed_statistics: set[str] = set()  # Statistics updated, not yet published
+
+        self.derived = DerivedMetrics(DERIVED_SENSORS_LIST, plan)
+        self._changed_derived: set[str] = set()  # Derived metrics updated, not yet published
+
+        # Energy integrated from power sensors, one counter per power sensor for both directions
+        self.energy_counters = {
+            plan.slot_of(sensor_config[2]): EnergyCounter(max_dt=ENERGY_MAX_GAP)
+            for sensor_config in ENERGY_SENSORS_LIST
+        }
+
+        self.scheduler = PollScheduler(self.poll, interval=POLL_FREQUENCY, name=url)
+        self.adaptive_interval: AdaptiveInterval | None = None  # Set by configure_adaptive_polling
+        self.breaker = CircuitBreaker(
+            failure_threshold=BREAKER_FAILURE_THRESHOLD,
+            initial_backoff=BREAKER_INITIAL_BACKOFF,
+            max_backoff=BREAKER_MAX_BACKOFF,
+        )
+        self._log = ThrottledLogger(_LOGGER, LOG_SUMMARY_INTERVAL)  # For errors repeated on every poll
+        self.commands = CommandQueue(
+            min_interval=COMMAND_MIN_INTERVAL,
+            confirm_attempts=COMMAND_CONFIRM_ATTEMPTS,
+            confirm_delay=COMMAND_CONFIRM_DELAY,
+            name=url,
+        )
+
+        # Endpoints polled for current data and the time on `clock` they were last fetched successfully
+        self._endpoint_fetchers = {
+            endpoint: lambda endpoint=endpoint: self._get_endpoint_from_host(endpoint)
+            for endpoint in ENDPOINT_URIS
+        }
+        self._endpoint_last_fetch = dict.fromkeys(self._endpoint_fetchers, float("-inf"))
+
+        # Slots read by the consumers of the values, e.g. the enabled entities of the integration.
+        # All endpoints are fetched while it is not set, see `required_endpoints`.
+        self.required_slots: Callable[[], set[int]] | None = None
+        self.change_listeners:List[Callable[[StateChanges], None]] = []  # Called on each publish, see `publish_changes`
+        self.poll_listeners:List[Callable[['SonnenBatterieHost'], None]] = []  # Called after each poll, e.g. by the fleet
+
+
+    def _create_change_filter(self) -> ChangeFilter:
+        return ChangeFilter(
+            size=len(self.extraction_plan.paths),
+            deadbands={
+                self.extraction_plan.slot_of(name): Deadband(**deadband)
+                for name, deadband in SENSOR_DEADBANDS.items()
+                if name in self.extraction_plan.slots
+            },
+            max_age=DEADBAND_MAX_AGE,
         )
-        # {
-        #     "identifiers": {(DOMAIN, self.serial_number)},
-        #     "name": "Sonnen Batterie",
-        #     "manufacturer": "Sonnen GmbH",
-        #     "model": "Unknown",  # TODO: Get the model from the host
-        # }
 
     @classmethod
     async def create(
@@ -69,71 +246,157 @@ class SonnenBatterieHost:
         api_token: str,
         name: str = None,  # Name as given in Config Entry
         entry_id: str = None,
-        aiohttp_session: aiohttp.ClientSession = None
+        aiohttp_session: aiohttp.ClientSession = None,  # Shared session, e.g. Home Assistant's
+        **transport_options  # Timeouts and connection limit, see SonnenTransport
     ) -> 'SonnenBatterieHost':
-        """Create a new SonnenBatterie object."""
-        if aiohttp_session is None:
-            _LOGGER.debug("Creating new aiohttp session for SonnenBatterie host %s", url)
-            aiohttp_session = aiohttp.ClientSession()
-        return cls(url=url, api_token=api_token, name=name, entry_id=entry_id, aiohttp_session=aiohttp_session)
+        """Create a new SonnenBatterie object.
+
+        If no session is given, a session owned by the host is created and closed by `close_session`.
+        """
+        transport = SonnenTransport.create(url=url, api_token=api_token, session=aiohttp_session, **transport_options)
+        return cls(url=url, api_token=api_token, name=name, entry_id=entry_id, transport=transport)
+
+    @classmethod
+    async def create_replay(cls, path: str, speed: float | None = 1.0) -> 'SonnenBatterieHost':
+        """Create a host polling a capture written by `start_capture` instead of a battery.
+
+        The capture is replayed `speed` times as fast as it was captured, or as fast as the
+        host is polled with `speed` None, see ReplayTransport.
+        """
+        reader = await asyncio.get_running_loop().run_in_executor(None, CaptureReader, path)
+        transport = ReplayTransport(reader, speed)
+        host = cls(url=transport.url, api_token="", name=reader.metadata.get("name"), entry_id=None, transport=transport)
+        host.clock = host.wall_clock = transport.clock
+        if reader.metadata.get("serial_number") is not None:
+            host.restore_static_data(reader.metadata["serial_number"])
+        return host
 
     async def is_connected(self) -> bool:
         """Check if the SonnenBatterie is connected."""
+        timestamp = self.wall_clock()
         try:
-            async with self.aiohttp_session.get(f"{self.url}{URI_READY}", headers={'Auth-Token': self.api_token}) as response:
-                return response.status == 200 and await response.text() == '"go"'
-        except (TimeoutError, aiohttp.ClientResponseError) as e:
-            _LOGGER.error("Failed to get data from Sonnen Batterie at %s: %s", self.url + URI_READY,  e)
+            async with self.transport.get(URI_READY) as response:
+                body = await response.read()
+                if self.capture is not None:
+                    self.capture.record(timestamp, URI_READY, response.status, body)
+                return response.status == 200 and body == b'"go"'
+        except (TimeoutError, aiohttp.ClientError) as e:
+            if self.capture is not None:
+                self.capture.record_error(timestamp, URI_READY, e)
+            self._log.error("Failed to get data from Sonnen Batterie at %s: %s", self.url + URI_READY,  e)
             return False
 
-    async def _get_status_from_host(self) -> None:
-        try:
-            async with self.aiohttp_session.get(f"{self.url}{URI_STATUS}", headers={'Auth-Token': self.api_token}) as response:
-                self.data_status = await response.json()
-        except (TimeoutError, aiohttp.ClientResponseError) as e:
-            _LOGGER.error("Failed to get data from Sonnen Batterie at %s: %s", self.url + URI_STATUS,  e)
-            self.data_status = None
+    async def _get_endpoint_from_host(self, endpoint: str) -> None:
+        """Get the JSON data of an endpoint from the host.
 
-    async def _get_latestdata_from_host(self) -> None:
+        The raw body is fingerprinted. If it is identical to the previous body, decoding
+        is skipped and the endpoint is not marked as changed. If the request fails, the
+        previous data is kept and marked as stale.
+        """
+        uri = ENDPOINT_URIS[endpoint]
+        timestamp = self.wall_clock()
+        start = time.perf_counter()
         try:
-            async with self.aiohttp_session.get(f"{self.url}{URI_DATA}", headers={'Auth-Token': self.api_token}) as response:
-                self.data_latestdata = await response.json()
-        except (TimeoutError, aiohttp.ClientResponseError) as e:
-            _LOGGER.error("Failed to get data from Sonnen Batterie at %s: %s", self.url + URI_DATA,  e)
-            self.data_latestdata = None
+            async with self.transport.get(uri) as response:
+                response.raise_for_status()
+                body = await response.read()
+        except (TimeoutError, aiohttp.ClientError) as e:
+            if self.capture is not None:
+                self.capture.record_error(timestamp, uri, e)
+            self._log.error("Failed to get data from Sonnen Batterie at %s: %s", self.url + uri,  e)
+            self._set_endpoint_stale(endpoint, timeout=isinstance(e, TimeoutError))
+            return
+        fetched = time.perf_counter()
+        self.metrics.latency[endpoint].record(fetched - start)
+        self.metrics.stages[STAGE_FETCH].record(fetched - start)
+        self.metrics.bytes_received[endpoint] += len(body)
+        if self.capture is not None:
+            self.capture.record(timestamp, uri, response.status, body)
 
-    async def _get_dashboard_html_from_host(self) -> None:
-        """Get the dashboard from the host. Response is HTML."""
+        fingerprint = _fingerprint(body)
+        if fingerprint == self._endpoint_fingerprints.get(endpoint):
+            self.decode_stats[endpoint]["cache_hits"] += 1
+            self._set_endpoint_fresh(endpoint)
+            return
         try:
-            async with self.aiohttp_session.get(f"{self.url}{URI_DASHBOARD}", headers={'Auth-Token': self.api_token}) as response:
-                self._data_dashboard_html = await response.text()
-        except (TimeoutError, aiohttp.ClientResponseError) as e:
-            _LOGGER.error("Failed to get data from Sonnen Batterie at %s: %s", self.url + URI_DASHBOARD,  e)
-            self._data_dashboard_html = None
+            data = _json_loads(body)
+        except ValueError as e:
+            self._log.error("Invalid JSON from Sonnen Batterie at %s: %s", self.url + uri,  e)
+            self._set_endpoint_stale(endpoint)
+            return
+        self.metrics.stages[STAGE_DECODE].record(time.perf_counter() - fetched)
+        self.decode_stats[endpoint]["decodes"] += 1
+        self._endpoint_data[endpoint] = data
+        self._endpoint_fingerprints[endpoint] = fingerprint
+        self._unextracted_endpoints.add(endpoint)
+        self._set_endpoint_fresh(endpoint)
 
-    def _parse_dashboard_html(self) -> None:
-        """Parse the dashboard HTML and return the data."""
-        # Parse the HTML content
-        soup = BeautifulSoup(self._data_dashboard_html, 'html.parser')
+    def _set_endpoint_fresh(self, endpoint: str) -> None:
+        if self.endpoint_states[endpoint].succeeded():
+            self._republish_endpoint(endpoint)
 
-        # Find all script tags in the body
-        script_tags = soup.body.find_all('script')
+    def _set_endpoint_stale(self, endpoint: str, timeout: bool = False) -> None:
+        if self.endpoint_states[endpoint].failed(timeout=timeout):
+            self._republish_endpoint(endpoint)
 
-        # Extract the src attribute from each script tag
-        script_srcs = [script.get('src') for script in script_tags if script.get('src')]
+    def republish_all(self) -> None:
+        """Publish all values on the next call of `publish_changes`, e.g. to newly added entities."""
+        self.change_filter.invalidate()
+        self._publish_all = True
+
+    def _republish_endpoint(self, endpoint: str) -> None:
+        """Publish the states of the endpoint's entities, e.g. to update their stale attribute."""
+        for slot in self.extraction_plan.endpoint_slots.get(endpoint, ()):
+            self.change_filter.invalidate(slot)
+        self.changed_endpoints.add(endpoint)
+
+    async def _get_status_from_host(self) -> None:
+        await self._get_endpoint_from_host(ENDPOINT_STATUS)
 
-        for src in script_srcs:
-            if 'device-id' in src:
-                self._serial_number_uri = src
-                break
+    async def _get_latestdata_from_host(self) -> None:
+        await self._get_endpoint_from_host(ENDPOINT_LATESTDATA)
+
+    @property
+    def has_current_data(self) -> bool:
+        """Return True if data was received from at least one endpoint."""
+        return any(state.last_success is not None for state in self.endpoint_states.values())
+
+    @property
+    def data_status(self) -> dict | None:
+        """Data from /api/status."""
+        return self._endpoint_data[ENDPOINT_STATUS]
+
+    @property
+    def data_latestdata(self) -> dict | None:
+        """Data from /api/v2/latestdata."""
+        return self._endpoint_data[ENDPOINT_LATESTDATA]
+
+    async def _get_serial_number_uri_from_host(self) -> None:
+        """Find the URI of the script holding the serial number in the dashboard HTML.
+
+        The dashboard is scanned while it is streamed and reading stops at the script tag.
+        """
+        from .dashboard import find_device_id_script  # Only needed when the serial number is not cached
+
+        try:
+            async with self.transport.get(URI_DASHBOARD) as response:
+                self._serial_number_uri = await find_device_id_script(
+                    response.content.iter_chunked(4096), encoding=response.charset or "utf-8"
+                )
+        except (TimeoutError, aiohttp.ClientResponseError) as e:
+            _LOGGER.error("Failed to get data from Sonnen Batterie at %s: %s", self.url + URI_DASHBOARD,  e)
+            raise  # Raise the exception to the caller. Cannot continue without the serial number!
+        if self._serial_number_uri is None:
+            _LOGGER.error("Failed to find the device-id script in the dashboard of Sonnen Batterie at %s", self.url + URI_DASHBOARD)
+            raise LookupError("device-id script not found")  # Cannot continue without the serial number!
 
     async def _get_serial_number_from_host(self) -> None:
         # Get the device ID from API URL
         try:
-            async with self.aiohttp_session.get(f"{self.url}{self._serial_number_uri}", headers={'Auth-Token': self.api_token}) as response:
+            async with self.transport.get(self._serial_number_uri) as response:
                 serial_data = await response.text()
             try:
-                self.serial_number = serial_data.split('SPREE_ID = ')[1].split(';')[0].strip("'")
+                self.serial_number = parse_serial_number(serial_data)
             except IndexError:
                 _LOGGER.error("Failed to get serial number from Sonnen Batterie at %s: %s", self.url + self._serial_number_uri,  serial_data)
                 raise # Raise the exception to the caller. Cannot continue without the serial number!
@@ -141,19 +404,138 @@ class SonnenBatterieHost:
             _LOGGER.error("Failed to get data from Sonnen Batterie at %s: %s", self.url + self._serial_number_uri,  e)
             raise  # Raise the exception to the caller. Cannot continue without the serial number!
 
-    async def _get_current_data_from_host(self) -> None:
-        """Get the latest data from the Sonnen Batterie."""
-        # Get data from the host in parallel
-        await asyncio.gather(
-            self._get_status_from_host(),
-            self._get_latestdata_from_host(),
+    @property
+    def required_endpoints(self) -> set[str]:
+        """Endpoints of the `required_slots`, or all endpoints if they are not set."""
+        if self.required_slots is None:
+            return set(self._endpoint_fetchers)
+        endpoints = self.extraction_plan.endpoints
+        return {endpoints[slot] for slot in self.required_slots()} & self._endpoint_fetchers.keys()
+
+    def _due_endpoints(self, now: float) -> list[str]:
+        """Return the required endpoints whose poll interval has elapsed."""
+        # Allow half a poll of slack, so an endpoint is not pushed to the next poll by jitter
+        slack = self.scheduler.interval / 2
+        return [
+            endpoint
+            for endpoint in self.required_endpoints
+            if now - self._endpoint_last_fetch[endpoint] >= ENDPOINT_POLL_INTERVALS[endpoint] - slack
+        ]
+
+    async def _fetch_endpoint(self, endpoint: str, deadline: float, now: float) -> None:
+        """Get the data of an endpoint, giving up at the monotonic time `deadline`.
+
+        The endpoint's interval restarts at `now` if the fetch succeeded. A failed fetch
+        is retried on the next poll, unless the circuit breaker stops polling.
+        """
+        timeout = min(ENDPOINT_DEADLINES[endpoint], deadline - time.monotonic())
+        try:
+            await asyncio.wait_for(self._endpoint_fetchers[endpoint](), timeout=max(0.0, timeout))
+        except TimeoutError:
+            self._log.warning("Sonnen Batterie at %s did not respond to %s within %.1f s, keeping previous data", self.url, ENDPOINT_URIS[endpoint], timeout)
+            self._set_endpoint_stale(endpoint, timeout=True)
+        if not self.endpoint_states[endpoint].stale:
+            self._endpoint_last_fetch[endpoint] = now
+
+    async def _fetch_endpoints(self, endpoints: list[str], deadline: float, publish: bool = False) -> bool:
+        """Get the data of the given endpoints from the host in parallel.
+
+        Each endpoint is extracted into the snapshot, and published if `publish` is True,
+        as soon as it arrives, so a slow endpoint does not hold back the others.
+        Return False if all endpoints failed.
+        """
+        now = self.clock()
+        for fetch in asyncio.as_completed([self._fetch_endpoint(endpoint, deadline, now) for endpoint in endpoints]):
+            await fetch
+            self._refresh_snapshot()
+            if publish:
+                await self.publish_changes()
+        return not endpoints or not all(self.endpoint_states[endpoint].stale for endpoint in endpoints)
+
+    async def _get_current_data_from_host(self, publish: bool = False) -> bool:
+        """Get the latest data from the Sonnen Batterie.
+
+        Only endpoints that are due and read by one of the `required_slots` are fetched, each within
+        its deadline in ENDPOINT_DEADLINES and all within POLL_TIME_BUDGET.
+        Return False if all fetched endpoints failed.
+        """
+        deadline = time.monotonic() + POLL_TIME_BUDGET
+        previous_status = self.data_status or {}
+        due_endpoints = self._due_endpoints(self.clock())
+        success = await self._fetch_endpoints(due_endpoints, deadline, publish)
+
+        # A change of e.g. the system status or operating mode also changes values in
+        # latestdata, so refresh it now instead of waiting for its next poll.
+        if (
+            previous_status
+            and self.data_status
+            and ENDPOINT_LATESTDATA not in due_endpoints
+            and ENDPOINT_LATESTDATA in self.required_endpoints
+            and any(previous_status.get(key) != self.data_status.get(key) for key in LATESTDATA_REFRESH_TRIGGERS)
+        ):
+            _LOGGER.debug("System state of Sonnen Batterie at %s changed, refreshing latest data", self.url)
+            await self._fetch_endpoints([ENDPOINT_LATESTDATA], deadline, publish)
+        return success
+
+    def _refresh_snapshot(self) -> None:
+        """Extract the sensor values of the endpoints whose data changed into a new snapshot."""
+        if not self._unextracted_endpoints:
+            return  # Nothing changed, e.g. all bodies were identical to the previous ones
+        start = time.perf_counter()
+        endpoints = self._unextracted_endpoints
+        self._unextracted_endpoints = set()
+        previous = self.snapshot
+        self.snapshot = self.extraction_plan.extract(
+            self.data,
+            version=previous.version + 1,
+            timestamp=self.wall_clock(),
+            previous=previous,
+            endpoints=endpoints,
         )
+        if self._optimistic:
+            # Values being written replace the values read until the write is confirmed or reverted
+            self.snapshot = self.snapshot.replace(
+                {slot: value for slot, (_, value) in self._optimistic.items()}, version=self.snapshot.version
+            )
+        self._changed_derived.update(self.derived.update(previous.values, self.snapshot.values))
+        self.metrics.stages[STAGE_EXTRACT].record(time.perf_counter() - start)
+        self.changed_endpoints |= endpoints
+        if self.snapshot.missing:
+            self._log.error("Could not find data for sensors %s in data from host %s. Using default values.", ", ".join(self.snapshot.missing), self.url)
+
+    def _record_samples(self, timestamp: float, now: float) -> None:
+        """Add the current values of the sampled sensors to their history, statistics and energy counters.
+
+        `timestamp` is the wall clock time and `now` the monotonic time of the samples.
+        Values of stale endpoints are skipped, so an outage is not recorded as a constant value.
+        """
+        values = self.snapshot.values
+        endpoints = self.extraction_plan.endpoints
+        for slot in self.sample_history.keys() | self._statistics_by_slot.keys() | self.energy_counters.keys():
+            value = values[slot]
+            if type(value) not in (int, float) or self.endpoint_states[endpoints[slot]].stale:
+                continue
+            if slot in self.sample_history:
+                self.sample_history[slot].append(timestamp, value)
+            for name, statistic in self._statistics_by_slot.get(slot, ()):
+                if statistic.add(timestamp, value):
+                    self._changed_statistics.add(name)
+            if slot in self.energy_counters:
+                self.energy_counters[slot].add(now, value)
 
     async def _get_static_data_from_host(self) -> None:
         """Get the static data, e.g. Serial Number, from the Sonnen Batterie."""
-        await self._get_dashboard_html_from_host()  # Get the dashboard HTML
-        self._parse_dashboard_html()  # Parse the dashboard HTML to get the URI for the serial number
-        await self._get_serial_number_from_host()  # Get the serial number from the host
+        if self._serial_number_uri is not None:
+            # Try the cached URI first and only scan the dashboard if it is outdated
+            try:
+                await self._get_serial_number_from_host()
+            except LookupError:
+                self._serial_number_uri = None
+        if self._serial_number_uri is None:
+            await self._get_serial_number_uri_from_host()  # Get the URI for the serial number from the dashboard
+            await self._get_serial_number_from_host()  # Get the serial number from the host
+        self._unextracted_endpoints.add("host")
+        self._refresh_snapshot()  # The serial number is part of the sensor values
 
     async def update(self, update_static_data:bool = False, update_current_data:bool = True) -> None:
         """Update the data from the Sonnen Batterie."""
@@ -164,16 +546,101 @@ class SonnenBatterieHost:
             coroutines.append(self._get_current_data_from_host())
         await asyncio.gather(*coroutines)
 
+    async def poll(self) -> None:
+        """Update the current data from the Sonnen Batterie and publish the changed values.
+        Called by `self.scheduler`."""
+        now = self.clock()
+        if self.breaker.is_open:
+            # The host is unreachable. Only probe it, on an exponential backoff.
+            if not self.breaker.probe_due(now):
+                return
+            if not await self.is_connected():
+                self.breaker.probe_failed(now)
+                _LOGGER.debug("Sonnen Batterie at %s still unreachable, next probe in %s s", self.url, self.breaker.backoff)
+                await self.publish_changes()
+                return
+            _LOGGER.info("Sonnen Batterie at %s is reachable again, resuming polling", self.url)
+            self.breaker.close()
+            self._log.flush()
+            self.republish_all()
+
+        _LOGGER.debug("Updating data from Sonnen Batterie at %s", self.url)
+        start = time.perf_counter()
+        if await self._get_current_data_from_host(publish=True):
+            self.breaker.record_success()
+            self._record_samples(self.wall_clock(), self.clock())
+        elif self.breaker.record_failure(now):
+            _LOGGER.warning(
+                "Sonnen Batterie at %s failed %d consecutive polls, pausing polling and probing it with a backoff starting at %s s",
+                self.url, self.breaker.consecutive_failures, self.breaker.backoff,
+            )
+            self.republish_all()  # Mark the entities unavailable
+        if self.adaptive_interval is not None:
+            self.scheduler.interval = self.adaptive_interval.observe(self.snapshot.values)
+        await self.publish_changes()  # Publish the diagnostic entities
+        for listener in self.poll_listeners:
+            listener(self)
+        self.metrics.stages[STAGE_POLL].record(time.perf_counter() - start)
+
+    def configure_adaptive_polling(self, min_interval: float, max_interval: float) -> None:
+        """Poll between `min_interval` and `max_interval` seconds depending on how fast readings change."""
+        plan = self.extraction_plan
+        self.adaptive_interval = AdaptiveInterval(
+            min_interval=min_interval,
+            max_interval=max_interval,
+            numeric_slots=[plan.slot_of(name) for name in ADAPTIVE_POLL_NUMERIC_SENSORS],
+            state_slots=[plan.slot_of(name) for name in ADAPTIVE_POLL_STATE_SENSORS],
+            absolute_threshold=ADAPTIVE_POLL_ABSOLUTE_THRESHOLD,
+            relative_threshold=ADAPTIVE_POLL_RELATIVE_THRESHOLD,
+            backoff=ADAPTIVE_POLL_BACKOFF,
+        )
+        self.scheduler.interval = self.adaptive_interval.interval
+        self.size_sample_buffers(min_interval)
+        self.configure_energy_gap(max_interval)
+
+    def configure_energy_gap(self, max_interval: float) -> None:
+        """Integrate the gaps between power samples of polls up to `max_interval` seconds apart in full."""
+        for counter in self.energy_counters.values():
+            counter.max_dt = max(ENERGY_MAX_GAP, max_interval + ENERGY_GAP_MARGIN)
+
+    def size_sample_buffers(self, min_interval: float) -> None:
+        """Size the sample history and statistics to hold a sample per poll at `min_interval` seconds."""
+        for buffer in self.sample_history.values():
+            buffer.resize(math.ceil(SAMPLE_HISTORY_DURATION / min_interval))
+        for sensor_config in STATISTICS_SENSORS_LIST:
+            self.statistics[sensor_config[0]].resize(math.ceil(sensor_config[8] / min_interval) + 1)
+
     async def update_callback(self, now) -> None:
         """Update the data from the Sonnen Batterie using the callback method
         called from e.g. `async_track_time_interval`."""
-        _LOGGER.debug("Updating data from Sonnen Batterie at %s", self.url)
-        await self.update(update_static_data=False, update_current_data=True)
-        await self.update_entity_states()
+        await self.poll()
 
-    async def update_entity_states(self) -> None:
-        """Update the states of the entities associated with this host."""
-        await asyncio.gather(*(entity.async_update_ha_state(force_refresh=True) for entity in self.entities))
+    async def publish_changes(self) -> None:
+        """Pass the values changed since they were last published to the `change_listeners`.
+
+        Only the values of endpoints whose data changed are checked, unless all values
+        are to be republished, e.g. to new entities. The listeners are called on every
+        publish, also without changed values, e.g. to refresh the diagnostic entities.
+        """
+        start = time.perf_counter()
+        now = self.clock()
+        if self._publish_all:
+            changed_slots = self.change_filter.changed_slots(self.snapshot.values, now)
+            self._publish_all = False
+        elif self.changed_endpoints:
+            slots = self.extraction_plan.slots_of_endpoints(self.changed_endpoints)
+            changed_slots = self.change_filter.changed_slots(self.snapshot.values, now, slots)
+        else:
+            changed_slots = []  # Skip the change filter, no data changed since the last publish
+        self.changed_endpoints.clear()
+
+        changes = StateChanges(changed_slots, self._changed_derived, self._changed_statistics)
+        self._changed_derived = set()
+        self._changed_statistics = set()
+        for listener in self.change_listeners:
+            listener(changes)
+        self.metrics.stages[STAGE_PUBLISH].record(time.perf_counter() - start)
+        _LOGGER.debug("State writes for Sonnen Batterie at %s: %s, decodes: %s", self.url, self.change_filter.stats, self.decode_stats)
 
     @property
     def data(self) -> dict | None:
@@ -187,11 +654,198 @@ class SonnenBatterieHost:
             "data": self.data_latestdata
         }
 
+    @property
+    def diagnostics(self) -> dict:
+        """Counters and timings of the poll pipeline, e.g. for a diagnostics download.
+
+        The scheduler's drift measures how late polls start, i.e. event loop contention.
+        """
+        return {
+            "url": self.url,
+            "serial_number": self.serial_number,
+            "scheduler": self.scheduler.stats,
+            "breaker": {
+                "state": self.breaker.state,
+                "consecutive_failures": self.breaker.consecutive_failures,
+                "times_opened": self.breaker.times_opened,
+                "backoff": self.breaker.backoff,
+            },
+            "endpoints": {
+                endpoint: {
+                    "stale": state.stale,
+                    "age": state.age,
+                    "errors": state.errors,
+                    "timeouts": state.timeouts,
+                    **self.decode_stats[endpoint],
+                }
+                for endpoint, state in self.endpoint_states.items()
+            },
+            "state_writes": self.change_filter.stats,
+            "commands": self.commands.stats,
+            "capture": self.capture.stats if self.capture is not None else None,
+            "sample_history": {
+                name: self.sample_history[self.extraction_plan.slot_of(name)].stats for name in SAMPLE_HISTORY_SENSORS
+            },
+            "metrics": self.metrics.as_dict(),
+        }
+
+    async def set_operating_mode(self, mode: str, wait: bool = False) -> bool | None:
+        """Set the operating mode, one of OPERATING_MODES.
+
+        The write is queued, see CommandQueue, and the new value is published at once.
+        If `wait` is True, return whether the host confirmed it.
+        """
+        async def send() -> None:
+            async with self.transport.request("PUT", URI_CONFIGURATIONS, json={CONFIGURATION_OPERATING_MODE: mode}) as response:
+                response.raise_for_status()
+
+        async def confirm() -> bool:
+            async with self.transport.get(f"{URI_CONFIGURATIONS}/{CONFIGURATION_OPERATING_MODE}") as response:
+                response.raise_for_status()
+                configuration = _json_loads(await response.read())
+            return str(configuration.get(CONFIGURATION_OPERATING_MODE)) == mode
+
+        return await self._submit_command(
+            Command("operating_mode", send, confirm, description=f"operating mode {mode}"),
+            {"operating_mode": mode},
+            wait,
+        )
+
+    async def set_setpoint(self, power_w: int, wait: bool = False) -> bool | None:
+        """Set the battery power in W, positive to discharge and negative to charge.
+
+        Charge and discharge setpoints replace each other, and are only applied by the
+        battery in manual operating mode. The write is queued, see CommandQueue, and the
+        new value is published at once. If `wait` is True, return whether the host confirmed it.
+        """
+        direction = "discharge" if power_w >= 0 else "charge"
+        uri = URI_SETPOINT.format(direction=direction, power=abs(power_w))
+
+        async def send() -> None:
+            async with self.transport.request("POST", uri) as response:
+                response.raise_for_status()
+
+        async def confirm() -> bool:
+            await self._get_endpoint_from_host(ENDPOINT_LATESTDATA)
+            self._refresh_snapshot()
+            await self.publish_changes()
+            return (self.data_latestdata or {}).get("SetPoint_W") == power_w
+
+        return await self._submit_command(
+            Command("setpoint", send, confirm, description=f"{direction} setpoint {abs(power_w)} W"),
+            {"set_point_w": power_w},
+            wait,
+        )
+
+    async def _submit_command(self, command: Command, values: dict, wait: bool) -> bool | None:
+        """Queue a write of `values`, publish them at once and keep or revert them once the write is done."""
+        command.settle = lambda confirmed: self._settle_optimistic(command, values, confirmed)
+        future = self.commands.submit(command)
+        await self._publish_optimistic(command, values)
+        return await future if wait else None
+
+    async def _publish_optimistic(self, command: Command, values: dict) -> None:
+        """Publish written values before they are read back from the host.
+
+        The values replace the values read from the host, also in later polls, until the
+        write is confirmed or reverted, see `_settle_optimistic`. The write may wait for
+        the rate limit of the command queue for several polls.
+        """
+        plan = self.extraction_plan
+        slots = {plan.slot_of(name): value for name, value in values.items()}
+        for slot, value in slots.items():
+            self._optimistic[slot] = (command, value)
+        previous = self.snapshot
+        self.snapshot = previous.replace(slots, version=previous.version + 1)
+        for slot in slots:
+            self.change_filter.invalidate(slot)
+            self.changed_endpoints.add(plan.endpoints[slot])
+        self._changed_derived.update(self.derived.update(previous.values, self.snapshot.values))
+        await self.publish_changes()
+
+    async def _settle_optimistic(self, command: Command, values: dict, confirmed: bool) -> None:
+        """Stop replacing the values written by `command` once the write is done.
+
+        A confirmed value stays in the snapshot until its endpoint is extracted again. A
+        value that was not confirmed is replaced by the last data read from the host at
+        once, as the next body of its endpoint may be identical to the last one and would
+        then not be extracted. Values written again by a later command are left to it.
+        """
+        plan = self.extraction_plan
+        slots = {}
+        for name, value in values.items():
+            slot = plan.slot_of(name)
+            if self._optimistic.get(slot, (None,))[0] is command:
+                del self._optimistic[slot]
+                self.change_filter.invalidate(slot)
+                slots[slot] = value
+        if not slots:
+            return
+        if confirmed:
+            previous = self.snapshot
+            self.snapshot = previous.replace(slots, version=previous.version + 1)
+            self._changed_derived.update(self.derived.update(previous.values, self.snapshot.values))
+            self.changed_endpoints.update(plan.endpoints[slot] for slot in slots)
+        else:
+            self._unextracted_endpoints.update(plan.endpoints[slot] for slot in slots)
+            self._refresh_snapshot()
+        await self.publish_changes()
+
+    @property
+    def schema_fingerprint(self) -> str | None:
+        """Fingerprint of the structure of the current payloads, or None until all endpoints returned data."""
+        if any(data is None for data in self._endpoint_data.values()):
+            return None
+        return schema_fingerprint(self._endpoint_data)
+
+    def discover_sensors(self) -> list[list]:
+        """Return definitions of sensors for the fields of the current payloads not read by SENSORS_LIST."""
+        return discover_sensors(self._endpoint_data, set(get_extraction_plan().paths))
+
+    def use_discovered_sensors(self, fingerprint: str, sensors: list[list]) -> None:
+        """Extract the discovered sensors of the payload structure `fingerprint` in addition to SENSORS_LIST.
+
+        Call before the entities are set, as it replaces the extraction plan.
+        """
+        self.extraction_plan = get_extraction_plan(fingerprint, sensors)
+        self.discovered_sensors = sensors
+        self.change_filter = self._create_change_filter()
+        previous = self.snapshot
+        self.snapshot = self.extraction_plan.extract(self.data, version=previous.version + 1, timestamp=self.wall_clock())
+        self._unextracted_endpoints.clear()
+
+    async def start_capture(self, path: str, max_bytes: int | None = None) -> None:
+        """Append the raw responses of the host to a capture file, see capture.py."""
+        await self.stop_capture()
+        metadata = {"url": self.url, "name": self.name, "serial_number": self.serial_number}
+        self.capture = await asyncio.get_running_loop().run_in_executor(None, CaptureWriter, path, metadata, max_bytes)
+        _LOGGER.info("Capturing responses of Sonnen Batterie at %s to %s", self.url, path)
+
+    async def stop_capture(self) -> None:
+        """Stop capturing and close the capture file."""
+        if self.capture is not None:
+            capture, self.capture = self.capture, None
+            await asyncio.get_running_loop().run_in_executor(None, capture.close)
+            _LOGGER.info("Stopped capturing responses of Sonnen Batterie at %s: %s", self.url, capture.stats)
+
     async def close_session(self) -> None:
-        """Close the aiohttp session."""
-        await self.aiohttp_session.close()
+        """Stop polling, drop pending commands, stop a capture and close the aiohttp session, unless it is shared."""
+        await self.scheduler.stop()
+        await self.commands.stop()
+        await self.stop_capture()
+        await self.transport.close()
 
     @property
-    def device_info(self) -> dict:
-        """Return information to link this entity to a device."""
-        return self._device_info
+    def static_data(self) -> dict:
+        """Static data of the host, to be cached and passed to `restore_static_data` on the next start."""
+        return {
+            "serial_number": self.serial_number,
+            "serial_number_uri": self._serial_number_uri,
+        }
+
+    def restore_static_data(self, serial_number: str, serial_number_uri: str | None = None) -> None:
+        """Use cached static data instead of getting it from the host."""
+        self.serial_number = serial_number
+        self._serial_number_uri = serial_number_uri
+        self._unextracted_endpoints.add("host")
+        self._refresh_snapshot()
@@ -0,0 +1,87 @@
+"""HTTP transport to a SonnenBatterie host."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+import logging
+
+import aiohttp
+
+from .const import DEFAULT_CONNECT_TIMEOUT, DEFAULT_MAX_CONNECTIONS, DEFAULT_READ_TIMEOUT, KEEPALIVE_TIMEOUT
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class SonnenTransport:
+    """Send requests to a SonnenBatterie host over a pooled aiohttp session.
+
+    The session should be shared, e.g. Home Assistant's, so connections are kept alive
+    and reused between polls. Each request is limited by a connect and a read timeout,
+    and at most `max_connections` GET requests to the host run at the same time. Writes,
+    i.e. all other methods, have one slot of their own, so a command is not queued
+    behind the requests of a poll. The command queue sends one write at a time.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        api_token: str,
+        session: aiohttp.ClientSession,
+        owns_session: bool = False,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+    ) -> None:
+        self.url = url
+        self.session = session
+        self._owns_session = owns_session  # Only close sessions that were created by the transport
+        self._headers = {'Auth-Token': api_token}
+        self._timeout = aiohttp.ClientTimeout(total=None, connect=connect_timeout, sock_read=read_timeout)
+        self._semaphore = asyncio.Semaphore(max_connections)
+        self._write_semaphore = asyncio.Semaphore(1)
+
+    @classmethod
+    def create(
+        cls,
+        url: str,
+        api_token: str,
+        session: aiohttp.ClientSession | None = None,
+        **kwargs,
+    ) -> SonnenTransport:
+        """Create a transport on `session`, or on a new pooled session if none is given."""
+        if session is not None:
+            return cls(url, api_token, session, owns_session=False, **kwargs)
+        _LOGGER.debug("Creating new aiohttp session for SonnenBatterie host %s", url)
+        connector = aiohttp.TCPConnector(
+            limit_per_host=kwargs.get("max_connections", DEFAULT_MAX_CONNECTIONS) + 1,  # And the write slot
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+        )
+        return cls(url, api_token, aiohttp.ClientSession(connector=connector), owns_session=True, **kwargs)
+
+    @asynccontextmanager
+    async def request(self, method: str, uri: str, **kwargs) -> AsyncIterator[aiohttp.ClientResponse]:
+        """Send a request for `uri` (relative to the host URL) and yield the response.
+
+        Keyword arguments, e.g. `json`, are passed on to aiohttp.
+        """
+        async with self._semaphore if method == "GET" else self._write_semaphore:
+            async with self.session.request(
+                method, f"{self.url}{uri}", headers=self._headers, timeout=self._timeout, **kwargs
+            ) as response:
+                yield response
+
+    def get(self, uri: str):
+        """Send a GET request for `uri` (relative to the host URL) and yield the response."""
+        return self.request("GET", uri)
+
+    @property
+    def closed(self) -> bool:
+        """Return True if the underlying session is closed."""
+        return self.session.closed
+
+    async def close(self) -> None:
+        """Close the session, if it is owned by this transport."""
+        if self._owns_session and not self.session.closed:
+            await self.session.close()
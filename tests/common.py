@@ -0,0 +1,74 @@
+"""Helpers of the tests running the integration in Home Assistant."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator
+import contextlib
+import importlib
+from pathlib import Path
+import shutil
+
+from homeassistant import bootstrap, config_entries, loader
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import CoreState, HomeAssistant
+from homeassistant.setup import async_setup_component
+
+from mock_server import API_TOKEN
+
+DOMAIN = "sonnen_batterie"
+SCHEDULER_TASK_PREFIX = "sonnen_poll_scheduler_"
+
+
+def integration(module: str):
+    """Import a module of the integration, e.g. "const", once Home Assistant added the configuration directory to the path."""
+    return importlib.import_module(f"custom_components.{DOMAIN}.{module}")
+
+
+@contextlib.asynccontextmanager
+async def async_test_home_assistant(config_dir: Path) -> AsyncIterator[HomeAssistant]:
+    """Run a minimal Home Assistant with the integration available, and stop it on exit."""
+    shutil.rmtree(config_dir / ".storage", ignore_errors=True)  # Config entries of earlier tests
+    hass = HomeAssistant(str(config_dir))
+    hass.config.skip_pip = True
+    loader.async_setup(hass)
+    hass.config_entries = config_entries.ConfigEntries(hass, {})
+    await bootstrap.async_load_base_functionality(hass)
+    assert await async_setup_component(hass, "homeassistant", {})
+    hass.state = CoreState.running
+    try:
+        yield hass
+    finally:
+        for entry in hass.config_entries.async_entries(DOMAIN):
+            await hass.config_entries.async_unload(entry.entry_id)
+        await hass.async_block_till_done()
+        await hass.async_stop(force=True)
+
+
+async def async_setup_battery(hass: HomeAssistant, url: str, name: str = "Home", options: dict | None = None) -> ConfigEntry:
+    """Add a battery with the manual step of the config flow and wait for it to be set up.
+
+    `options` are then saved as in the options flow, which reloads the entry.
+    """
+    result = await hass.config_entries.flow.async_init(DOMAIN, context={"source": config_entries.SOURCE_USER})
+    result = await hass.config_entries.flow.async_configure(result["flow_id"], {"next_step_id": "manual"})
+    result = await hass.config_entries.flow.async_configure(
+        result["flow_id"], {"name": name, "host_url": url, "api_token": API_TOKEN}
+    )
+    assert result["type"] == "create_entry", result
+    entry = result["result"]
+    await hass.async_block_till_done()
+    if options:
+        hass.config_entries.async_update_entry(entry, options={**entry.options, **options})
+        await hass.async_block_till_done()
+    assert entry.state is config_entries.ConfigEntryState.LOADED
+    return entry
+
+
+def scheduler_tasks() -> list[str]:
+    """Return the names of the running poll schedulers, e.g. "sonnen_poll_scheduler_fleet"."""
+    return sorted(
+        task.get_name()
+        for task in asyncio.all_tasks()
+        if task.get_name().startswith(SCHEDULER_TASK_PREFIX) and not task.done()
+    )
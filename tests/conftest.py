@@ -0,0 +1,42 @@
+"""Fixtures of the tests, which run against the mock server in benchmarks/.
+
+Run with `pytest`, or `python -P -m pytest`, from the integration's directory, see pytest.ini.
+
+The tests directory has no __init__.py and the tests are not run with plain
+`python -m pytest` from the integration's directory, so the integration's directory is
+not added to the path, as its `select.py` would shadow the standard library module.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+from pathlib import Path
+import sys
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "benchmarks"))  # The mock server and the loader of the client
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem: pytest.Function) -> bool | None:
+    """Run `async def` tests in a new event loop."""
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    arguments = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    asyncio.run(pyfuncitem.obj(**arguments))
+    return True
+
+
+@pytest.fixture(scope="session")
+def config_dir(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """Home Assistant configuration directory with the integration as a custom component.
+
+    Shared by all tests, as the `custom_components` package is imported once.
+    """
+    path = tmp_path_factory.mktemp("config")
+    (path / "custom_components").mkdir()
+    (path / "custom_components" / "sonnen_batterie").symlink_to(ROOT, target_is_directory=True)
+    return path
@@ -0,0 +1,54 @@
+"""Tests of the adaptive poll interval."""
+
+from __future__ import annotations
+
+import pytest
+
+from _loader import load
+
+adaptive = load("sonnen_host.adaptive")
+
+POWER, CHARGING = range(2)  # Slots
+
+
+def create_interval() -> adaptive.AdaptiveInterval:
+    return adaptive.AdaptiveInterval(
+        min_interval=1,
+        max_interval=30,
+        numeric_slots=[POWER],
+        state_slots=[CHARGING],
+        absolute_threshold=50,
+        relative_threshold=0.1,
+        backoff=2,
+    )
+
+
+def test_stable_readings_back_off_to_the_maximum():
+    interval = create_interval()
+    intervals = [interval.observe((1000, False)) for _ in range(7)]
+    assert intervals == [1, 2, 4, 8, 16, 30, 30]
+
+
+@pytest.mark.parametrize(
+    "values, volatile",
+    [
+        ((1040, False), False),  # Within the absolute threshold
+        ((1060, False), False),  # Within the relative threshold
+        ((1200, False), True),
+        ((800, False), True),
+        ((1000, True), True),  # A watched state flipped
+        ((None, False), False),  # Missing values are ignored
+        (("n/a", False), False),  # So are values that are not numbers
+        ((True, False), False),
+    ],
+)
+def test_transition_drops_to_the_minimum(values, volatile):
+    interval = create_interval()
+    for _ in range(4):
+        interval.observe((1000, False))
+    assert interval.observe(values) == (1 if volatile else 16)
+
+
+def test_maximum_is_at_least_the_minimum():
+    interval = adaptive.AdaptiveInterval(10, 5, [], [], 0, 0, 2)
+    assert interval.observe(()) == interval.observe(()) == 10
@@ -0,0 +1,18 @@
+"""Smoke tests of the benchmarks, so they keep working as the client changes."""
+
+from __future__ import annotations
+
+import bench_polling
+from mock_server import MockSonnenServer
+
+BATTERIES = 3
+ROUNDS = 3
+
+
+async def test_polling_benchmark_polls_every_battery():
+    async with MockSonnenServer(batteries=BATTERIES, time_scale=60) as server:
+        result = await bench_polling.run(BATTERIES, ROUNDS, server, interval=0.01)
+        assert server.paths["/api/status"] == BATTERIES * (1 + ROUNDS + ROUNDS)  # Warm-up, timed and traced rounds
+    assert result["batteries"] == BATTERIES
+    assert 0 < result["p50_ms"] <= result["p99_ms"]
+    assert result["writes_per_poll"] > 0
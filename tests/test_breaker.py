@@ -0,0 +1,62 @@
+"""Tests of the circuit breaker pausing the polls of an unreachable battery."""
+
+from __future__ import annotations
+
+from _loader import load
+
+breaker = load("sonnen_host.breaker")
+
+
+def create_breaker() -> breaker.CircuitBreaker:
+    return breaker.CircuitBreaker(failure_threshold=3, initial_backoff=5, max_backoff=30)
+
+
+def test_opens_after_consecutive_failures():
+    circuit_breaker = create_breaker()
+    assert not circuit_breaker.record_failure(0)
+    assert not circuit_breaker.record_failure(1)
+    assert circuit_breaker.record_failure(2)  # Reports only the failure that opened it
+    assert circuit_breaker.is_open
+    assert not circuit_breaker.record_failure(3)
+    assert circuit_breaker.times_opened == 1
+
+
+def test_success_resets_the_failures():
+    circuit_breaker = create_breaker()
+    circuit_breaker.record_failure(0)
+    circuit_breaker.record_failure(1)
+    circuit_breaker.record_success()
+    assert not circuit_breaker.record_failure(2)
+    assert not circuit_breaker.is_open
+
+
+def test_probes_back_off_exponentially_up_to_the_maximum():
+    circuit_breaker = create_breaker()
+    for now in range(3):
+        circuit_breaker.record_failure(now)
+    now = 2
+    probes = []
+    while len(probes) < 5:
+        now += 1
+        if circuit_breaker.probe_due(now):
+            probes.append(now)
+            circuit_breaker.probe_failed(now)
+    assert probes == [7, 17, 37, 67, 97]  # After 5, 10, 20, 30 and 30 s
+    assert circuit_breaker.backoff == 30
+
+
+def test_successful_probe_closes():
+    circuit_breaker = create_breaker()
+    for now in range(3):
+        circuit_breaker.record_failure(now)
+    circuit_breaker.probe_failed(7)
+    circuit_breaker.close()
+    assert not circuit_breaker.is_open
+    assert not circuit_breaker.probe_due(100)
+    assert circuit_breaker.consecutive_failures == 0
+    assert circuit_breaker.backoff == 5
+
+    for now in range(3):  # Opens again with the initial backoff
+        circuit_breaker.record_failure(200 + now)
+    assert circuit_breaker.times_opened == 2
+    assert circuit_breaker.probe_due(207)
@@ -0,0 +1,104 @@
+"""Tests of capturing the responses of a host and replaying them."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import aiohttp
+
+from _loader import load
+from mock_server import API_TOKEN, MockSonnenServer
+from payloads import DASHBOARD_HTML, DEVICE_ID_SCRIPT, SERIAL_NUMBER
+
+capture = load("sonnen_host.capture")
+const = load("sonnen_host.const")
+sonnen_host = load("sonnen_host.sonnen_host")
+
+URI_STATUS = "/api/status"
+URI_LATESTDATA = "/api/v2/latestdata"
+
+
+def test_records_round_trip(tmp_path):
+    """Bodies, references to identical bodies, timeouts and errors are read back in order."""
+    path = tmp_path / "capture.snbcap"
+    writer = capture.CaptureWriter(path, {"url": "http://battery", "serial_number": None})
+    writer.record(1.0, URI_STATUS, 200, b'{"Pac_total_W": 10}')
+    writer.record(1.0, URI_LATESTDATA, 200, b'{"SetPoint_W": 0}')
+    writer.record(2.0, URI_STATUS, 200, b'{"Pac_total_W": 10}')  # Stored as a reference
+    writer.record_error(3.0, URI_STATUS, TimeoutError())
+    writer.record_error(4.0, URI_LATESTDATA, aiohttp.ClientConnectionError("refused"))
+    writer.close()
+    assert writer.stats == {"records": 8, "references": 1, "dropped": 0, "bytes": path.stat().st_size}
+
+    with capture.CaptureReader(path) as reader:
+        assert reader.metadata == {"url": "http://battery", "serial_number": None}
+        records = [(record.timestamp, record.uri, record.kind, record.status, record.body) for record in reader]
+    assert records == [
+        (1.0, URI_STATUS, capture.KIND_FULL, 200, b'{"Pac_total_W": 10}'),
+        (1.0, URI_LATESTDATA, capture.KIND_FULL, 200, b'{"SetPoint_W": 0}'),
+        (2.0, URI_STATUS, capture.KIND_FULL, 200, b'{"Pac_total_W": 10}'),
+        (3.0, URI_STATUS, capture.KIND_TIMEOUT, 0, b""),
+        (4.0, URI_LATESTDATA, capture.KIND_ERROR, 0, b"refused"),
+    ]
+
+
+def test_responses_are_written_by_the_writer_thread(tmp_path, monkeypatch):
+    """Recording only queues a response, it is compressed and written off the calling thread."""
+    threads = set()
+    compress = capture.zlib.compress
+
+    def recording_compress(*args):
+        threads.add(threading.current_thread())
+        return compress(*args)
+
+    monkeypatch.setattr(capture.zlib, "compress", recording_compress)
+    writer = capture.CaptureWriter(tmp_path / "capture.snbcap")
+    writer.record(1.0, URI_STATUS, 200, b"{}")
+    writer.close()
+    assert len(threads) == 1
+    assert threading.current_thread() not in threads
+
+
+async def test_polls_are_replayed(tmp_path):
+    """A replayed capture yields the snapshots the host had while capturing."""
+    path = tmp_path / "capture.snbcap"
+    async with MockSonnenServer() as server:
+        host = await sonnen_host.SonnenBatterieHost.create(url=server.url(0), api_token=API_TOKEN)
+        host.restore_static_data(server.batteries[0].serial_number)
+        await host.start_capture(str(path))
+        snapshots = []
+        try:
+            for _ in range(3):
+                await host.poll()
+                snapshots.append(host.snapshot.values)
+                await asyncio.sleep(2 * capture.POLL_WINDOW)
+        finally:
+            await host.close_session()
+
+    replay = await sonnen_host.SonnenBatterieHost.create_replay(str(path), speed=None)
+    try:
+        replayed = []
+        while replay.transport.step():
+            await replay.poll()
+            replayed.append(replay.snapshot.values)
+    finally:
+        await replay.close_session()
+    assert replayed == snapshots
+
+
+async def test_replay_without_serial_number_scans_the_dashboard(tmp_path):
+    """The serial number of a capture started before it was known is read from the captured dashboard."""
+    path = tmp_path / "capture.snbcap"
+    writer = capture.CaptureWriter(path, {"url": "http://battery"})
+    writer.record(1.0, sonnen_host.URI_DASHBOARD, 200, DASHBOARD_HTML.encode())
+    writer.record(1.0, "/dash/device-id.js?v=1", 200, DEVICE_ID_SCRIPT.encode())
+    writer.close()
+
+    replay = await sonnen_host.SonnenBatterieHost.create_replay(str(path), speed=None)
+    try:
+        replay.transport.step()
+        await replay.update(update_static_data=True, update_current_data=False)
+        assert replay.serial_number == SERIAL_NUMBER
+    finally:
+        await replay.close_session()
@@ -0,0 +1,72 @@
+"""Tests of the change detection deciding which sensor values are published."""
+
+from __future__ import annotations
+
+from _loader import load
+
+change_filter = load("sonnen_host.change_filter")
+
+POWER, FREQUENCY, STATE = range(3)  # Slots
+MAX_AGE = 300
+
+
+def create_filter() -> change_filter.ChangeFilter:
+    return change_filter.ChangeFilter(
+        size=3,
+        deadbands={POWER: change_filter.Deadband(absolute=5), FREQUENCY: change_filter.Deadband(relative=0.001)},
+        max_age=MAX_AGE,
+    )
+
+
+def test_first_values_are_published():
+    values_filter = create_filter()
+    assert values_filter.changed_slots((100, 50.0, "OnGrid"), now=0) == [POWER, FREQUENCY, STATE]
+
+
+def test_unchanged_values_are_never_republished():
+    """Home Assistant drops writes of unchanged states, so they are not written at all, however old."""
+    values_filter = create_filter()
+    values_filter.changed_slots((100, 50.0, "OnGrid"), now=0)
+    for now in (1, MAX_AGE, 10 * MAX_AGE):
+        assert values_filter.changed_slots((100, 50.0, "OnGrid"), now=now) == []
+    assert values_filter.stats["suppressed"] == 9
+
+
+def test_changes_within_the_deadband_are_suppressed():
+    values_filter = create_filter()
+    values_filter.changed_slots((100, 50.0, "OnGrid"), now=0)
+    assert values_filter.changed_slots((105, 50.04, "OnGrid"), now=1) == []  # Absolute 5 W, relative 0.1 %
+    assert values_filter.changed_slots((106, 50.06, "OnGrid"), now=2) == [POWER, FREQUENCY]
+    assert values_filter.changed_slots((102, 50.06, "OffGrid"), now=3) == [STATE]  # Measured from the last published 106
+
+
+def test_deadband_holds_a_value_back_for_max_age():
+    """A value within the deadband is published once the last published value is older than `max_age`."""
+    values_filter = create_filter()
+    values_filter.changed_slots((100, 50.0, "OnGrid"), now=0)
+    assert values_filter.changed_slots((103, 50.0, "OnGrid"), now=MAX_AGE - 1) == []
+    assert values_filter.changed_slots((103, 50.0, "OnGrid"), now=MAX_AGE + 1) == [POWER]
+    assert values_filter.changed_slots((104, 50.0, "OnGrid"), now=MAX_AGE + 2) == []
+
+
+def test_deadband_ignores_values_that_are_not_numbers():
+    values_filter = create_filter()
+    values_filter.changed_slots((100, 50.0, "OnGrid"), now=0)
+    assert values_filter.changed_slots((None, 50.0, "OnGrid"), now=1) == [POWER]
+    assert values_filter.changed_slots((True, 50.0, "OnGrid"), now=2) == [POWER]
+
+
+def test_invalidate_publishes_again():
+    values_filter = create_filter()
+    values_filter.changed_slots((100, 50.0, "OnGrid"), now=0)
+    values_filter.invalidate(STATE)
+    assert values_filter.changed_slots((100, 50.0, "OnGrid"), now=1) == [STATE]
+    values_filter.invalidate()
+    assert values_filter.changed_slots((100, 50.0, "OnGrid"), now=2) == [POWER, FREQUENCY, STATE]
+
+
+def test_only_the_given_slots_are_checked():
+    values_filter = create_filter()
+    values_filter.changed_slots((100, 50.0, "OnGrid"), now=0)
+    assert values_filter.changed_slots((200, 51.0, "OffGrid"), now=1, slots=[STATE]) == [STATE]
+    assert values_filter.changed_slots((200, 51.0, "OffGrid"), now=2) == [POWER, FREQUENCY]
@@ -0,0 +1,105 @@
+"""Tests of the command line poller and of using the client without Home Assistant."""
+
+from __future__ import annotations
+
+import json
+import logging
+from pathlib import Path
+import subprocess
+import sys
+
+import pytest
+
+from _loader import load
+from mock_server import API_TOKEN, MockSonnenServer
+
+cli = load("sonnen_host.__main__")
+
+PACKAGE = Path(__file__).resolve().parent.parent / "sonnen_host"
+BENCHMARKS = Path(__file__).resolve().parent.parent / "benchmarks"
+
+# Imports every module of the client with the import of homeassistant failing
+IMPORT_WITHOUT_HOME_ASSISTANT = """
+import sys
+
+class BlockHomeAssistant:
+    def find_spec(self, name, path=None, target=None):
+        if name.partition(".")[0] == "homeassistant":
+            raise ImportError(f"{name} is blocked")
+
+sys.meta_path.insert(0, BlockHomeAssistant())
+sys.path.insert(0, sys.argv[1])
+from _loader import load
+
+for module in sys.argv[2:]:
+    load(module)
+sonnen_host = load("sonnen_host")
+sonnen_host.SonnenBatterieHost, sonnen_host.SonnenFleet, sonnen_host.StateChanges
+assert not any(name.partition(".")[0] == "homeassistant" for name in sys.modules)
+"""
+
+
+def test_client_is_imported_without_home_assistant(tmp_path):
+    modules = [f"sonnen_host.{path.stem}" for path in sorted(PACKAGE.glob("*.py")) if path.stem != "__init__"]
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_WITHOUT_HOME_ASSISTANT, str(BENCHMARKS), *modules],
+        cwd=tmp_path,  # Not the integration's directory, whose select.py shadows the standard library
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [
+        [],  # Neither URLs nor a replay
+        ["http://battery"],  # No token
+        ["http://battery", "--token", API_TOKEN, "--replay", "battery.cap"],
+        ["--replay", "battery.cap", "--speed", "0"],
+    ],
+)
+def test_invalid_arguments_are_rejected(argv):
+    with pytest.raises(SystemExit) as exc_info:
+        cli.parse_args(argv)
+    assert exc_info.value.code == 2
+
+
+async def test_polls_are_printed_as_json(tmp_path, capsys):
+    """Each poll of each battery is printed, and appended to the output file, as a JSON object."""
+    output = tmp_path / "polls.jsonl"
+    async with MockSonnenServer(batteries=2) as server:
+        args = cli.parse_args(
+            [server.url(0), server.url(1), "--token", API_TOKEN, "--interval", "0.05", "--count", "2", "--json", "--output", str(output)]
+        )
+        assert await cli.run(args) == 0
+        args.output.close()
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert sorted(record["url"] for record in records) == sorted([server.url(0), server.url(1)] * 2)
+    assert {record["serial_number"] for record in records} == {battery.serial_number for battery in server.batteries}
+    assert all(record["available"] and record["values"]["consumption_w"] is not None for record in records)
+    assert [json.loads(line) for line in output.read_text().splitlines()] == records
+
+
+async def test_recorded_polls_are_replayed(tmp_path, capsys, caplog):
+    """A capture recorded by the poller is replayed as fast as possible, with the summary logged at INFO."""
+    path = tmp_path / "battery.cap"
+    async with MockSonnenServer() as server:
+        # Polls further apart than the capture's POLL_WINDOW, so each is replayed on its own
+        args = cli.parse_args([server.url(0), "--token", API_TOKEN, "--interval", "0.2", "--count", "3", "--json", "--record", str(path)])
+        assert await cli.run(args) == 0
+    recorded = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    with caplog.at_level(logging.INFO, logger=cli.__name__):
+        assert await cli.run(cli.parse_args(["--replay", str(path), "--speed", "max", "--json"])) == 0
+    replayed = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [record["values"] for record in replayed] == [record["values"] for record in recorded]
+    summary = [record for record in caplog.records if record.getMessage().startswith("Replayed")]
+    assert [record.levelno for record in summary] == [logging.INFO]
+
+
+async def test_unreachable_battery_fails(capsys):
+    async with MockSonnenServer() as server:
+        url = server.url(0)
+    args = cli.parse_args([url, "--token", API_TOKEN, "--count", "1"])  # The server is stopped
+    assert await cli.run(args) == 1
@@ -0,0 +1,196 @@
+"""Tests of the command queue writing setpoints and the operating mode to the mock server."""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import itertools
+import time
+
+from _loader import load
+from common import async_setup_battery, async_test_home_assistant, integration
+from mock_server import API_TOKEN, MockSonnenServer
+
+const = load("sonnen_host.const")
+commands = load("sonnen_host.commands")
+sonnen_host = load("sonnen_host.sonnen_host")
+
+MIN_INTERVAL = 0.3  # Seconds between two writes, shorter than COMMAND_MIN_INTERVAL to keep the tests fast
+CONFIRM_DELAY = 0.05
+TIMING_TOLERANCE = 0.02  # Seconds the mock server may see a write earlier than the queue sent it
+
+
+@contextlib.asynccontextmanager
+async def connected_host(server: MockSonnenServer):
+    """Return a host of battery 0 of `server` with current data and a fast command queue."""
+    host = await sonnen_host.SonnenBatterieHost.create(url=server.url(0), api_token=API_TOKEN)
+    host.restore_static_data(server.batteries[0].serial_number)
+    host.commands.min_interval = MIN_INTERVAL
+    host.commands.confirm_delay = CONFIRM_DELAY
+    await host.poll()
+    try:
+        yield host
+    finally:
+        await host.close_session()
+
+
+def published_setpoint(host) -> int:
+    return host.snapshot[host.extraction_plan.slot_of("set_point_w")]
+
+
+async def until(condition, timeout: float = 5) -> None:
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+async def test_repeated_writes_are_coalesced():
+    """Setpoints submitted while a write is in progress are merged into the last one."""
+    async with MockSonnenServer() as server, connected_host(server) as host:
+        battery = server.batteries[0]
+        tasks = []
+        for power in (100, 200, 300, 400):
+            tasks.append(asyncio.create_task(host.set_setpoint(power, wait=True)))
+            await asyncio.sleep(0.01)
+
+        assert await asyncio.gather(*tasks) == [True] * 4  # Superseded commands resolve with the last one
+        assert battery.writes == 2  # 100 at once, then 400 after the minimum interval
+        assert battery.setpoint == 400
+        assert host.commands.stats == {"pending": 0, "sent": 2, "coalesced": 2, "confirmed": 2, "failed": 0}
+
+
+async def test_minimum_interval_between_writes():
+    """Writes to the battery, of any setting, are at least `min_interval` seconds apart."""
+    async with MockSonnenServer() as server, connected_host(server) as host:
+        battery = server.batteries[0]
+        results = await asyncio.gather(
+            host.set_operating_mode(const.OPERATING_MODE_MANUAL, wait=True),
+            host.set_setpoint(-1000, wait=True),
+            host.set_setpoint(500, wait=True),
+        )
+        assert results == [True, True, True]
+        assert await host.set_setpoint(0, wait=True)
+
+        assert battery.writes == 3  # -1000 was superseded by 500 before it was sent
+        assert (battery.operating_mode, battery.setpoint) == (const.OPERATING_MODE_MANUAL, 0)
+        for first, second in itertools.pairwise(battery.write_times):
+            assert second - first >= MIN_INTERVAL - TIMING_TOLERANCE
+
+
+async def test_write_is_confirmed_by_reading_it_back():
+    """A write is confirmed once the battery reports the new value, which replaces the optimistic one."""
+    async with MockSonnenServer() as server, connected_host(server) as host:
+        start = time.monotonic()
+        assert await host.set_setpoint(1200, wait=True)
+        assert time.monotonic() - start >= CONFIRM_DELAY  # Read back after the write
+        assert host.commands.confirmed == 1
+        assert host.data_latestdata["SetPoint_W"] == 1200
+        assert published_setpoint(host) == 1200
+
+
+async def test_unconfirmed_write_is_reverted():
+    """A value the battery does not apply is published at once, and reverted when the read-backs disagree."""
+    async with MockSonnenServer() as server, connected_host(server) as host:
+        server.batteries[0].apply_writes = False
+        task = asyncio.create_task(host.set_setpoint(1200, wait=True))
+        await asyncio.sleep(0)
+        assert published_setpoint(host) == 1200  # Optimistic value before the write is confirmed
+
+        assert not await task
+        assert host.commands.stats["failed"] == 1
+        assert server.batteries[0].writes == 1  # Read back COMMAND_CONFIRM_ATTEMPTS times, not written again
+        assert published_setpoint(host) == 0
+
+
+async def test_optimistic_value_is_published_to_the_entity(config_dir):
+    """Setting the number entity shows the new setpoint at once, and the battery's value if it is not applied."""
+    async with MockSonnenServer() as server, async_test_home_assistant(config_dir) as hass:
+        entry = await async_setup_battery(hass, server.url(0))
+        host = integration("utils").get_sonnen_host_by_entry_id(hass, entry.entry_id)
+        host.commands.min_interval = MIN_INTERVAL
+        host.commands.confirm_delay = CONFIRM_DELAY
+        entity_id = "number.home_discharge_setpoint"
+        assert float(hass.states.get(entity_id).state) == 0
+
+        await hass.services.async_call("number", "set_value", {"entity_id": entity_id, "value": 1500}, blocking=True)
+        assert float(hass.states.get(entity_id).state) == 1500  # Before the write is confirmed
+        await until(lambda: host.commands.confirmed == 1)
+        assert server.batteries[0].setpoint == 1500
+        assert float(hass.states.get(entity_id).state) == 1500
+
+        server.batteries[0].apply_writes = False
+        await hass.services.async_call("number", "set_value", {"entity_id": entity_id, "value": 800}, blocking=True)
+        assert float(hass.states.get(entity_id).state) == 800
+        await until(lambda: host.commands.failed == 1)
+        assert float(hass.states.get(entity_id).state) == 1500  # Reverted to the setpoint read back from the battery
+
+
+async def test_unconfirmed_write_is_reverted_with_identical_payloads():
+    """The optimistic value is reverted even when the battery serves the same body before and after the write."""
+    async with MockSonnenServer() as server, connected_host(server) as host:
+        battery = server.batteries[0]
+        battery.apply_writes = False
+        battery.frozen = True  # After the first poll, see connected_host
+        assert not await host.set_setpoint(1200, wait=True)  # Its read-backs fingerprint the frozen body
+        stats = dict(host.decode_stats[const.ENDPOINT_LATESTDATA])
+
+        assert not await host.set_setpoint(1500, wait=True)
+        assert host.decode_stats[const.ENDPOINT_LATESTDATA]["decodes"] == stats["decodes"]  # Only identical bodies
+        assert published_setpoint(host) == 0
+
+        await host.poll()
+        assert published_setpoint(host) == 0
+
+
+async def test_failed_operating_mode_write_is_reverted():
+    async with MockSonnenServer() as server, connected_host(server) as host:
+        battery = server.batteries[0]
+        battery.frozen = True
+        server.failing_paths.add("/api/v2/configurations")
+        mode = host.snapshot[host.extraction_plan.slot_of("operating_mode")]
+
+        assert not await host.set_operating_mode(const.OPERATING_MODE_MANUAL, wait=True)
+        assert host.snapshot[host.extraction_plan.slot_of("operating_mode")] == mode
+
+
+async def test_optimistic_value_survives_polls_until_confirmed():
+    """Polls while a write waits for the rate limit keep the written value, and the confirmed value stays."""
+    async with MockSonnenServer() as server, connected_host(server) as host:
+        slot = host.extraction_plan.slot_of("operating_mode")
+        await host.set_setpoint(100)  # Takes the write slot, the operating mode waits for MIN_INTERVAL
+        task = asyncio.create_task(host.set_operating_mode(const.OPERATING_MODE_MANUAL, wait=True))
+        await asyncio.sleep(0)
+        for _ in range(3):
+            await host.poll()
+            assert server.batteries[0].operating_mode != const.OPERATING_MODE_MANUAL  # Not written yet
+            assert host.snapshot[slot] == const.OPERATING_MODE_MANUAL
+
+        assert await task
+        assert host.snapshot[slot] == const.OPERATING_MODE_MANUAL
+        await host.poll()
+        assert host.snapshot[slot] == const.OPERATING_MODE_MANUAL  # Now read from the battery
+
+
+async def test_failing_command_does_not_stop_the_queue():
+    """A malformed read-back or an unexpected error fails its command, and later commands are still sent."""
+    queue = commands.CommandQueue(min_interval=0, confirm_attempts=1, confirm_delay=0)
+    sent = []
+
+    async def send() -> None:
+        sent.append(len(sent))
+
+    async def malformed() -> bool:
+        raise ValueError("Expecting value")
+
+    async def unexpected() -> bool:
+        raise KeyError("EM_OperatingMode")
+
+    async def confirmed() -> bool:
+        return True
+
+    async with asyncio.timeout(1):
+        assert not await queue.submit(commands.Command("a", send, malformed))
+        assert not await queue.submit(commands.Command("b", send, unexpected))
+        assert await queue.submit(commands.Command("c", send, confirmed))
+    assert sent == [0, 1, 2]
+    assert queue.stats == {"pending": 0, "sent": 3, "coalesced": 0, "confirmed": 1, "failed": 2}
@@ -0,0 +1,32 @@
+"""Tests of the streaming scan of the dashboard for the device-id script."""
+
+from __future__ import annotations
+
+from _loader import load
+from payloads import DASHBOARD_HTML
+
+dashboard = load("sonnen_host.dashboard")
+
+
+async def chunks_of(html: str, size: int, read: list | None = None):
+    body = html.encode()
+    for start in range(0, len(body), size):
+        if read is not None:
+            read.append(start)
+        yield body[start:start + size]
+
+
+async def test_finds_the_script_split_across_chunks():
+    for size in (1, 7, 64, 4096):
+        assert await dashboard.find_device_id_script(chunks_of(DASHBOARD_HTML, size)) == "/dash/device-id.js?v=1"
+
+
+async def test_stops_reading_at_the_script():
+    read = []
+    await dashboard.find_device_id_script(chunks_of(DASHBOARD_HTML + "<p>padding</p>" * 1000, 64, read))
+    assert len(read) * 64 < len(DASHBOARD_HTML)
+
+
+async def test_returns_none_without_the_script():
+    html = DASHBOARD_HTML.replace("device-id", "settings")
+    assert await dashboard.find_device_id_script(chunks_of(html, 64)) is None
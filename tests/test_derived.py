@@ -0,0 +1,103 @@
+"""Tests of the derived metrics and their incremental recomputation."""
+
+from __future__ import annotations
+
+from graphlib import CycleError
+
+import pytest
+
+from _loader import load
+
+const = load("sonnen_host.const")
+derived = load("sonnen_host.derived")
+extraction = load("sonnen_host.extraction")
+
+SENSORS = [
+    ["production", None, "status.Production_W", "int", None, None, None],
+    ["feed_in", None, "status.GridFeedIn_W", "int", None, None, None],
+    ["consumption", None, "status.Consumption_W", "int", None, None, None],
+]
+plan = extraction.ExtractionPlan(SENSORS)
+
+
+def values(production=3000, feed_in=1000, consumption=2000) -> tuple:
+    return (production, feed_in, consumption)
+
+
+@pytest.fixture
+def calls(monkeypatch) -> list[str]:
+    """Add formulas recording their calls, and return the calls."""
+    calls = []
+
+    def formula(name, function):
+        def record(*arguments):
+            calls.append(name)
+            return function(*arguments)
+        monkeypatch.setitem(derived.FORMULAS, name, record)
+
+    formula("used", lambda production, feed_in: production - feed_in)
+    formula("used_share", lambda used, production: used / production)
+    formula("used_percent", lambda used_share: used_share * 100)
+    formula("consumption_kw", lambda consumption: consumption / 1000)
+    return calls
+
+
+# Listed before their inputs, to check that they are ordered by dependency
+METRICS = [
+    ["used_percent", None, "used_percent", "float", None, None, None, ["used_share"]],
+    ["used_share", None, "used_share", "float", None, None, None, ["used", "status.Production_W"]],
+    ["used", None, "used", "int", None, None, None, ["status.Production_W", "status.GridFeedIn_W"]],
+    ["consumption_kw", None, "consumption_kw", "float", None, None, None, ["status.Consumption_W"]],
+]
+
+
+def test_metrics_are_computed_after_their_inputs(calls):
+    metrics = derived.DerivedMetrics(METRICS, plan)
+    changed = metrics.update(plan.empty_snapshot.values, values())
+    assert calls.index("used") < calls.index("used_share") < calls.index("used_percent")
+    assert sorted(changed) == sorted(metric[0] for metric in METRICS)
+    # Values are rounded to 2 decimals, also as inputs of other metrics
+    assert metrics.values == {"used_percent": 67.0, "used_share": 0.67, "used": 2000, "consumption_kw": 2.0}
+    assert metrics.slots_of("used_percent") == {plan.slot_of("production"), plan.slot_of("feed_in")}
+
+
+def test_only_metrics_reading_a_changed_input_are_recomputed(calls):
+    metrics = derived.DerivedMetrics(METRICS, plan)
+    metrics.update(plan.empty_snapshot.values, values())
+    calls.clear()
+
+    assert metrics.update(values(), values(consumption=2500)) == ["consumption_kw"]
+    assert calls == ["consumption_kw"]
+    calls.clear()
+
+    # `used` does not change, but used_share also reads the production
+    assert metrics.update(values(), values(production=4000, feed_in=2000)) == ["used_share", "used_percent"]
+    assert calls == ["used", "used_share", "used_percent"]
+    calls.clear()
+
+    assert metrics.update(values(), values()) == []
+    assert calls == []
+
+
+def test_missing_inputs_give_the_default(calls):
+    metrics = derived.DerivedMetrics(METRICS, plan)
+    metrics.update(plan.empty_snapshot.values, values())
+    metrics.update(values(), values(production=None))
+    assert metrics.values["used"] is None
+    assert metrics.values["used_percent"] is None
+
+
+def test_cycles_are_rejected(calls):
+    cycle = [
+        ["a", None, "used", "int", None, None, None, ["b", "status.Production_W"]],
+        ["b", None, "used", "int", None, None, None, ["a", "status.Production_W"]],
+    ]
+    with pytest.raises(CycleError):
+        derived.DerivedMetrics(cycle, plan)
+
+
+def test_derived_sensors_list_resolves_against_the_shared_plan():
+    sonnen_host = load("sonnen_host.sonnen_host")
+    shared_plan = sonnen_host.get_extraction_plan()
+    metrics = derived.DerivedMetrics(const.DERIVED_SENSORS_LIST, shared_plan)
+    assert set(metrics.input_slots) == {shared_plan.paths.index(path) for path in derived.input_paths(const.DERIVED_SENSORS_LIST)}
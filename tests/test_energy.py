@@ -0,0 +1,54 @@
+"""Tests of the integration of power samples into energy counters."""
+
+from __future__ import annotations
+
+import pytest
+
+from _loader import load
+
+energy = load("sonnen_host.energy")
+
+
+def test_constant_power_is_integrated():
+    counter = energy.EnergyCounter(max_dt=60)
+    for timestamp in range(0, 3601, 2):
+        counter.add(timestamp, 1000)
+    assert counter.positive_wh == pytest.approx(1000)
+    assert counter.negative_wh == 0
+
+
+def test_trapezoid_crossing_zero_is_split():
+    """From +1000 W to -3000 W in 4 s, the power crosses zero after 1 s."""
+    counter = energy.EnergyCounter(max_dt=60)
+    counter.add(0, 1000)
+    counter.add(4, -3000)
+    assert counter.energy_wh(energy.DIRECTION_POSITIVE) == pytest.approx(1000 / 2 * 1 / 3600)
+    assert counter.energy_wh(energy.DIRECTION_NEGATIVE) == pytest.approx(3000 / 2 * 3 / 3600)
+
+
+def test_gap_is_limited_to_max_dt():
+    """After a gap, e.g. an outage, only `max_dt` seconds are integrated."""
+    counter = energy.EnergyCounter(max_dt=60)
+    counter.add(0, 3600)
+    counter.add(3600, 3600)
+    assert counter.positive_wh == pytest.approx(60)
+
+    counter.max_dt = 300  # Raised for a longer maximum poll interval
+    counter.add(3900, 3600)
+    assert counter.positive_wh == pytest.approx(360)
+
+
+def test_samples_out_of_order_are_not_integrated():
+    counter = energy.EnergyCounter(max_dt=60)
+    counter.add(10, 1000)
+    counter.add(10, 1000)
+    counter.add(5, 1000)
+    assert counter.positive_wh == 0
+
+
+def test_restored_totals_are_added():
+    counter = energy.EnergyCounter(max_dt=60)
+    counter.restore(energy.DIRECTION_NEGATIVE, 1500)
+    counter.add(0, -360)
+    counter.add(10, -360)
+    assert counter.energy_wh(energy.DIRECTION_NEGATIVE) == pytest.approx(1501)
@@ -0,0 +1,80 @@
+"""Tests of the compiled extraction of sensor values, against the walk every entity did before."""
+
+from __future__ import annotations
+
+import copy
+import random
+
+import pytest
+
+from _loader import load
+from mock_server import SimulatedBattery
+from payloads import LATESTDATA, SERIAL_NUMBER, STATUS
+
+const = load("sonnen_host.const")
+extraction = load("sonnen_host.extraction")
+
+plan = extraction.ExtractionPlan(const.SENSORS_LIST)
+
+
+def legacy_state(data: dict, sensor_config: list):
+    """The value the previous SonnenBatterieEntity.state read from the host data, coerced to the declared type."""
+    try:
+        for key in sensor_config[2].split("."):
+            data = data[key]
+    except KeyError:
+        return sensor_config[6]
+    if sensor_config[3] == const.DATA_TYPE_FLAG_GROUP:
+        return next((flag for flag, value in data.items() if value is True), sensor_config[6])
+    return extraction.COERCERS[sensor_config[3]](data)
+
+
+def host_data(status: dict, latestdata: dict) -> dict:
+    return {"host": {"url": "http://192.168.1.10", "serial_number": SERIAL_NUMBER}, "status": status, "data": latestdata}
+
+
+def simulated_payloads(count: int) -> list[tuple[dict, dict]]:
+    battery = SimulatedBattery(0, random.Random(0), time_scale=3600)
+    return [(battery.status(), battery.latestdata()) for _ in range(count)]
+
+
+@pytest.mark.parametrize("status, latestdata", [(STATUS, LATESTDATA), *simulated_payloads(5)])
+def test_snapshot_matches_legacy_extraction(status, latestdata):
+    """Each slot holds the value the entity of the sensor read before."""
+    data = host_data(status, latestdata)
+    snapshot = plan.extract(data, version=1)
+    assert snapshot.missing == ()
+    for sensor_config in const.SENSORS_LIST:
+        assert snapshot[plan.slot_of(sensor_config[0])] == legacy_state(data, sensor_config), sensor_config[0]
+
+
+def test_missing_values_fall_back_to_their_default():
+    """Sensors without a value in the payload get their default and are reported as missing."""
+    latestdata = copy.deepcopy(LATESTDATA)
+    del latestdata["ic_status"]["DC Shutdown Reason"]
+    del latestdata["SetPoint_W"]
+    snapshot = plan.extract(host_data(STATUS, latestdata), version=1)
+
+    assert set(snapshot.missing) == {"dc_shutdown_reason", "set_point_w"}
+    assert snapshot[plan.slot_of("dc_shutdown_reason")] == "Not shutdown"
+    assert snapshot[plan.slot_of("set_point_w")] is None
+
+
+def test_partial_extraction_keeps_other_endpoints():
+    """Extracting one endpoint takes the values of the others over from the previous snapshot."""
+    (status, latestdata), (new_status, new_latestdata) = simulated_payloads(2)
+    previous = plan.extract(host_data(status, latestdata), version=1)
+    snapshot = plan.extract(host_data(new_status, new_latestdata), version=2, previous=previous, endpoints={"status"})
+
+    expected = plan.extract(host_data(new_status, latestdata), version=2)
+    assert snapshot.values == expected.values
+    assert snapshot.version == 2
+
+
+def test_snapshot_is_immutable():
+    snapshot = plan.extract(host_data(STATUS, LATESTDATA), version=1)
+    with pytest.raises(AttributeError):
+        snapshot.version = 2
+    replaced = snapshot.replace({plan.slot_of("set_point_w"): 1000}, version=2)
+    assert replaced[plan.slot_of("set_point_w")] == 1000
+    assert snapshot[plan.slot_of("set_point_w")] == LATESTDATA["SetPoint_W"]
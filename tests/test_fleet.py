@@ -0,0 +1,107 @@
+"""Tests of the fleet's serial number index and aggregates across the hosts."""
+
+from __future__ import annotations
+
+from _loader import load
+
+fleet = load("sonnen_host.fleet")
+
+
+class Host:
+    """Stand-in for a host, only offering what the fleet reads."""
+
+    def __init__(self, entry_id: str, serial_number: str | None = None) -> None:
+        self.entry_id = entry_id
+        self.serial_number = serial_number
+        self.poll_listeners = []
+        self.contribution = (1,) + (0,) * (len(fleet.AGGREGATES) - 1)
+
+    def poll(self) -> None:
+        for listener in self.poll_listeners:
+            listener(self)
+
+
+class Fleet(fleet.SonnenFleet):
+    """Fleet counting how often a contribution is computed."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.computed = 0
+
+    def _contribution(self, host: Host) -> tuple:
+        self.computed += 1
+        return host.contribution
+
+
+def test_serial_number_known_after_adding_is_indexed():
+    sonnen_fleet = Fleet()
+    host = Host("a")
+    sonnen_fleet.add(host)
+    assert sonnen_fleet.hosts_by_serial_number == {}
+
+    host.serial_number = "1"  # Restored or read after the host was added
+    host.poll()
+    assert sonnen_fleet.get_by_serial_number("1") is host
+
+    host.serial_number = "2"
+    host.poll()
+    assert sonnen_fleet.hosts_by_serial_number == {"2": host}
+
+    sonnen_fleet.remove(host)
+    assert sonnen_fleet.hosts_by_serial_number == {}
+
+
+def test_aggregates_are_computed_once_per_read():
+    """Polls only mark a host as updated, its contribution is computed when the aggregates are read."""
+    sonnen_fleet = Fleet()
+    hosts = [Host("a", "1"), Host("b", "2")]
+    for host in hosts:
+        sonnen_fleet.add(host)
+    for _ in range(5):
+        for host in hosts:
+            host.poll()
+    assert sonnen_fleet.computed == 0
+
+    assert sonnen_fleet.values["units_online"] == 2
+    assert sonnen_fleet.computed == 2
+    assert sonnen_fleet.values["units_online"] == 2
+    assert sonnen_fleet.computed == 2
+
+    hosts[0].contribution = fleet._NO_CONTRIBUTION  # Unreachable
+    hosts[0].poll()
+    sonnen_fleet.remove(hosts[1])
+    assert sonnen_fleet.values["units_online"] == 0
+    assert sonnen_fleet.computed == 3
+
+
+
+def set_power(host: Host, power: float) -> None:
+    index = fleet.AGGREGATES.index("power")
+    host.contribution = host.contribution[:index] + (power,) + host.contribution[index + 1:]
+    host.poll()
+
+
+def test_sums_are_recomputed_exactly():
+    """Rounding errors of the running sums are dropped every EXACT_SUM_INTERVAL updates and on removal."""
+    sonnen_fleet = Fleet()
+    hosts = [Host("a", "1"), Host("b", "2"), Host("c", "3")]
+    for host in hosts:
+        sonnen_fleet.add(host)
+    set_power(hosts[0], 1e17)
+    sonnen_fleet.values
+    set_power(hosts[1], 1.0)  # Lost in the running sum
+    sonnen_fleet.values
+    set_power(hosts[0], 0.0)
+    assert sonnen_fleet.values["power"] == 0  # Instead of 1
+
+    for _ in range(fleet.EXACT_SUM_INTERVAL):
+        hosts[2].poll()
+        sonnen_fleet.values
+    assert sonnen_fleet.values["power"] == 1
+
+    set_power(hosts[0], 1e17)
+    sonnen_fleet.values
+    set_power(hosts[2], 2.0)
+    sonnen_fleet.remove(hosts[0])
+    assert sonnen_fleet.values["power"] == 3
+    assert sonnen_fleet.values["units_online"] == 2
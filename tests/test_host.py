@@ -0,0 +1,195 @@
+"""Tests of polling a host of the client against the mock server."""
+
+from __future__ import annotations
+
+import contextlib
+
+from _loader import load
+from mock_server import API_TOKEN, MockSonnenServer
+
+const = load("sonnen_host.const")
+sonnen_host = load("sonnen_host.sonnen_host")
+
+URI_STATUS = "/api/status"
+URI_LATESTDATA = "/api/v2/latestdata"
+
+
+class Clock:
+    """Clock set by the test, in place of the host's `clock` and `wall_clock`."""
+
+    def __init__(self, now: float = 1000.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@contextlib.asynccontextmanager
+async def polled_host(server: MockSonnenServer):
+    """Return a host of battery 0 of `server`, driven by a Clock instead of the time."""
+    host = await sonnen_host.SonnenBatterieHost.create(url=server.url(0), api_token=API_TOKEN)
+    host.restore_static_data(server.batteries[0].serial_number)
+    host.clock = host.wall_clock = Clock()
+    try:
+        yield host
+    finally:
+        await host.close_session()
+
+
+async def test_endpoints_are_fetched_at_their_interval():
+    """/api/status is fetched on every poll, /api/v2/latestdata only every ENDPOINT_POLL_INTERVALS seconds."""
+    async with MockSonnenServer() as server, polled_host(server) as host:
+        for _ in range(3):
+            await host.poll()
+            host.clock.now += const.POLL_FREQUENCY
+        assert server.paths == {URI_STATUS: 3, URI_LATESTDATA: 1}
+
+        host.clock.now += const.ENDPOINT_POLL_INTERVALS[const.ENDPOINT_LATESTDATA]
+        await host.poll()
+        assert server.paths == {URI_STATUS: 4, URI_LATESTDATA: 2}
+
+
+async def test_endpoints_without_required_slots_are_not_fetched():
+    async with MockSonnenServer() as server, polled_host(server) as host:
+        required_slots = {host.extraction_plan.slot_of("consumption_w")}
+        host.required_slots = lambda: required_slots
+        for _ in range(3):
+            await host.poll()
+            host.clock.now += const.ENDPOINT_POLL_INTERVALS[const.ENDPOINT_LATESTDATA]
+        assert server.paths == {URI_STATUS: 3}
+
+        required_slots.add(host.extraction_plan.slot_of("set_point_w"))  # E.g. an entity was enabled
+        await host.poll()
+        assert server.paths == {URI_STATUS: 4, URI_LATESTDATA: 1}
+
+
+async def test_change_listeners_receive_the_changed_slots():
+    """The first poll reports all slots, later ones only the slots whose values changed."""
+    async with MockSonnenServer() as server, polled_host(server) as host:
+        changed_slots = set()
+        host.change_listeners.append(lambda changes: changed_slots.update(changes.slots))
+        all_slots = set(range(len(host.extraction_plan.paths)))
+        await host.poll()
+        assert changed_slots == all_slots
+
+        server.batteries[0].frozen = True
+        host.clock.now += const.POLL_FREQUENCY
+        await host.poll()
+        changed_slots.clear()
+        host.clock.now += const.POLL_FREQUENCY
+        await host.poll()
+        assert changed_slots == set()
+
+        host.republish_all()  # E.g. to entities added later
+        host.clock.now += const.POLL_FREQUENCY
+        await host.poll()
+        assert changed_slots == all_slots
+
+
+async def test_identical_bodies_are_not_decoded_again():
+    """A body identical to the previous one is neither decoded nor extracted into a new snapshot."""
+    async with MockSonnenServer() as server, polled_host(server) as host:
+        stats = host.decode_stats[const.ENDPOINT_STATUS]
+        await host.poll()
+        server.batteries[0].frozen = True  # After the battery advanced for /api/v2/latestdata
+        host.clock.now += const.POLL_FREQUENCY
+        await host.poll()
+        snapshot = host.snapshot
+        cache_hits, decodes = stats["cache_hits"], stats["decodes"]
+
+        host.clock.now += const.POLL_FREQUENCY
+        await host.poll()
+        assert stats == {"cache_hits": cache_hits + 1, "decodes": decodes}
+        assert host.snapshot is snapshot
+        assert not host.changed_endpoints
+
+        server.batteries[0].frozen = False
+        host.clock.now += const.POLL_FREQUENCY
+        await host.poll()
+        assert stats == {"cache_hits": cache_hits + 1, "decodes": decodes + 1}
+        assert host.snapshot.version > snapshot.version
+
+
+async def test_endpoint_age_follows_the_host_clock():
+    """The age of the data of a failing endpoint is measured on the host's wall clock, e.g. a replay's."""
+    async with MockSonnenServer() as server, polled_host(server) as host:
+        await host.poll()
+        state = host.endpoint_states[const.ENDPOINT_STATUS]
+        assert state.last_success == host.clock.now
+        assert state.age == 0
+
+        server.failing_paths.add(URI_STATUS)
+        host.clock.now += 600
+        await host.poll()
+        assert state.stale
+        assert state.age == 600
+        assert host.diagnostics["endpoints"][const.ENDPOINT_STATUS]["age"] == 600
+
+
+async def test_failed_fetch_is_retried_on_the_next_poll():
+    """A failed fetch of a slow endpoint does not wait for the endpoint's interval to be retried."""
+    async with MockSonnenServer() as server, polled_host(server) as host:
+        server.failing_paths.add(URI_LATESTDATA)
+        await host.poll()
+        assert host.endpoint_states[const.ENDPOINT_LATESTDATA].stale
+
+        server.failing_paths.clear()
+        host.clock.now += const.POLL_FREQUENCY
+        await host.poll()
+        assert server.paths[URI_LATESTDATA] == 2
+        assert not host.endpoint_states[const.ENDPOINT_LATESTDATA].stale
+
+        host.clock.now += const.POLL_FREQUENCY
+        await host.poll()
+        assert server.paths[URI_LATESTDATA] == 2  # Fetched again after its interval
+
+
+async def test_unreachable_host_is_probed_with_a_backoff():
+    """After BREAKER_FAILURE_THRESHOLD failed polls only /api/ready is probed, until it responds again."""
+    async with MockSonnenServer() as server, polled_host(server) as host:
+        server.failing_paths.update({URI_STATUS, URI_LATESTDATA, "/api/ready"})
+        for _ in range(const.BREAKER_FAILURE_THRESHOLD):
+            await host.poll()
+            host.clock.now += const.POLL_FREQUENCY
+        assert host.breaker.is_open
+        polls = server.paths[URI_STATUS]
+
+        for _ in range(3):
+            await host.poll()  # Not due for a probe
+        host.clock.now += const.BREAKER_INITIAL_BACKOFF
+        await host.poll()
+        assert server.paths[URI_STATUS] == polls
+        assert server.paths["/api/ready"] == 1
+
+        server.failing_paths.clear()
+        host.clock.now += 2 * const.BREAKER_INITIAL_BACKOFF
+        await host.poll()
+        assert not host.breaker.is_open
+        assert server.paths[URI_STATUS] == polls + 1
+
+
+async def test_cached_serial_number_uri_skips_the_dashboard():
+    """The dashboard is only scanned when the URI of the device-id script is not cached or outdated."""
+    async with MockSonnenServer() as server:
+        host = await sonnen_host.SonnenBatterieHost.create(url=server.url(0), api_token=API_TOKEN)
+        try:
+            await host.update(update_static_data=True, update_current_data=False)
+            assert host.serial_number == server.batteries[0].serial_number
+            assert server.paths["/dash/dashboard"] == 1
+            static_data = host.static_data
+        finally:
+            await host.close_session()
+
+        host = await sonnen_host.SonnenBatterieHost.create(url=server.url(0), api_token=API_TOKEN)
+        try:
+            host.restore_static_data(**static_data)
+            await host.update(update_static_data=True, update_current_data=False)
+            assert server.paths["/dash/dashboard"] == 1
+            assert host.snapshot[host.extraction_plan.slot_of("serial_number")] == static_data["serial_number"]
+
+            host.restore_static_data(static_data["serial_number"], "/dash/moved.js")  # Outdated URI
+            await host.update(update_static_data=True, update_current_data=False)
+            assert server.paths["/dash/dashboard"] == 2
+            assert host.static_data == static_data
+        finally:
+            await host.close_session()
@@ -0,0 +1,65 @@
+"""Tests of setting up, reloading and unloading a config entry."""
+
+from __future__ import annotations
+
+from common import SCHEDULER_TASK_PREFIX, async_setup_battery, async_test_home_assistant, integration, scheduler_tasks
+from mock_server import MockSonnenServer
+
+RELOADS = 10
+
+
+async def test_reload_keeps_one_poller(config_dir):
+    """Each reload replaces the pollers of the entry, and unloading stops them."""
+    async with MockSonnenServer(latency=0.005) as server, async_test_home_assistant(config_dir) as hass:
+        const = integration("const")
+        utils = integration("utils")
+        entry = await async_setup_battery(hass, server.url(0), options={const.OPTION_FLEET_DEVICE: True})
+        expected = sorted([f"{SCHEDULER_TASK_PREFIX}{server.url(0)}", f"{SCHEDULER_TASK_PREFIX}fleet"])
+        assert scheduler_tasks() == expected
+
+        for _ in range(RELOADS):
+            assert await hass.config_entries.async_reload(entry.entry_id)
+            await hass.async_block_till_done()
+            assert scheduler_tasks() == expected
+        assert len(utils.get_fleet(hass)) == 1
+
+        assert await hass.config_entries.async_unload(entry.entry_id)
+        await hass.async_block_till_done()
+        assert scheduler_tasks() == []
+        assert len(utils.get_fleet(hass)) == 0
+
+
+async def test_saving_static_data_does_not_reload(config_dir):
+    """The entry is only reloaded when its options change, not when the cached serial number is saved."""
+    async with MockSonnenServer(latency=0.005) as server, async_test_home_assistant(config_dir) as hass:
+        const = integration("const")
+        utils = integration("utils")
+        entry = await async_setup_battery(hass, server.url(0))
+        host = utils.get_sonnen_host_by_entry_id(hass, entry.entry_id)
+
+        hass.config_entries.async_update_entry(entry, data={**entry.data, const.ENTRY_SERIAL_NUMBER_URI: None})
+        await hass.async_block_till_done()
+        assert utils.get_sonnen_host_by_entry_id(hass, entry.entry_id) is host
+
+        hass.config_entries.async_update_entry(entry, options={const.OPTION_READ_TIMEOUT: 20})
+        await hass.async_block_till_done()
+        assert utils.get_sonnen_host_by_entry_id(hass, entry.entry_id) is not host
+
+
+async def test_fleet_device_is_handed_over_on_unload(config_dir):
+    """Unloading the entry providing the fleet device hands it over to another entry enabling it."""
+    async with MockSonnenServer(batteries=2, latency=0.005) as server, async_test_home_assistant(config_dir) as hass:
+        const = integration("const")
+        utils = integration("utils")
+        options = {const.OPTION_FLEET_DEVICE: True}
+        owner = await async_setup_battery(hass, server.url(0), name="Home", options=options)
+        other = await async_setup_battery(hass, server.url(1), name="Garage", options=options)
+        fleet = utils.get_fleet(hass)
+        assert fleet.owner_entry_id == owner.entry_id
+
+        assert await hass.config_entries.async_unload(owner.entry_id)
+        await hass.async_block_till_done()
+        assert fleet.owner_entry_id == other.entry_id
+        assert f"{SCHEDULER_TASK_PREFIX}fleet" in scheduler_tasks()
+        await fleet.publish_changes()
+        assert hass.states.get("sensor.sonnen_batterie_fleet_units_online").state == "1"
@@ -0,0 +1,46 @@
+"""Tests of the latency histograms of the poll pipeline."""
+
+from __future__ import annotations
+
+import pytest
+
+from _loader import load
+
+metrics = load("sonnen_host.metrics")
+
+
+def test_empty_histogram():
+    histogram = metrics.LatencyHistogram()
+    assert histogram.mean is None
+    assert histogram.p95 is None
+    assert histogram.as_dict()["count"] == 0
+
+
+def test_percentiles_are_bucket_bounds_capped_at_the_maximum():
+    histogram = metrics.LatencyHistogram()
+    for _ in range(90):
+        histogram.record(0.003)  # In the bucket up to 5 ms
+    for _ in range(10):
+        histogram.record(0.150)  # In the bucket up to 200 ms
+    assert histogram.p50 == 5  # Upper bound of the bucket
+    assert histogram.p95 == 150.0  # The bound of 200 ms capped at the maximum
+    assert histogram.mean == pytest.approx(0.9 * 3 + 0.1 * 150)
+
+
+def test_overflow_bucket():
+    histogram = metrics.LatencyHistogram()
+    histogram.record(0.001)
+    histogram.record(12.5)
+    buckets = histogram.as_dict()["buckets"]
+    assert buckets["<=1ms"] == 1
+    assert buckets[">10000ms"] == 1
+    assert histogram.p99 == 12500.0
+
+
+def test_pipeline_metrics_count_bytes_per_endpoint():
+    pipeline = metrics.PipelineMetrics(["status", "data"])
+    pipeline.bytes_received["status"] += 800
+    pipeline.bytes_received["data"] += 1200
+    pipeline.stages[metrics.STAGE_POLL].record(0.01)
+    assert pipeline.total_bytes == 2000
+    assert pipeline.as_dict()["stages"][metrics.STAGE_POLL]["count"] == 1
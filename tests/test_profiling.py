@@ -0,0 +1,53 @@
+"""Tests of the profiling session patching the poll path."""
+
+from __future__ import annotations
+
+import tracemalloc
+
+from common import async_setup_battery, async_test_home_assistant, integration
+from mock_server import MockSonnenServer
+
+
+def profiled_attributes(profiling) -> dict:
+    """Return the current values of the attributes a session patches, by class and attribute."""
+    attributes = {(profiling.SonnenBatterieHost, name): vars(profiling.SonnenBatterieHost)[name] for name in profiling.PROFILED_HOST_METHODS}
+    entity_classes = [profiling.SonnenBatterieEntity]
+    for cls in entity_classes:
+        entity_classes.extend(cls.__subclasses__())
+    attributes.update({(cls, "state"): vars(cls)["state"] for cls in entity_classes if "state" in vars(cls)})
+    return attributes
+
+
+async def test_session_restores_the_patched_methods(config_dir):
+    async with MockSonnenServer(latency=0.005) as server, async_test_home_assistant(config_dir) as hass:
+        entry = await async_setup_battery(hass, server.url(0))
+        profiling = integration("profiling")
+        host = integration("utils").get_sonnen_host_by_entry_id(hass, entry.entry_id)
+        originals = profiled_attributes(profiling)
+        was_tracing = tracemalloc.is_tracing()
+
+        session = profiling.ProfilingSession([host])
+        session.start()
+        patched = profiled_attributes(profiling)
+        assert all(patched[key] is not original for key, original in originals.items())
+        await host.poll()
+        await session.stop()
+
+        assert profiled_attributes(profiling) == originals
+        assert tracemalloc.is_tracing() == was_tracing
+        assert session.summary()["polls"] == 1
+        assert session.summary()["targets"]["SonnenBatterieHost._get_current_data_from_host"]["calls"] == 1
+
+
+async def test_stopped_session_is_not_enabled_again(config_dir):
+    """A step of a call started during the session does not turn the profiler on after the session stopped."""
+    async with async_test_home_assistant(config_dir):
+        profiling = integration("profiling")
+        session = profiling.ProfilingSession([], trace_allocations=False)
+        session.start()
+        await session.stop()
+
+        session.enter()
+        profiling.format_summary(session.summary())  # Any code that would be profiled
+        session.exit()
+        assert not session.profiler.getstats()
@@ -0,0 +1,69 @@
+"""Tests of the sample buffers and the downsampled period statistics."""
+
+from __future__ import annotations
+
+import random
+import statistics
+
+import pytest
+
+from _loader import load
+
+ring_buffer = load("sonnen_host.ring_buffer")
+
+
+def test_statistics_match_a_full_pass_over_the_samples():
+    """The incrementally maintained statistics equal those computed from the kept samples."""
+    rng = random.Random(0)
+    buffer = ring_buffer.RingBuffer(capacity=50)
+    for timestamp in range(500):
+        buffer.append(timestamp, rng.uniform(-3000, 3000))
+        values = [value for _, value in buffer.samples()]
+        assert buffer.mean == pytest.approx(statistics.fmean(values))
+        assert (buffer.min, buffer.max) == (min(values), max(values))
+        assert buffer.percentile(0.5) == sorted(values)[(len(values) + 1) // 2 - 1]
+    assert len(buffer) == 50
+    assert [timestamp for timestamp, _ in buffer.samples()] == list(range(450, 500))
+
+
+def test_old_samples_are_evicted():
+    buffer = ring_buffer.RingBuffer(capacity=100, max_age=10)
+    for timestamp in range(20):
+        buffer.append(timestamp, timestamp)
+    assert len(buffer) == 11  # From 9 to 19
+    assert buffer.min == 9
+    buffer.evict(15)
+    assert buffer.stats == {"samples": 5, "mean": 17, "min": 15, "max": 19, "median": 17, "p95": 19}
+
+
+def test_resize_keeps_the_newest_samples():
+    buffer = ring_buffer.RingBuffer(capacity=10)
+    for timestamp in range(10):
+        buffer.append(timestamp, timestamp)
+    buffer.resize(4)
+    assert list(buffer.samples()) == [(6, 6), (7, 7), (8, 8), (9, 9)]
+    buffer.resize(8)
+    buffer.append(10, 10)
+    assert len(buffer) == 5
+    assert buffer.mean == 8
+
+
+def test_empty_buffer():
+    buffer = ring_buffer.RingBuffer(capacity=3)
+    assert buffer.mean is buffer.min is buffer.max is buffer.percentile(0.95) is None
+    with pytest.raises(ValueError):
+        buffer.statistic("mode")
+
+
+def test_period_statistic_is_updated_once_per_period():
+    """The value is the statistic of the previous wall clock aligned period, set by the first sample of the next."""
+    statistic = ring_buffer.PeriodStatistic(ring_buffer.STATISTIC_MEAN, period=60, capacity=31)
+    updates = [statistic.add(timestamp, timestamp // 60 * 100 + timestamp % 4) for timestamp in range(30, 180, 2)]
+    assert updates.count(True) == 2  # At 60 and 120 s
+    assert statistic.value == 101  # Mean of the samples from 60 to 118 s
+
+    peak = ring_buffer.PeriodStatistic(ring_buffer.STATISTIC_MAX, period=60, capacity=31)
+    assert not peak.add(0, 500)
+    assert not peak.add(30, 900)
+    assert peak.add(60, 100)
+    assert peak.value == 900
@@ -0,0 +1,129 @@
+"""Tests of the scan of a network for batteries, against mock servers on several addresses of 127.0.0.0/8."""
+
+from __future__ import annotations
+
+import contextlib
+import time
+
+from aiohttp import web
+
+from _loader import load
+from common import async_test_home_assistant, integration
+from mock_server import API_TOKEN, MockSonnenServer
+
+scan = load("sonnen_host.scan")
+
+NETWORK = "127.0.0.0/29"  # 127.0.0.1 to 127.0.0.6
+PROBE_TIMEOUT = 0.2
+
+
+@contextlib.asynccontextmanager
+async def batteries_on_network(addresses: list[str], port: int = 0, **server_options):
+    """Serve a battery with its own serial number at each address, all on `port`, or on the free port found first."""
+    servers = [MockSonnenServer(seed=number, **server_options) for number in range(len(addresses))]
+    try:
+        for number, (server, address) in enumerate(zip(servers, addresses)):
+            await server.start(port, address)
+            port = server.port
+            server.batteries[0].serial_number = str(int(server.batteries[0].serial_number) + number)
+        yield servers
+    finally:
+        for server in servers:
+            await server.stop()
+
+
+@contextlib.asynccontextmanager
+async def other_device(address: str, port: int):
+    """Serve a device that is not a battery, answering every request with 200."""
+    app = web.Application()
+
+    async def handle(request: web.Request) -> web.Response:
+        return web.json_response("ok")
+
+    app.router.add_get("/{path:.*}", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, address, port).start()
+    try:
+        yield
+    finally:
+        await runner.cleanup()
+
+
+def serial_numbers(servers: list[MockSonnenServer]) -> list[str]:
+    return [server.batteries[0].serial_number for server in servers]
+
+
+async def test_scan_finds_batteries():
+    """All batteries on the scanned port are found, in address order, and those on another port are not."""
+    async with batteries_on_network(["127.0.0.2", "127.0.0.4", "127.0.0.5"]) as servers, batteries_on_network(
+        ["127.0.0.3"]  # Same network, different port
+    ):
+        found = await scan.scan_network(NETWORK, API_TOKEN, port=servers[0].port, timeout=PROBE_TIMEOUT)
+
+    assert [battery.address for battery in found] == ["127.0.0.2", "127.0.0.4", "127.0.0.5"]
+    assert [battery.url for battery in found] == [f"http://{server.host}:{server.port}" for server in servers]
+    assert [battery.serial_number for battery in found] == serial_numbers(servers)
+    assert all(battery.serial_number_uri for battery in found)
+
+
+async def test_scan_ignores_other_devices():
+    """Devices answering /api/ready with anything but "go", or rejecting the token, are not batteries."""
+    async with batteries_on_network(["127.0.0.2"]) as servers, other_device("127.0.0.3", servers[0].port):
+        found = await scan.scan_network(NETWORK, API_TOKEN, port=servers[0].port, timeout=PROBE_TIMEOUT)
+        assert [battery.address for battery in found] == ["127.0.0.2"]
+        assert await scan.scan_network(NETWORK, "wrong-token", port=servers[0].port, timeout=PROBE_TIMEOUT) == []
+
+
+async def test_batteries_are_identified_from_the_dashboard():
+    """A responding battery is only asked for /api/ready, the dashboard and the device-id script."""
+    async with batteries_on_network(["127.0.0.2"]) as servers:
+        found = await scan.scan_network(NETWORK, API_TOKEN, port=servers[0].port, timeout=PROBE_TIMEOUT)
+        assert [battery.serial_number for battery in found] == serial_numbers(servers)
+        assert set(servers[0].paths) == {"/api/ready", "/dash/dashboard", "/dash/device-id.js"}
+
+
+async def test_scan_time_is_bounded_by_the_probe_timeout():
+    """Devices that accept connections but answer too slowly cost one probe timeout, as they are probed in parallel."""
+    async with contextlib.AsyncExitStack() as stack:
+        servers = await stack.enter_async_context(batteries_on_network(["127.0.0.2"]))
+        slow_addresses = ["127.0.0.3", "127.0.0.4", "127.0.0.5", "127.0.0.6"]
+        await stack.enter_async_context(batteries_on_network(slow_addresses, servers[0].port, latency=PROBE_TIMEOUT * 10))
+        start = time.monotonic()
+        found = await scan.scan_network(NETWORK, API_TOKEN, port=servers[0].port, timeout=PROBE_TIMEOUT)
+        elapsed = time.monotonic() - start
+
+    assert [battery.address for battery in found] == ["127.0.0.2"]
+    # One probe timeout, not one per slow device, plus the identification of the battery
+    assert PROBE_TIMEOUT <= elapsed < PROBE_TIMEOUT * 2
+
+
+async def test_config_flow_discovers_batteries(config_dir):
+    """The discover step offers the batteries found that are not configured yet, and creates an entry for the chosen one."""
+    async with batteries_on_network(["127.0.0.2", "127.0.0.3"]) as servers, async_test_home_assistant(config_dir) as hass:
+        const = integration("const")
+        url = f"http://127.0.0.3:{servers[1].port}"
+        scan_input = {const.SCAN_NETWORK: NETWORK, const.SCAN_PORT: servers[0].port, const.ENTRY_API_TOKEN: API_TOKEN}
+
+        result = await hass.config_entries.flow.async_init(const.DOMAIN, context={"source": "user"})
+        result = await hass.config_entries.flow.async_configure(result["flow_id"], {"next_step_id": "discover"})
+        assert (result["type"], result["step_id"]) == ("form", "discover")
+        result = await hass.config_entries.flow.async_configure(result["flow_id"], scan_input)
+        assert (result["type"], result["step_id"]) == ("form", "discover_select")
+        offered = result["data_schema"].schema[const.ENTRY_URL].container
+        assert sorted(offered) == [f"http://127.0.0.2:{servers[0].port}", url]
+
+        result = await hass.config_entries.flow.async_configure(
+            result["flow_id"], {const.ENTRY_URL: url, const.ENTRY_NAME: "Garage"}
+        )
+        assert result["type"] == "create_entry"
+        assert result["data"][const.ENTRY_URL] == url
+        assert result["data"][const.ENTRY_SERIAL_NUMBER] == serial_numbers(servers)[1]
+        await hass.async_block_till_done()
+
+        # The configured battery is not offered again
+        result = await hass.config_entries.flow.async_init(const.DOMAIN, context={"source": "user"})
+        result = await hass.config_entries.flow.async_configure(result["flow_id"], {"next_step_id": "discover"})
+        result = await hass.config_entries.flow.async_configure(result["flow_id"], scan_input)
+        assert list(result["data_schema"].schema[const.ENTRY_URL].container) == [f"http://127.0.0.2:{servers[0].port}"]
+        hass.config_entries.flow.async_abort(result["flow_id"])
@@ -0,0 +1,110 @@
+"""Tests of the poll scheduler's ticks, skipped ticks, drift and interval changes."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+from _loader import load
+
+scheduler = load("sonnen_host.scheduler")
+
+INTERVAL = 0.05
+
+
+class Poller:
+    """Poll coroutine recording when it ran and how many polls ran at once."""
+
+    def __init__(self, duration: float = 0.0) -> None:
+        self.duration = duration
+        self.starts: list[float] = []
+        self.running = 0
+        self.max_running = 0
+
+    async def __call__(self) -> None:
+        self.starts.append(asyncio.get_running_loop().time())
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.duration)
+        finally:
+            self.running -= 1
+
+
+def block_loop(duration: float) -> None:
+    """Block the event loop, without time.sleep, which Home Assistant rejects in the loop once imported."""
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        pass
+
+
+async def test_polls_at_the_interval():
+    poller = Poller()
+    poll_scheduler = scheduler.PollScheduler(poller, interval=INTERVAL, jitter=False)
+    poll_scheduler.start()
+    await asyncio.sleep(5.5 * INTERVAL)
+    await poll_scheduler.stop()
+
+    assert poll_scheduler.ticks == len(poller.starts) == 6  # At 0, 1, ..., 5 intervals
+    assert poll_scheduler.skipped_ticks == 0
+    assert 0 <= poll_scheduler.mean_drift <= poll_scheduler.max_drift < INTERVAL
+    assert not poll_scheduler.running
+
+
+async def test_ticks_during_a_poll_are_skipped():
+    """A poll taking 2.5 intervals drops the two ticks that fire while it runs."""
+    poller = Poller(duration=2.5 * INTERVAL)
+    poll_scheduler = scheduler.PollScheduler(poller, interval=INTERVAL, jitter=False)
+    poll_scheduler.start()
+    await asyncio.sleep(5.5 * INTERVAL)
+    await poll_scheduler.stop()
+
+    assert poller.max_running == 1
+    assert poll_scheduler.ticks == 2  # At 0 and 3 intervals
+    assert poll_scheduler.skipped_ticks == 4  # At 1, 2, 4 and 5 intervals
+
+
+async def test_blocked_loop_drops_missed_ticks_and_records_drift():
+    """Ticks missed while the event loop is blocked are counted, not run one after the other."""
+    poller = Poller()
+    poll_scheduler = scheduler.PollScheduler(poller, interval=INTERVAL, jitter=False)
+    poll_scheduler.start()
+    await asyncio.sleep(0.5 * INTERVAL)
+    block_loop(3.2 * INTERVAL)  # Over the ticks at 1, 2 and 3 intervals
+    await asyncio.sleep(0.8 * INTERVAL)
+    await poll_scheduler.stop()
+
+    assert poll_scheduler.ticks == 3  # At 0 and 4 intervals, and the late tick at 1 interval
+    assert poll_scheduler.skipped_ticks == 2  # At 2 and 3 intervals
+    assert poll_scheduler.max_drift >= 2.5 * INTERVAL
+
+
+async def test_shorter_interval_applies_at_once():
+    """A poll shortening the interval, as adaptive polling does, is followed by a poll at the new interval."""
+    poll_scheduler = None
+    starts = []
+
+    async def poll() -> None:
+        starts.append(asyncio.get_running_loop().time())
+        poll_scheduler.interval = INTERVAL
+
+    poll_scheduler = scheduler.PollScheduler(poll, interval=60, jitter=False)
+    poll_scheduler.start()
+    await asyncio.sleep(2.5 * INTERVAL)
+    await poll_scheduler.stop()
+
+    assert len(starts) == 3
+    assert starts[1] - starts[0] < 1.5 * INTERVAL
+    assert poll_scheduler.max_drift < INTERVAL
+
+
+async def test_jitter_offsets_the_first_tick_within_an_interval():
+    poller = Poller()
+    poll_scheduler = scheduler.PollScheduler(poller, interval=2 * INTERVAL)
+    start = asyncio.get_running_loop().time()
+    poll_scheduler.start()
+    await asyncio.sleep(2.5 * INTERVAL)
+    await poll_scheduler.stop()
+
+    assert poller.starts
+    assert poller.starts[0] - start < 2.5 * INTERVAL
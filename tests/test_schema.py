@@ -0,0 +1,116 @@
+"""Tests of the sensor discovery from the payload structure and its cache."""
+
+from __future__ import annotations
+
+import copy
+
+from _loader import load
+from common import async_test_home_assistant, integration
+
+const = load("sonnen_host.const")
+schema = load("sonnen_host.schema")
+
+PAYLOADS = {
+    "status": {
+        "Pac_total_W": 120,
+        "Uac": 230.1,
+        "Production_W": None,  # Nullable, e.g. at night
+        "Sac1": 80,  # Overridden
+        "Timestamp": "2026-10-16 12:00:00",  # Overridden to not be discovered
+        "OperatingMode": "2",
+        "Flags": {"Alarm": False, "Ready": True},
+        "Modules": [1, 2],
+    },
+    "data": {
+        "ic_status": {"Setpoint Priority": {"Manual": True}, "nrbatterymodules": 4},
+        "Grid_W": None,
+    },
+}
+KNOWN_PATHS = {"status.Pac_total_W", "status.OperatingMode", "data.ic_status.Setpoint Priority"}
+
+
+def sensors_by_path(sensors: list[list]) -> dict[str, list]:
+    return {sensor_config[2]: sensor_config for sensor_config in sensors}
+
+
+def test_discovers_the_fields_not_read_by_a_sensor():
+    sensors = schema.discover_sensors(PAYLOADS, KNOWN_PATHS)
+    by_path = sensors_by_path(sensors)
+    assert [sensor_config[2] for sensor_config in sensors] == sorted(by_path)
+    assert sorted(by_path) == [
+        "data.Grid_W",
+        "data.ic_status.nrbatterymodules",
+        "status.Flags",
+        "status.Production_W",
+        "status.Sac1",
+        "status.Uac",
+    ]
+    assert by_path["status.Uac"] == ["status_uac", "Uac", "status.Uac", "float", None, "mdi:numeric", None]
+    assert by_path["data.ic_status.nrbatterymodules"][3] == "float"  # Numbers are floats, also if sampled as integers
+    assert by_path["status.Flags"][3] == const.DATA_TYPE_FLAG_GROUP
+    assert by_path["status.Production_W"][3:6] == ["float", "W", "mdi:flash"]  # Typed by its unit, not by the null sample
+
+
+def test_overrides_replace_the_inferred_definition():
+    by_path = sensors_by_path(schema.discover_sensors(PAYLOADS, KNOWN_PATHS))
+    assert by_path["status.Sac1"] == ["status_sac1", "Apparent Power L1", "status.Sac1", "int", "VA", "mdi:flash", None]
+    assert "status.Timestamp" not in by_path  # Overridden with None
+
+
+def test_fingerprint_depends_only_on_the_structure():
+    fingerprint = schema.schema_fingerprint(PAYLOADS)
+    changed = copy.deepcopy(PAYLOADS)
+    changed["status"]["Pac_total_W"] = -3.5
+    changed["status"]["Production_W"] = 2400  # A nullable field with a value
+    changed["status"]["Flags"]["Alarm"] = True
+    changed["data"]["Grid_W"] = None
+    assert schema.schema_fingerprint(changed) == fingerprint
+
+    changed["status"]["Sac4"] = 0  # A new field, e.g. after a firmware update
+    assert schema.schema_fingerprint(changed) != fingerprint
+    changed = copy.deepcopy(PAYLOADS)
+    changed["data"]["ic_status"]["nrbatterymodules"] = {"count": 4}  # A value became an object
+    assert schema.schema_fingerprint(changed) != fingerprint
+
+
+class Host:
+    """Stand-in for a host, counting the discoveries."""
+
+    url = "http://battery"
+
+    def __init__(self, fingerprint: str) -> None:
+        self.schema_fingerprint = fingerprint
+        self.discoveries = 0
+        self.used = None
+
+    def discover_sensors(self) -> list[list]:
+        self.discoveries += 1
+        return [[f"sensor_{self.schema_fingerprint}", None, f"status.{self.schema_fingerprint}", "float", None, None, None]]
+
+    def use_discovered_sensors(self, fingerprint: str, sensors: list[list]) -> None:
+        self.used = (fingerprint, sensors)
+
+
+async def test_discovered_sensors_are_cached_by_fingerprint(config_dir):
+    """Discovery runs once per fingerprint, and the oldest of more than DISCOVERY_MAX_CACHED_SCHEMAS is evicted."""
+    async with async_test_home_assistant(config_dir) as hass:
+        utils = integration("utils")
+        first = Host("first")
+        await utils.async_use_discovered_sensors(hass, first)
+        again = Host("first")
+        await utils.async_use_discovered_sensors(hass, again)
+        assert (first.discoveries, again.discoveries) == (1, 0)
+        assert again.used == first.used
+
+        for number in range(const.DISCOVERY_MAX_CACHED_SCHEMAS):
+            await utils.async_use_discovered_sensors(hass, Host(f"firmware_{number}"))
+        _, data = hass.data[utils.DATA_SCHEMA_STORE]
+        assert len(data["schemas"]) == const.DISCOVERY_MAX_CACHED_SCHEMAS
+        assert "first" not in data["schemas"]
+        evicted = Host("first")
+        await utils.async_use_discovered_sensors(hass, evicted)
+        assert evicted.discoveries == 1
+
+        pending = Host(None)  # Not all endpoints returned data yet
+        await utils.async_use_discovered_sensors(hass, pending)
+        assert (pending.discoveries, pending.used) == (0, None)
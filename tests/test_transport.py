@@ -0,0 +1,38 @@
+"""Tests of the HTTP transport to a battery."""
+
+from __future__ import annotations
+
+import asyncio
+
+from _loader import load
+from mock_server import API_TOKEN, MockSonnenServer
+
+const = load("sonnen_host.const")
+transport = load("sonnen_host.transport")
+
+LATENCY = 0.2
+
+
+async def test_reads_are_limited_and_writes_have_their_own_slot():
+    """Reads beyond `max_connections` wait for a free connection, a write is sent at once."""
+    async with MockSonnenServer(latency=LATENCY) as server:
+        sonnen_transport = transport.SonnenTransport.create(server.url(0), API_TOKEN)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        done = {}
+
+        async def request(name: str, method: str, uri: str) -> None:
+            async with sonnen_transport.request(method, uri) as response:
+                assert response.status == 200
+                await response.read()
+            done[name] = loop.time() - start
+
+        try:
+            reads = [request(f"read {n}", "GET", "/api/status") for n in range(const.DEFAULT_MAX_CONNECTIONS + 1)]
+            await asyncio.gather(*reads, request("write", "POST", "/api/v2/setpoint/discharge/100"))
+        finally:
+            await sonnen_transport.close()
+
+        assert sonnen_transport.closed
+        assert done["write"] < 1.5 * LATENCY
+        assert sorted(done.values())[-1] >= 2 * LATENCY  # The last read waited for a connection
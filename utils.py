@@ -1,17 +1,111 @@
 """Helper functions for the SonnenBatterie integration."""
 
+from collections.abc import Callable
+import logging
+
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.helpers.storage import Store
+
+from .const import DISCOVERY_MAX_CACHED_SCHEMAS, DOMAIN, ENTRY_SERIAL_NUMBER
+from .publisher import EntityPublisher
+from .sonnen_host import SonnenBatterieHost, SonnenFleet
+from .sonnen_host.fleet import FLEET_ID
+
+_LOGGER = logging.getLogger(__name__)
+
+SCHEMA_STORE_KEY = f"{DOMAIN}.schemas"
+SCHEMA_STORE_VERSION = 1
+DATA_SCHEMA_STORE = f"{DOMAIN}_schemas"  # Key in hass.data of the store and its loaded data
+DATA_FLEET_ENTITY_ADDERS = f"{DOMAIN}_fleet_entity_adders"  # Key in hass.data of the adders of the fleet entities
+DATA_ENTITY_PUBLISHERS = f"{DOMAIN}_entity_publishers"  # Key in hass.data of the entity publishers of the hosts
+
+
+def get_fleet(hass: HomeAssistant) -> SonnenFleet:
+    """Get the index of all SonnenBatterie hosts, creating it on first use."""
+    if DOMAIN not in hass.data:
+        hass.data[DOMAIN] = SonnenFleet()
+    return hass.data[DOMAIN]
+
+
+def get_fleet_entity_adders(hass: HomeAssistant) -> dict[str, Callable[[], None]]:
+    """Get the functions adding the fleet entities to the sensor platform of an entry, by config entry id.
+
+    Holds the loaded entries that enable OPTION_FLEET_DEVICE, so one of them can take over
+    the fleet device when its owner is unloaded.
+    """
+    return hass.data.setdefault(DATA_FLEET_ENTITY_ADDERS, {})
+
+
+def get_entity_publishers(hass: HomeAssistant) -> dict[str, EntityPublisher]:
+    """Get the publishers writing the entity states of the hosts, by config entry id."""
+    return hass.data.setdefault(DATA_ENTITY_PUBLISHERS, {})
 
-from .const import DOMAIN, ENTRY_SERIAL_NUMBER
-from .sonnen_host import SonnenBatterieHost
+
+def get_entity_publisher_by_entry_id(hass: HomeAssistant, entry_id: str) -> EntityPublisher | None:
+    """Get the publisher of the entities of the config entry with entry_id."""
+    return get_entity_publishers(hass).get(entry_id)
 
 
 def get_sonnen_host_by_entry_id(hass: HomeAssistant, entry_id: str) -> SonnenBatterieHost | None:
-    """Get the config entry by entry_id."""
-    for host in hass.data[DOMAIN]:
-        if host.entry_id == entry_id:
-            return host
-    return None
+    """Get the host of the config entry with entry_id."""
+    return get_fleet(hass).get(entry_id)
+
+
+async def async_use_discovered_sensors(hass: HomeAssistant, sonnen_host: SonnenBatterieHost) -> None:
+    """Add the sensors discovered from the host's payloads to its extraction plan.
+
+    Discovered sensors are cached in a store by the fingerprint of the payload structure,
+    so discovery only runs when a battery reports a structure that was not seen before,
+    e.g. after a firmware update.
+    """
+    fingerprint = sonnen_host.schema_fingerprint
+    if fingerprint is None:
+        _LOGGER.debug("No data of all endpoints from Sonnen Batterie at %s yet, skipping sensor discovery", sonnen_host.url)
+        return
+    if DATA_SCHEMA_STORE not in hass.data:
+        store = Store(hass, SCHEMA_STORE_VERSION, SCHEMA_STORE_KEY)
+        hass.data[DATA_SCHEMA_STORE] = (store, await store.async_load() or {"schemas": {}})
+    store, data = hass.data[DATA_SCHEMA_STORE]
+    schemas: dict = data["schemas"]
+    sensors = schemas.get(fingerprint)
+    if sensors is None:
+        sensors = schemas[fingerprint] = sonnen_host.discover_sensors()
+        _LOGGER.info(
+            "Discovered %d sensors for the payload structure %s of Sonnen Batterie at %s", len(sensors), fingerprint, sonnen_host.url
+        )
+        while len(schemas) > DISCOVERY_MAX_CACHED_SCHEMAS:
+            del schemas[next(iter(schemas))]  # Discovered first
+        store.async_delay_save(lambda: data, 1)
+    sonnen_host.use_discovered_sensors(fingerprint, sensors)
+
+
+def normalize_host_name(name: str) -> str:
+    """Return the name of a host as used in entity ids, e.g. "my_sonnen_batterie"."""
+    return "".join([c for c in name.replace(" ", "_") if c.isalnum() or c == '_']).lower()
+
+
+def get_device_info(sonnen_host: SonnenBatterieHost) -> DeviceInfo:
+    """Return information to link the entities of a host to its device."""
+    return DeviceInfo(
+        identifiers = {(DOMAIN, sonnen_host.serial_number)},
+        name = "Sonnen Batterie",
+        manufacturer = "Sonnen GmbH",
+        model="Unknown",  # TODO: Get the model from the host
+        serial_number=sonnen_host.serial_number,
+        # sw_version = "Unknown",  # TODO: Get the software version from the host
+        # entity_picture="/local/custom_components/sonnen_batterie/icon.png"  # Path to your custom PNG icon
+    )
+
+
+def get_fleet_device_info() -> DeviceInfo:
+    """Return information to link the fleet entities to the virtual fleet device."""
+    return DeviceInfo(
+        identifiers={(DOMAIN, FLEET_ID)},
+        name="Sonnen Batterie Fleet",
+        manufacturer="Sonnen GmbH",
+        model="Fleet of all configured batteries",
+    )
 
 
 def check_entries_for_duplicate_name(hass: HomeAssistant, name: str):